@@ -28,23 +28,23 @@ def DUOCallback( pFrameData, pUserData ):
     """
     frame_data = pFrameData.contents  # get the object to which the pointer points
 
-    print "DUO Frame Timestamp: %10.1f ms" % ( frame_data.timeStamp / 10.0 )
+    print( "DUO Frame Timestamp: %10.1f ms" % ( frame_data.timeStamp / 10.0 ) )
 
     if pFrameData.contents.IMUPresent:
         for i in range( 0, pFrameData.contents.IMUSamples ):
-            print " Sample #%d" % ( i + 1 )
+            print( " Sample #%d" % ( i + 1 ) )
 
             # One way to access array data ...
-            print "  Accelerometer: [%8.5f, %8.5f, %8.5f]" % ( frame_data.IMUData[i].accelData[0],
-                                                            frame_data.IMUData[i].accelData[1],
-                                                            frame_data.IMUData[i].accelData[2] )
+            print( "  Accelerometer: [%8.5f, %8.5f, %8.5f]" % ( frame_data.IMUData[i].accelData[0],
+                                                             frame_data.IMUData[i].accelData[1],
+                                                             frame_data.IMUData[i].accelData[2] ) )
 
             # ... and another one
-            print "  Gyro: [%8.5f, %8.5f, %8.5f]" % ( tuple( frame_data.IMUData[i].gyroData ) )
+            print( "  Gyro: [%8.5f, %8.5f, %8.5f]" % ( tuple( frame_data.IMUData[i].gyroData ) ) )
 
-            print "  Temperature:   %8.6f C" % ( frame_data.IMUData[i].tempData )
+            print( "  Temperature:   %8.6f C" % ( frame_data.IMUData[i].tempData ) )
 
-    print "-" * 50
+    print( "-" * 50 )
 
 def main():
     """
@@ -55,7 +55,7 @@ def main():
     HEIGHT = 240
     FPS = 30.0
 
-    print "DUOLib Version:       v%s" % GetDUOLibVersion()
+    print( "DUOLib Version:       v%s" % GetDUOLibVersion() )
 
     ri = DUOResolutionInfo()
 
@@ -66,12 +66,12 @@ def main():
 
         # Open DUO
         if OpenDUO( duo ):
-            print "DUO Device Name:      '%s'" % GetDUODeviceName( duo )
-            print "DUO Serial Number:    %s" % GetDUOSerialNumber( duo )
-            print "DUO Firmware Version: v%s" % GetDUOFirmwareVersion( duo )
-            print "DUO Firmware Build:   %s" % GetDUOFirmwareBuild( duo )
+            print( "DUO Device Name:      '%s'" % GetDUODeviceName( duo ) )
+            print( "DUO Serial Number:    %s" % GetDUOSerialNumber( duo ) )
+            print( "DUO Firmware Version: v%s" % GetDUOFirmwareVersion( duo ) )
+            print( "DUO Firmware Build:   %s" % GetDUOFirmwareBuild( duo ) )
 
-            print "Hit any key to start capturing"
+            print( "Hit any key to start capturing" )
 #             getch()
 
             # Set selected resolution
@@ -88,12 +88,12 @@ def main():
                 # Stop capture
                 StopDUO( duo )
             else:
-                print "Could not start DUO camera"
+                print( "Could not start DUO camera" )
 
             # Close DUO
             CloseDUO( duo )
         else:
-            print "Could not open DUO camera"
+            print( "Could not open DUO camera" )
 
     return 0
 
@@ -21,6 +21,7 @@
 """
 
 from duo3d import *
+from duo3d.frame import GetDUOFrameImages
 from msvcrt import getch  # Windows only
 
 duo_frame_num = 0
@@ -31,12 +32,15 @@ def DUOCallback( pFrameData, pUserData ):
     global duo_frame_num
     frame_data = pFrameData.contents    # get the object to which the pointer points
 
-    print "DUO Frame #%d\n" % ( duo_frame_num )
-    print "  Timestamp:          %10.1f ms" % ( frame_data.timeStamp / 10.0 )
-    print "  Frame Size:         %dx%d" % ( frame_data.width, frame_data.height )
-    print "  Left Frame Buffer:  ", ( frame_data.leftData )    # FIXME: Do it more elegant way
-    print "  Right Frame Buffer: ", ( frame_data.rightData )
-    print "-" * 50
+    print( "DUO Frame #%d\n" % ( duo_frame_num ) )
+    print( "  Timestamp:          %10.1f ms" % ( frame_data.timeStamp / 10.0 ) )
+    print( "  Frame Size:         %dx%d" % ( frame_data.width, frame_data.height ) )
+
+    # numpy views of the frame data, valid only inside the callback
+    left, right = GetDUOFrameImages( frame_data )
+    print( "  Left Frame Mean:    %6.2f" % ( left.mean() ) )
+    print( "  Right Frame Mean:   %6.2f" % ( right.mean() ) )
+    print( "-" * 50 )
 
     duo_frame_num += 1
 
@@ -49,7 +53,7 @@ def main():
     HEIGHT = 240
     FPS = 30.0
 
-    print "DUOLib Version:       v%s" % GetDUOLibVersion()
+    print( "DUOLib Version:       v%s" % GetDUOLibVersion() )
 
     ri = DUOResolutionInfo()
 
@@ -60,12 +64,12 @@ def main():
 
         # Open DUO
         if OpenDUO( duo ):
-            print "DUO Device Name:      '%s'" % GetDUODeviceName( duo )
-            print "DUO Serial Number:    %s" % GetDUOSerialNumber( duo )
-            print "DUO Firmware Version: v%s" % GetDUOFirmwareVersion( duo )
-            print "DUO Firmware Build:   %s" % GetDUOFirmwareBuild( duo )
+            print( "DUO Device Name:      '%s'" % GetDUODeviceName( duo ) )
+            print( "DUO Serial Number:    %s" % GetDUOSerialNumber( duo ) )
+            print( "DUO Firmware Version: v%s" % GetDUOFirmwareVersion( duo ) )
+            print( "DUO Firmware Build:   %s" % GetDUOFirmwareBuild( duo ) )
 
-            print "Hit any key to start capturing"
+            print( "Hit any key to start capturing" )
             getch()
 
             # Set selected resolution
@@ -79,12 +83,12 @@ def main():
                 # Stop capture
                 StopDUO( duo )
             else:
-                print "Could not start DUO camera"
+                print( "Could not start DUO camera" )
 
             # Close DUO
             CloseDUO( duo )
         else:
-            print "Could not open DUO camera"
+            print( "Could not open DUO camera" )
 
     return 0
 
@@ -21,6 +21,7 @@
 """
 
 from duo3d import *
+from duo3d.device import DUODevice
 from msvcrt import getch  # Windows only
 
 def main():
@@ -32,7 +33,7 @@ def main():
     HEIGHT = 240
     FPS = 30.0
 
-    print "DUOLib Version:       v%s" % GetDUOLibVersion()
+    print( "DUOLib Version:       v%s" % GetDUOLibVersion() )
 
     ri = DUOResolutionInfo()
 
@@ -43,35 +44,38 @@ def main():
 
         # Open DUO
         if OpenDUO( duo ):
-            print "DUO Device Name:      '%s'" % GetDUODeviceName( duo )
-            print "DUO Serial Number:    %s" % GetDUOSerialNumber( duo )
-            print "DUO Firmware Version: v%s" % GetDUOFirmwareVersion( duo )
-            print "DUO Firmware Build:   %s" % GetDUOFirmwareBuild( duo )
+            print( "DUO Device Name:      '%s'" % GetDUODeviceName( duo ) )
+            print( "DUO Serial Number:    %s" % GetDUOSerialNumber( duo ) )
+            print( "DUO Firmware Version: v%s" % GetDUOFirmwareVersion( duo ) )
+            print( "DUO Firmware Build:   %s" % GetDUOFirmwareBuild( duo ) )
 
             # Set selected resolution
             SetDUOResolutionInfo( duo, ri )
 
+            # Cached parameters, unchanged values are not written to the device
+            device = DUODevice( duo )
+
             led_pwm = 30
             # Set the LED brightness value in %
-            SetDUOLedPWM( duo, led_pwm )
+            device.ledPWM = led_pwm
 
             # Start capture (no callback function)
             if StartDUO( duo, None, None ):
-                print "Use '+' to increase the brightness of the LEDs"
-                print "Use '-' to decrease the brightness of the LEDs"
-                print "Use '<Esc>' to exit the program\n"
+                print( "Use '+' to increase the brightness of the LEDs" )
+                print( "Use '-' to decrease the brightness of the LEDs" )
+                print( "Use '<Esc>' to exit the program\n" )
 
                 ch = 0
                 while True:
-                    ch = getch()
+                    ch = ord( getch() )
 
                     if ch == ord( '-' ):
                         led_pwm = ( led_pwm - 1 if led_pwm > 0 else 0 )
                     elif ch == ord( '+' ):
                         led_pwm = ( led_pwm + 1 if led_pwm < 100 else 100 )
 
-                    print "LED: %3d%%" % led_pwm
-                    SetDUOLedPWM( duo, led_pwm )
+                    print( "LED: %3d%%" % led_pwm )
+                    device.ledPWM = led_pwm
 
                     if ch == 27:
                         break;
@@ -79,12 +83,14 @@ def main():
                 # Stop capture
                 StopDUO( duo )
             else:
-                print "Could not start DUO camera"
+                print( "Could not start DUO camera" )
+
+            device.close()
 
             # Close DUO
             CloseDUO( duo )
         else:
-            print "Could not open DUO camera"
+            print( "Could not open DUO camera" )
 
     return 0
 
@@ -23,8 +23,10 @@
     under grant agreement No 643636 "Sound of Vision."
 """
 
+import os
 from distutils.sysconfig import get_python_lib
-from setuptools import setup
+from setuptools import setup, Extension
+from setuptools.command.build_ext import build_ext
 
 def readme():
    with open( 'README.md' ) as f:
@@ -41,6 +43,34 @@ def getDataFiles():
    else:
       return None
 
+class BuildSharedLibrary( build_ext ):
+   """
+   Builds the extensions as plain shared libraries for ctypes:
+   no Python module init function and no importable file name
+   """
+   def get_export_symbols( self, ext ):
+      return ext.export_symbols
+
+   def get_ext_filename( self, ext_name ):
+      import sys
+      parts = ext_name.split( "." )
+      if sys.platform.startswith( "win" ):
+         filename = parts[-1] + ".dll"
+      elif sys.platform.startswith( "darwin" ):
+         filename = "lib" + parts[-1] + ".dylib"
+      else:
+         filename = "lib" + parts[-1] + ".so"
+      return os.path.join( *( parts[:-1] + [ filename ] ) )
+
+def getExtModules():
+   import sys
+   # Native capture helper (duo3d.native), loaded with ctypes
+   libraries = [] if sys.platform.startswith( "win" ) else [ "pthread" ]
+   return [ Extension( 'duo3d.duocapture',
+                       sources = [ 'src/_duocapture.c' ],
+                       libraries = libraries,
+                       optional = True ) ]
+
 setup( name = 'duo3d',
    version = '0.2',
    description = 'DUOSDK python bindings',
@@ -48,8 +78,10 @@ setup( name = 'duo3d',
    classifiers = [
 	   'Development Status :: 3 - Alpha',
 	   'License :: OSI Approved :: MIT License',
-	   'Programming Language :: Python :: 2.7',
+	   'Programming Language :: Python :: 3',
+	   'Programming Language :: Python :: 3 :: Only',
 	   ],
+   python_requires = '>=3.8',
    keywords = 'duo3d, imu',
    url = 'https://github.com/MateuszOwczarek/python-duo3d',
    author = 'Mateusz Owczarek',
@@ -58,6 +90,8 @@ setup( name = 'duo3d',
    packages = ['duo3d'],
    package_dir = {'duo3d': 'src'},
    data_files = getDataFiles(),
+   ext_modules = getExtModules(),
+   cmdclass = { 'build_ext': BuildSharedLibrary },
    include_package_data = True,
    zip_safe = False
  )
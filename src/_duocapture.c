@@ -0,0 +1,297 @@
+/*
+ * duo3d native capture helper
+ *
+ * DUOCaptureCallback is passed directly to StartDUO as DUOFrameCallback
+ * (with the DUOCapture handle as pUserData), so the DUO capture thread
+ * copies frames into a preallocated ring and bumps the sequence counter
+ * without ever entering the Python interpreter.
+ * Python consumers block in DUOCaptureWait / copy in DUOCaptureRead on
+ * their own threads; ctypes releases the GIL for both calls.
+ *
+ * setup.py builds it as a plain shared library (libduocapture.so,
+ * libduocapture.dylib or duocapture.dll), loaded with ctypes only.
+ */
+
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+
+#ifdef _WIN32
+#include <windows.h>
+#define DUO_EXPORT __declspec( dllexport )
+typedef SRWLOCK duo_mutex_t;
+typedef CONDITION_VARIABLE duo_cond_t;
+#define duo_mutex_init( m ) InitializeSRWLock( m )
+#define duo_mutex_destroy( m )
+#define duo_mutex_lock( m ) AcquireSRWLockExclusive( m )
+#define duo_mutex_unlock( m ) ReleaseSRWLockExclusive( m )
+#define duo_cond_init( c ) InitializeConditionVariable( c )
+#define duo_cond_destroy( c )
+#define duo_cond_broadcast( c ) WakeAllConditionVariable( c )
+#else
+#include <errno.h>
+#include <pthread.h>
+#include <sys/time.h>
+#define DUO_EXPORT __attribute__( ( visibility( "default" ) ) )
+typedef pthread_mutex_t duo_mutex_t;
+typedef pthread_cond_t duo_cond_t;
+#define duo_mutex_init( m ) pthread_mutex_init( m, NULL )
+#define duo_mutex_destroy( m ) pthread_mutex_destroy( m )
+#define duo_mutex_lock( m ) pthread_mutex_lock( m )
+#define duo_mutex_unlock( m ) pthread_mutex_unlock( m )
+#define duo_cond_init( c ) pthread_cond_init( c, NULL )
+#define duo_cond_destroy( c ) pthread_cond_destroy( c )
+#define duo_cond_broadcast( c ) pthread_cond_broadcast( c )
+#endif
+
+#define DUO_MAX_IMU_SAMPLES 100
+
+/* Must match DUOIMUSample / DUOFrame from DUOLib.h (and duo3d.py) */
+typedef struct
+{
+    uint32_t timeStamp;
+    float tempData;
+    float accelData[3];
+    float gyroData[3];
+} DUOIMUSample;
+
+typedef struct
+{
+    uint32_t width;
+    uint32_t height;
+    uint8_t ledSeqTag;
+    uint32_t timeStamp;
+    uint8_t *leftData;
+    uint8_t *rightData;
+    uint8_t IMUPresent;
+    uint32_t IMUSamples;
+    DUOIMUSample IMUData[DUO_MAX_IMU_SAMPLES];
+} DUOFrame;
+
+/* Frame metadata returned by DUOCaptureRead */
+typedef struct
+{
+    uint64_t seq;
+    uint32_t width;
+    uint32_t height;
+    uint32_t timeStamp;
+    uint32_t IMUSamples;
+    uint8_t ledSeqTag;
+    uint8_t IMUPresent;
+} DUOCaptureInfo;
+
+typedef struct
+{
+    uint64_t seq; /* 0 while empty or being written */
+    DUOCaptureInfo info;
+    uint8_t *left;
+    uint8_t *right;
+    DUOIMUSample imu[DUO_MAX_IMU_SAMPLES];
+} DUOCaptureSlot;
+
+typedef struct
+{
+    duo_mutex_t lock;
+    duo_cond_t cond;
+    uint32_t width;
+    uint32_t height;
+    uint32_t size;
+    uint64_t seq;      /* last completed frame */
+    uint64_t received; /* frames passed to the callback */
+    uint64_t dropped;  /* frames with unexpected size */
+    int closed;
+    DUOCaptureSlot *slots;
+    uint8_t *images;
+} DUOCapture;
+
+DUO_EXPORT void DUOCaptureDestroy( DUOCapture *cap );
+
+DUO_EXPORT DUOCapture *DUOCaptureCreate( uint32_t width, uint32_t height, uint32_t size )
+{
+    size_t image_size = ( size_t )width * height;
+    uint32_t i;
+    DUOCapture *cap;
+
+    if ( size < 2 )
+        return NULL;
+    cap = ( DUOCapture * )calloc( 1, sizeof( DUOCapture ) );
+    if ( !cap )
+        return NULL;
+    cap->width = width;
+    cap->height = height;
+    cap->size = size;
+    cap->slots = ( DUOCaptureSlot * )calloc( size, sizeof( DUOCaptureSlot ) );
+    cap->images = ( uint8_t * )malloc( 2 * image_size * size + 1 );
+    if ( !cap->slots || !cap->images )
+    {
+        free( cap->slots );
+        free( cap->images );
+        free( cap );
+        return NULL;
+    }
+    for ( i = 0; i < size; i++ )
+    {
+        cap->slots[i].left = cap->images + 2 * image_size * i;
+        cap->slots[i].right = cap->slots[i].left + image_size;
+    }
+    duo_mutex_init( &cap->lock );
+    duo_cond_init( &cap->cond );
+    return cap;
+}
+
+DUO_EXPORT void DUOCaptureDestroy( DUOCapture *cap )
+{
+    if ( !cap )
+        return;
+    duo_cond_destroy( &cap->cond );
+    duo_mutex_destroy( &cap->lock );
+    free( cap->images );
+    free( cap->slots );
+    free( cap );
+}
+
+/* DUOFrameCallback, pUserData must be the DUOCapture handle */
+DUO_EXPORT void DUOCaptureCallback( const DUOFrame *frame, void *userData )
+{
+    DUOCapture *cap = ( DUOCapture * )userData;
+    size_t image_size = ( size_t )cap->width * cap->height;
+    uint32_t samples;
+    DUOCaptureSlot *slot;
+    uint64_t seq;
+
+    duo_mutex_lock( &cap->lock );
+    cap->received++;
+    if ( frame->width != cap->width || frame->height != cap->height || cap->closed )
+    {
+        cap->dropped++;
+        duo_mutex_unlock( &cap->lock );
+        return;
+    }
+    seq = cap->seq + 1;
+    slot = &cap->slots[seq % cap->size];
+    slot->seq = 0;
+    duo_mutex_unlock( &cap->lock );
+
+    memcpy( slot->left, frame->leftData, image_size );
+    memcpy( slot->right, frame->rightData, image_size );
+    samples = frame->IMUSamples < DUO_MAX_IMU_SAMPLES ? frame->IMUSamples : DUO_MAX_IMU_SAMPLES;
+    memcpy( slot->imu, frame->IMUData, samples * sizeof( DUOIMUSample ) );
+    slot->info.seq = seq;
+    slot->info.width = frame->width;
+    slot->info.height = frame->height;
+    slot->info.timeStamp = frame->timeStamp;
+    slot->info.IMUSamples = samples;
+    slot->info.ledSeqTag = frame->ledSeqTag;
+    slot->info.IMUPresent = frame->IMUPresent;
+
+    duo_mutex_lock( &cap->lock );
+    slot->seq = seq;
+    cap->seq = seq;
+    duo_cond_broadcast( &cap->cond );
+    duo_mutex_unlock( &cap->lock );
+}
+
+/*
+ * Waits until a frame newer than 'after' is captured.
+ * Returns the sequence number of the latest frame, or 'after' on timeout / close.
+ * Negative timeoutMs waits forever.
+ */
+DUO_EXPORT uint64_t DUOCaptureWait( DUOCapture *cap, uint64_t after, int32_t timeoutMs )
+{
+    uint64_t seq;
+
+    duo_mutex_lock( &cap->lock );
+#ifdef _WIN32
+    while ( cap->seq <= after && !cap->closed && timeoutMs != 0 )
+    {
+        DWORD start = GetTickCount();
+        DWORD elapsed;
+        if ( !SleepConditionVariableSRW( &cap->cond, &cap->lock,
+                                          timeoutMs < 0 ? INFINITE : ( DWORD )timeoutMs, 0 ) )
+            break;
+        if ( timeoutMs > 0 )
+        {
+            elapsed = GetTickCount() - start;
+            timeoutMs = elapsed >= ( DWORD )timeoutMs ? 0 : timeoutMs - ( int32_t )elapsed;
+        }
+    }
+#else
+    if ( timeoutMs < 0 )
+    {
+        while ( cap->seq <= after && !cap->closed )
+            pthread_cond_wait( &cap->cond, &cap->lock );
+    }
+    else
+    {
+        struct timeval now;
+        struct timespec deadline;
+        gettimeofday( &now, NULL );
+        deadline.tv_sec = now.tv_sec + timeoutMs / 1000;
+        deadline.tv_nsec = now.tv_usec * 1000L + ( timeoutMs % 1000 ) * 1000000L;
+        if ( deadline.tv_nsec >= 1000000000L )
+        {
+            deadline.tv_sec++;
+            deadline.tv_nsec -= 1000000000L;
+        }
+        while ( cap->seq <= after && !cap->closed )
+        {
+            if ( pthread_cond_timedwait( &cap->cond, &cap->lock, &deadline ) == ETIMEDOUT )
+                break;
+        }
+    }
+#endif
+    seq = cap->seq > after ? cap->seq : after;
+    duo_mutex_unlock( &cap->lock );
+    return seq;
+}
+
+/*
+ * Copies frame 'seq' into the given buffers (any of them may be NULL).
+ * Returns 1 on success, 0 if the frame is not in the ring (not captured yet or overwritten).
+ */
+DUO_EXPORT int DUOCaptureRead( DUOCapture *cap, uint64_t seq, uint8_t *left, uint8_t *right,
+                               DUOIMUSample *imu, DUOCaptureInfo *info )
+{
+    size_t image_size = ( size_t )cap->width * cap->height;
+    DUOCaptureSlot *slot = &cap->slots[seq % cap->size];
+    int valid;
+
+    duo_mutex_lock( &cap->lock );
+    valid = ( seq != 0 && slot->seq == seq );
+    duo_mutex_unlock( &cap->lock );
+    if ( !valid )
+        return 0;
+
+    if ( left )
+        memcpy( left, slot->left, image_size );
+    if ( right )
+        memcpy( right, slot->right, image_size );
+    if ( imu )
+        memcpy( imu, slot->imu, slot->info.IMUSamples * sizeof( DUOIMUSample ) );
+    if ( info )
+        *info = slot->info;
+
+    /* The slot might have been reused by the capture thread while copying */
+    duo_mutex_lock( &cap->lock );
+    valid = ( slot->seq == seq );
+    duo_mutex_unlock( &cap->lock );
+    return valid;
+}
+
+/* Wakes up all the waiting consumers, further frames are dropped */
+DUO_EXPORT void DUOCaptureClose( DUOCapture *cap )
+{
+    duo_mutex_lock( &cap->lock );
+    cap->closed = 1;
+    duo_cond_broadcast( &cap->cond );
+    duo_mutex_unlock( &cap->lock );
+}
+
+DUO_EXPORT void DUOCaptureStats( DUOCapture *cap, uint64_t *seq, uint64_t *received, uint64_t *dropped )
+{
+    duo_mutex_lock( &cap->lock );
+    *seq = cap->seq;
+    *received = cap->received;
+    *dropped = cap->dropped;
+    duo_mutex_unlock( &cap->lock );
+}
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.benchmark
+
+    @brief: Capture pipeline benchmark
+
+    Runs every resolution mode returned by EnumerateDUOResolutions with
+    several frame consumer strategies and reports sustained fps, callback
+    duration percentiles, dropped frames (gaps in DUOFrame.timeStamp) and
+    process CPU time per frame.
+
+        python -m duo3d.benchmark --duration 2 --json results.json
+
+    Falls back to the synthetic backend if no device can be opened
+    (or always, with --synthetic); the previous backend is restored afterwards.
+"""
+
+import argparse
+import array
+import json
+import sys
+import threading
+import time
+
+import numpy as np
+
+from . import duo3d as _duo3d
+from .duo3d import (CloseDUO, GetDUOLibVersion, OpenDUO,
+                    SetDUOBackend, SetDUOIMURate, SetDUOResolutionInfo, StartDUO, StopDUO,
+                    DUOFrameCallback, DUOInstance)
+from .frame import DetachDUOFrameImages, GetDUOFrameImages, GetDUOFrameIMU, DUO_IMU_DTYPE
+from .modes import GetDUOModeTable
+from .native import DUONativeCapture, _find_caplib
+
+__all__ = [
+    "BenchmarkDUOMode", "RunDUOBenchmark", "DUO_BENCHMARK_STRATEGIES",
+    ]
+
+def _bare( width, height ):
+    def consume( pFrameData ):
+        pass
+    return consume
+
+def _copy( width, height ):
+    left = np.empty( ( height, width ), np.uint8 )
+    right = np.empty( ( height, width ), np.uint8 )
+    def consume( pFrameData ):
+        DetachDUOFrameImages( pFrameData, left, right )
+    return consume
+
+def _view( width, height ):
+    def consume( pFrameData ):
+        left, right = GetDUOFrameImages( pFrameData )
+        left[0, 0], right[0, 0]
+    return consume
+
+def _imu( width, height ):
+    out = np.empty( 100, DUO_IMU_DTYPE )
+    def consume( pFrameData ):
+        GetDUOFrameIMU( pFrameData, out )
+    return consume
+
+def _native( width, height ):
+    return DUONativeCapture( width, height, 4 )
+
+def _drain( capture, arrivals, durations, stamps ):
+    # Consumer thread of the native strategy, times the copy out of the native ring
+    clock = time.perf_counter
+    seq = 0
+    while capture.wait( seq ) > seq:
+        start = clock()
+        slot = capture.get( 0 )
+        end = clock()
+        if slot is None:
+            continue
+        seq = slot.seq
+        arrivals.append( start )
+        durations.append( end - start )
+        stamps.append( slot.timeStamp )
+
+# Frame consumer strategies: name -> factory( width, height ) returning consume( pFrameData )
+# or a DUONativeCapture
+DUO_BENCHMARK_STRATEGIES = {
+    "bare": _bare,  # Empty callback, cost of the ctypes callback itself
+    "copy": _copy,  # DetachDUOFrameImages into preallocated arrays
+    "view": _view,  # Zero-copy GetDUOFrameImages
+    "imu": _imu,  # GetDUOFrameIMU into a preallocated array
+    "native": _native,  # GIL-free C callback, callback_us is the consumer copy (DUONativeCapture.get)
+    }
+
+def _default_strategies():
+    strategies = sorted( DUO_BENCHMARK_STRATEGIES )
+    try:
+        _find_caplib()
+    except ImportError:  # Native capture helper not built
+        strategies.remove( "native" )
+    return strategies
+
+def _percentiles( values, scale = 1.0 ):
+    if not len( values ):
+        return { "p50": None, "p90": None, "p99": None, "max": None }
+    v = np.asarray( values ) * scale
+    p50, p90, p99 = np.percentile( v, [ 50, 90, 99 ] )
+    return { "p50": float( p50 ), "p90": float( p90 ), "p99": float( p99 ), "max": float( v.max() ) }
+
+def _dropped_frames( stamps, fps ):
+    """
+    Counts frames missing from the sequence of timeStamps (100us units)
+    """
+    if len( stamps ) < 2:
+        return 0
+    gaps = np.diff( np.asarray( stamps, np.int64 ) ) % ( 1 << 32 )
+    period = 10000.0 / fps
+    return int( np.maximum( np.round( gaps / period ) - 1, 0 ).sum() )
+
+def BenchmarkDUOMode( duo, resolution, strategy = "bare", duration = 2.0 ):
+    """
+    Captures frames for the given time with a single consumer strategy.
+
+    @param duo: opened DUOInstance
+    @param resolution: DUOResolutionInfo to benchmark
+    @param strategy: key of DUO_BENCHMARK_STRATEGIES
+    @param duration: capture time in seconds
+    @return: dict with the measurements
+    """
+    width, height = resolution.width, resolution.height
+    consume = DUO_BENCHMARK_STRATEGIES[strategy]( width, height )
+    arrivals = array.array( "d" )
+    durations = array.array( "d" )
+    stamps = array.array( "L" )
+    clock = time.perf_counter
+
+    def callback( pFrameData, pUserData ):
+        start = clock()
+        consume( pFrameData )
+        end = clock()
+        arrivals.append( start )
+        durations.append( end - start )
+        stamps.append( pFrameData.contents.timeStamp )
+
+    native = isinstance( consume, DUONativeCapture )
+    if native:
+        frame_callback, user_data = consume.callback, consume.userData
+        consumer = threading.Thread( target = _drain, args = ( consume, arrivals, durations, stamps ),
+                                     name = "DUOBenchmark" )
+    else:
+        frame_callback, user_data = DUOFrameCallback( callback ), None
+    if not SetDUOResolutionInfo( duo, resolution ):
+        raise IOError( "Could not set DUO resolution %dx%d@%.1f" % ( width, height, resolution.fps ) )
+    cpu_start = time.process_time()
+    if native:
+        consumer.start()
+    try:
+        if not StartDUO( duo, frame_callback, user_data ):
+            raise IOError( "Could not start DUO camera" )
+        time.sleep( duration )
+        StopDUO( duo )
+    finally:
+        if native:
+            consume.close()
+            consumer.join()
+    cpu = time.process_time() - cpu_start
+
+    frames = len( arrivals )
+    elapsed = arrivals[-1] - arrivals[0] if frames > 1 else 0.0
+    return {
+        "width": width,
+        "height": height,
+        "binning": resolution.binning,
+        "fps": round( resolution.fps, 3 ),
+        "strategy": strategy,
+        "frames": frames,
+        "sustained_fps": ( frames - 1 ) / elapsed if elapsed > 0 else 0.0,
+        "dropped": _dropped_frames( stamps, resolution.fps ),
+        "callback_us": _percentiles( durations, 1e6 ),
+        "interval_ms": _percentiles( np.diff( arrivals ) if frames > 1 else [], 1e3 ),
+        "cpu_us_per_frame": cpu / frames * 1e6 if frames else None,
+        }
+
+def _enumerate_modes( fpsScale ):
+    # DUOModeTable returns new DUOResolutionInfo set to the maximum fps
+    result = []
+    for ri in GetDUOModeTable():
+        ri.fps *= fpsScale
+        result.append( ri )
+    return result
+
+def _open( synthetic ):
+    if synthetic:
+        SetDUOBackend( "synthetic" )
+    duo = DUOInstance()
+    try:
+        opened = OpenDUO( duo )
+    except ImportError:
+        opened = False
+    if not opened and not synthetic:
+        SetDUOBackend( "synthetic" )
+        return _open( True )
+    if not opened:
+        raise IOError( "Could not open DUO camera" )
+    return duo, synthetic
+
+def RunDUOBenchmark( strategies = None, duration = 2.0, synthetic = False, sizes = None,
+                     fpsScale = 1.0, imuRate = None, report = None ):
+    """
+    Benchmarks all the enumerated resolution modes.
+
+    @param strategies: list of DUO_BENCHMARK_STRATEGIES keys
+                       (all by default, "native" only if the helper is built)
+    @param duration: capture time per mode and strategy in seconds
+    @param synthetic: use the synthetic backend even if a device is attached
+    @param sizes: optional list of (width, height) to limit the modes
+    @param fpsScale: multiplies the enumerated fps (synthetic backend accepts any rate)
+    @param imuRate: optional SetDUOIMURate value
+    @param report: optional function called with every result
+    @return: dict with the environment description and the list of results
+    """
+    strategies = strategies or _default_strategies()
+    previous = _duo3d._duolib._lib  # None if not loaded yet
+    try:
+        duo, synthetic = _open( synthetic )
+    except Exception:
+        SetDUOBackend( previous )
+        raise
+    results = []
+    try:
+        if imuRate is not None:
+            SetDUOIMURate( duo, imuRate )
+        for ri in _enumerate_modes( fpsScale ):
+            if sizes and ( ri.width, ri.height ) not in sizes:
+                continue
+            for strategy in strategies:
+                result = BenchmarkDUOMode( duo, ri, strategy, duration )
+                results.append( result )
+                if report is not None:
+                    report( result )
+        lib_version = GetDUOLibVersion()
+    finally:
+        CloseDUO( duo )
+        if synthetic:
+            SetDUOBackend( previous )
+    return {
+        "library": lib_version.decode( "ascii", "replace" ) if isinstance( lib_version, bytes ) else lib_version,
+        "synthetic": synthetic,
+        "python": sys.version.split()[0],
+        "duration": duration,
+        "results": results,
+        }
+
+def _print_result( result ):
+    cb = result["callback_us"]
+    print( "%4dx%-4d bin %2d %7.1f fps  %-6s  %7.1f fps  drop %5d  cb p50 %7.1f p99 %8.1f us  cpu %7.1f us/frame" % (
+        result["width"], result["height"], result["binning"], result["fps"], result["strategy"],
+        result["sustained_fps"], result["dropped"], cb["p50"] or 0, cb["p99"] or 0,
+        result["cpu_us_per_frame"] or 0 ) )
+
+def main( argv = None ):
+    parser = argparse.ArgumentParser( description = "DUO capture pipeline benchmark" )
+    parser.add_argument( "--duration", type = float, default = 2.0,
+                         help = "capture time per mode and strategy in seconds" )
+    parser.add_argument( "--strategy", action = "append", choices = sorted( DUO_BENCHMARK_STRATEGIES ),
+                         help = "consumer strategy (repeatable, all by default)" )
+    parser.add_argument( "--size", action = "append", metavar = "WxH",
+                         help = "limit to frame size (repeatable)" )
+    parser.add_argument( "--fps-scale", type = float, default = 1.0,
+                         help = "multiply the enumerated fps (synthetic backend only)" )
+    parser.add_argument( "--imu-rate", type = float, help = "IMU rate [50,500] Hz" )
+    parser.add_argument( "--synthetic", action = "store_true", help = "use the synthetic backend" )
+    parser.add_argument( "--json", metavar = "FILE", help = "write results as JSON ('-' for stdout)" )
+    args = parser.parse_args( argv )
+
+    sizes = [ tuple( int( v ) for v in s.lower().split( "x" ) ) for s in args.size or [] ]
+    quiet = args.json == "-"
+    summary = RunDUOBenchmark( args.strategy, args.duration, args.synthetic, sizes,
+                               args.fps_scale, args.imu_rate,
+                               None if quiet else _print_result )
+    if args.json:
+        if quiet:
+            json.dump( summary, sys.stdout, indent = 2 )
+        else:
+            with open( args.json, "w" ) as f:
+                json.dump( summary, f, indent = 2 )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit( main() )
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.calibration
+
+    @brief: Cached DUO calibration as read-only NumPy matrices
+
+    GetDUOCalibration reads the intrinsics, extrinsics and stereo parameters
+    once per device and resolution. The cached DUOCalibration is dropped when
+    SetDUOResolutionInfo changes the mode or the device is closed:
+
+        calib = GetDUOCalibration( duo )
+        fx = calib.M1[0, 0]
+        calib.save( "duo.npz" )  # offline tools: DUOCalibration.load( "duo.npz" )
+
+    Arrays (float64, read-only):
+        leftCamera, rightCamera         3x3 camera matrices (DUO_INTR)
+        leftDistortion, rightDistortion k1, k2, p1, p2, k3, k4, k5, k6 (DUO_INTR)
+        rotation, translation           3x3, 3 (DUO_EXTR)
+        M1, M2, D1, D2, R, T, R1, R2    see DUO_STEREO
+        P1, P2                          3x4
+        Q                               4x4
+"""
+
+import ctypes as ct
+import threading
+
+import numpy as np
+
+from . import duo3d as _duo3d
+from .duo3d import (GetDUOExtrinsics, GetDUOIntrinsics, GetDUOResolutionInfo,
+                    GetDUOSerialNumber, GetDUOStereoParameters, DUO_STEREO)
+
+__all__ = [
+    "DUOCalibration", "GetDUOCalibration", "InvalidateDUOCalibration",
+    ]
+
+# DUO_STEREO field shapes
+_STEREO_SHAPES = (
+    ( "M1", ( 3, 3 ) ), ( "M2", ( 3, 3 ) ),
+    ( "D1", ( 8, ) ), ( "D2", ( 8, ) ),
+    ( "R", ( 3, 3 ) ), ( "T", ( 3, ) ),
+    ( "R1", ( 3, 3 ) ), ( "R2", ( 3, 3 ) ),
+    ( "P1", ( 3, 4 ) ), ( "P2", ( 3, 4 ) ),
+    ( "Q", ( 4, 4 ) ),
+    )
+
+_ARRAYS = ( "leftCamera", "rightCamera", "leftDistortion", "rightDistortion",
+            "rotation", "translation" ) + tuple( name for name, shape in _STEREO_SHAPES )
+
+def _readonly( values, shape ):
+    a = np.array( values, np.float64 ).reshape( shape )
+    a.flags.writeable = False
+    return a
+
+def _camera( intr ):
+    return [ intr.fx, 0.0, intr.cx, 0.0, intr.fy, intr.cy, 0.0, 0.0, 1.0 ]
+
+def _distortion( intr ):
+    return [ intr.k1, intr.k2, intr.p1, intr.p2, intr.k3, intr.k4, intr.k5, intr.k6 ]
+
+class DUOCalibration( object ):
+    """
+    Immutable calibration of a DUO device at one resolution
+    """
+
+    def __init__( self, width, height, arrays, serial = None ):
+        """
+        @param width: frame width the calibration applies to
+        @param height: frame height
+        @param arrays: dict with all the arrays listed in the module description
+        @param serial: device serial number
+        """
+        self.width = width
+        self.height = height
+        self.serial = serial
+        for name in _ARRAYS:
+            value = np.asarray( arrays[name], np.float64 )
+            setattr( self, name, _readonly( value, value.shape ) )
+
+    @classmethod
+    def from_structures( cls, intr, extr, stereo, width, height, serial = None ):
+        """
+        Creates the calibration from DUO_INTR, DUO_EXTR and DUO_STEREO structures
+        """
+        arrays = {
+            "leftCamera": _readonly( _camera( intr.left ), ( 3, 3 ) ),
+            "rightCamera": _readonly( _camera( intr.right ), ( 3, 3 ) ),
+            "leftDistortion": _readonly( _distortion( intr.left ), ( 8, ) ),
+            "rightDistortion": _readonly( _distortion( intr.right ), ( 8, ) ),
+            "rotation": _readonly( extr.rotation[:], ( 3, 3 ) ),
+            "translation": _readonly( extr.translation[:], ( 3, ) ),
+            }
+        for name, shape in _STEREO_SHAPES:
+            arrays[name] = _readonly( getattr( stereo, name )[:], shape )
+        return cls( width, height, arrays, serial )
+
+    @classmethod
+    def from_device( cls, duo ):
+        """
+        Reads the calibration of an opened device for its current resolution
+        (use GetDUOCalibration for the cached one)
+        """
+        ri = GetDUOResolutionInfo( duo )
+        serial = GetDUOSerialNumber( duo )
+        if isinstance( serial, bytes ):
+            serial = serial.decode( "ascii", "replace" )
+        return cls.from_structures( GetDUOIntrinsics( duo ), GetDUOExtrinsics( duo ),
+                                    GetDUOStereoParameters( duo ), ri.width, ri.height, serial )
+
+    def stereo( self ):
+        """
+        Returns the stereo parameters as a new DUO_STEREO structure
+        """
+        val = DUO_STEREO()
+        for name, shape in _STEREO_SHAPES:
+            getattr( val, name )[:] = getattr( self, name ).reshape( -1 ).tolist()
+        return val
+
+    @property
+    def baseline( self ):
+        """
+        Distance between the cameras in the units of T
+        """
+        return float( np.linalg.norm( self.T ) )
+
+    def save( self, path ):
+        """
+        Writes the calibration to a .npz file
+        """
+        arrays = dict( ( name, getattr( self, name ) ) for name in _ARRAYS )
+        np.savez( path, width = self.width, height = self.height,
+                  serial = self.serial or "", **arrays )
+
+    @classmethod
+    def load( cls, path ):
+        """
+        Reads a calibration written by save()
+        """
+        with np.load( path ) as data:
+            arrays = dict( ( name, data[name] ) for name in _ARRAYS )
+            serial = str( data["serial"] ) or None
+            return cls( int( data["width"] ), int( data["height"] ), arrays, serial )
+
+    def __eq__( self, other ):
+        if not isinstance( other, DUOCalibration ):
+            return NotImplemented
+        return ( self.width, self.height ) == ( other.width, other.height ) and \
+            all( np.array_equal( getattr( self, name ), getattr( other, name ) ) for name in _ARRAYS )
+
+    def __ne__( self, other ):
+        result = self.__eq__( other )
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__( self ):
+        return "DUOCalibration(%s, %dx%d, baseline %.3f)" % ( self.serial, self.width,
+                                                              self.height, self.baseline )
+
+_cacheLock = threading.Lock()
+_cache = {}
+_generation = [ 0 ]  # Incremented by every invalidation
+
+def _handle( duo ):
+    return duo.value if isinstance( duo, ct.c_void_p ) else duo
+
+def GetDUOCalibration( duo ):
+    """
+    Returns the cached DUOCalibration of an opened device for its current resolution
+
+    @param duo: DUOInstance
+    """
+    key = _handle( duo )
+    with _cacheLock:
+        calib = _cache.get( key )
+        generation = _generation[0]
+    if calib is None:
+        calib = DUOCalibration.from_device( duo )
+        with _cacheLock:
+            # Not cached if the mode changed while reading
+            if generation == _generation[0]:
+                calib = _cache.setdefault( key, calib )
+    return calib
+
+def InvalidateDUOCalibration( duo = None ):
+    """
+    Drops the cached calibration of a device (of all devices if duo is None).
+    Called automatically by SetDUOResolutionInfo and CloseDUO.
+    """
+    with _cacheLock:
+        _generation[0] += 1
+        if duo is None:
+            _cache.clear()
+        else:
+            _cache.pop( _handle( duo ), None )
+
+_duo3d._deviceListeners.append( InvalidateDUOCalibration )
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.capture
+
+    @brief: Preallocated frame ring fed from DUOFrameCallback
+
+    DUOFrameCallback is called in the context of the DUO capture thread and
+    must return as soon as possible. DUOFrameRing does exactly one memmove
+    per eye (plus one for the valid IMU samples) into a preallocated slot
+    and hands the slot over to the consumer thread.
+
+    Usage:
+        ring = DUOFrameRing( width, height, 8 )
+        StartDUO( duo, ring.callback, None )
+        for slot in ring:
+            process( slot.left, slot.right )
+"""
+
+import collections
+import ctypes as ct
+import threading
+
+import numpy as np
+
+from .duo3d import DUOFrame, DUOFrameCallback, DUOIMUSample, DUO_MAX_IMU_SAMPLES
+from .frame import DUO_IMU_DTYPE
+
+__all__ = [
+    "DUOFrameRing", "DUOFrameSlot",
+    "DUO_RING_DROP_NEWEST", "DUO_RING_OVERWRITE_OLDEST",
+    ]
+
+# DUO frame ring policy when all the slots are full
+DUO_RING_OVERWRITE_OLDEST = 0  # Discard the oldest unread frame
+DUO_RING_DROP_NEWEST = 1  # Discard the incoming frame
+
+_IMU_OFFSET = DUOFrame.IMUData.offset
+_IMU_SAMPLE_SIZE = ct.sizeof( DUOIMUSample )
+
+class DUOFrameSlot( object ):
+    """
+    Single preallocated ring slot holding a copy of DUOFrame
+    """
+    __slots__ = ( "index", "seq", "width", "height", "ledSeqTag", "timeStamp",
+                  "left", "right", "IMUPresent", "IMUSamples", "IMUData",
+                  "_leftAddr", "_rightAddr", "_imuAddr", "_imu" )
+
+    def __init__( self, index, width, height ):
+        self.index = index
+        self.seq = -1  # Sequence number of the frame in the ring (-1 if empty)
+        self.width = width
+        self.height = height
+        self.ledSeqTag = 0
+        self.timeStamp = 0
+        self.left = np.zeros( ( height, width ), np.uint8 )
+        self.right = np.zeros( ( height, width ), np.uint8 )
+        self.IMUPresent = False
+        self.IMUSamples = 0
+        self.IMUData = ( DUOIMUSample * DUO_MAX_IMU_SAMPLES )()
+        self._leftAddr = self.left.ctypes.data
+        self._rightAddr = self.right.ctypes.data
+        self._imuAddr = ct.addressof( self.IMUData )
+        self._imu = np.frombuffer( self.IMUData, DUO_IMU_DTYPE )
+
+    @property
+    def imu( self ):
+        """
+        Valid IMU samples as a DUO_IMU_DTYPE structured array (view of IMUData)
+        """
+        return self._imu[:self.IMUSamples]
+
+class DUOFrameRing( object ):
+    """
+    Fixed-size ring of preallocated stereo + IMU slots.
+
+    The producer side (push / callback) never allocates and never waits
+    for the consumer. A slot returned by get() or latest() belongs to the
+    consumer until the next get() / latest() / release() call.
+    """
+
+    def __init__( self, width, height, size = 8, policy = DUO_RING_OVERWRITE_OLDEST ):
+        """
+        @param width: frame width (as set with SetDUOResolutionInfo)
+        @param height: frame height
+        @param size: number of slots, at least 2
+        @param policy: DUO_RING_OVERWRITE_OLDEST or DUO_RING_DROP_NEWEST
+        """
+        if size < 2:
+            raise ValueError( "DUOFrameRing needs at least 2 slots" )
+        if policy not in ( DUO_RING_OVERWRITE_OLDEST, DUO_RING_DROP_NEWEST ):
+            raise ValueError( "unknown DUOFrameRing policy: %r" % ( policy, ) )
+
+        self.width = width
+        self.height = height
+        self.size = size
+        self.policy = policy
+        self.slots = [ DUOFrameSlot( i, width, height ) for i in range( size ) ]
+
+        self.received = 0  # Frames passed to push
+        self.dropped = 0  # Incoming frames discarded (DUO_RING_DROP_NEWEST or bad size)
+        self.overwritten = 0  # Unread frames discarded (DUO_RING_OVERWRITE_OLDEST)
+        self.skipped = 0  # Unread frames discarded by latest()
+
+        self._cond = threading.Condition( threading.Lock() )
+        self._free = list( reversed( self.slots ) )
+        self._ready = collections.deque()
+        self._held = None
+        self._closed = False
+        self._imageSize = width * height
+        self._seq = 0
+
+        # Keep the reference, ctypes callbacks must outlive the capture
+        self.callback = DUOFrameCallback( self._callback )
+
+    def _callback( self, pFrameData, pUserData ):
+        self.push( pFrameData.contents )
+
+    def push( self, frame ):
+        """
+        Copies the frame into a free slot.
+        Called from the DUO capture thread (via callback) or manually.
+
+        @param frame: DUOFrame
+        @return: True if the frame was stored
+        """
+        cond = self._cond
+        with cond:
+            self.received += 1
+            if frame.width * frame.height != self._imageSize:
+                self.dropped += 1
+                return False
+            if self._free:
+                slot = self._free.pop()
+            elif self.policy == DUO_RING_OVERWRITE_OLDEST and self._ready:
+                slot = self._ready.popleft()
+                self.overwritten += 1
+            else:
+                self.dropped += 1
+                return False
+            seq = self._seq
+            self._seq = seq + 1
+
+        # The slot is owned by the producer now, copy without holding the lock
+        ct.memmove( slot._leftAddr, frame.leftData, self._imageSize )
+        ct.memmove( slot._rightAddr, frame.rightData, self._imageSize )
+        samples = min( frame.IMUSamples, DUO_MAX_IMU_SAMPLES )
+        if samples:
+            ct.memmove( slot._imuAddr, ct.addressof( frame ) + _IMU_OFFSET,
+                        samples * _IMU_SAMPLE_SIZE )
+        slot.IMUSamples = samples
+        slot.IMUPresent = bool( frame.IMUPresent )
+        slot.ledSeqTag = frame.ledSeqTag
+        slot.timeStamp = frame.timeStamp
+        slot.seq = seq
+
+        with cond:
+            self._ready.append( slot )
+            cond.notify()
+        return True
+
+    def _release( self ):
+        # Must be called with the lock held
+        if self._held is not None:
+            self._free.append( self._held )
+            self._held = None
+
+    def release( self ):
+        """
+        Returns the slot held by the consumer back to the ring
+        """
+        with self._cond:
+            self._release()
+
+    def get( self, timeout = None ):
+        """
+        Returns the oldest unread frame, waiting for it if necessary.
+
+        @param timeout: seconds to wait, None waits forever
+        @return: DUOFrameSlot, or None on timeout / when the ring is closed
+        """
+        cond = self._cond
+        with cond:
+            self._release()
+            if not self._ready and not self._closed:
+                cond.wait_for( lambda: self._ready or self._closed, timeout )
+            if not self._ready:
+                return None
+            self._held = slot = self._ready.popleft()
+            return slot
+
+    def latest( self ):
+        """
+        Returns the most recent frame without waiting.
+        Older unread frames are returned to the ring (see skipped).
+
+        @return: DUOFrameSlot, or None if there is no unread frame
+        """
+        with self._cond:
+            self._release()
+            ready = self._ready
+            if not ready:
+                return None
+            self._held = slot = ready.pop()
+            self.skipped += len( ready )
+            self._free.extend( ready )
+            ready.clear()
+            return slot
+
+    def pending( self ):
+        """
+        Returns the number of unread frames
+        """
+        return len( self._ready )
+
+    @property
+    def closed( self ):
+        """
+        True once close() was called
+        """
+        return self._closed
+
+    def close( self ):
+        """
+        Wakes up all the waiting consumers; get() returns None once the ring is drained
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __iter__( self ):
+        """
+        Yields frames in capture order until the ring is closed
+        """
+        while True:
+            slot = self.get()
+            if slot is None:
+                return
+            yield slot
@@ -0,0 +1,531 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.compression
+
+    @brief: Lossless compressed stereo recordings
+
+    Frames captured by DUOCompressedRecorder.callback are copied into a
+    DUOFrameRing slot (the only work done on the DUO capture thread), grouped
+    into chunks by a collector thread and compressed by a process pool with
+    zlib or lzma. Optional prediction makes the images compress better:
+
+        DUO_PREDICT_LEFTRIGHT   right image stored as (right - left) mod 256
+        DUO_PREDICT_TEMPORAL    every frame but the first one of a chunk stored
+                                as (frame - previous frame) mod 256
+
+    File layout (little endian):
+        header      64 bytes, see _HEADER
+        chunks      chunk header (_CHUNK) + compressed payload
+        index       chunks * DUO_CHUNK_INDEX_DTYPE, written on close
+
+    Chunk payload (before compression):
+        frames * _META_DTYPE, frames * 2 * height * width image bytes
+        (left, right per frame), all the valid IMU samples of the chunk.
+
+    MeasureDUOCompression reports compression ratio and throughput per
+    worker count (python -m duo3d.compression recording.duo).
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import lzma
+import multiprocessing
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from .duo3d import DUO_MAX_IMU_SAMPLES
+from .frame import DUO_IMU_DTYPE
+from .capture import DUOFrameRing, DUO_RING_DROP_NEWEST
+
+__all__ = [
+    "DUOCompressedRecorder", "DUOCompressedRecording", "MeasureDUOCompression",
+
+    "DUO_CHUNK_INDEX_DTYPE",
+    "DUO_CODEC_LZMA", "DUO_CODEC_ZLIB",
+    "DUO_PREDICT_LEFTRIGHT", "DUO_PREDICT_NONE", "DUO_PREDICT_TEMPORAL",
+    ]
+
+# Compression codecs
+DUO_CODEC_ZLIB = 1
+DUO_CODEC_LZMA = 2
+
+# Image prediction
+DUO_PREDICT_NONE = 0
+DUO_PREDICT_LEFTRIGHT = 1
+DUO_PREDICT_TEMPORAL = 2
+
+_MAGIC = b"DUO3DZIP"
+_VERSION = 1
+# magic, version, width, height, codec, predictor, chunk frames, index offset, chunks
+_HEADER = struct.Struct( "<8sIIIIII QQ 16x" )
+# magic, frames, raw size, compressed size
+_CHUNK = struct.Struct( "<4sIQQ" )
+_CHUNK_MAGIC = b"CHK1"
+
+assert _HEADER.size == 64 and _CHUNK.size == 24
+
+# Per frame metadata stored in the chunk payload
+_META_DTYPE = np.dtype( [
+    ( "seq", "<u4" ),
+    ( "timeStamp", "<u4" ),
+    ( "IMUSamples", "<u4" ),
+    ( "ledSeqTag", "u1" ),
+    ( "IMUPresent", "u1" ),
+    ( "reserved", "<u2" ),
+    ] )
+
+# Chunk index entry
+DUO_CHUNK_INDEX_DTYPE = np.dtype( [
+    ( "firstTimeStamp", "<u8" ),  # Unwrapped time stamp of the first frame (100us increments)
+    ( "lastTimeStamp", "<u8" ),
+    ( "offset", "<u8" ),  # Chunk header offset in the file
+    ( "size", "<u8" ),  # Compressed payload size
+    ( "firstFrame", "<u4" ),  # Index of the first frame in the recording
+    ( "frames", "<u4" ),
+    ] )
+
+def _predict( images, predictor ):
+    # images: (frames, 2, height, width), modified in place
+    if predictor == DUO_PREDICT_TEMPORAL:
+        images[1:] -= images[:-1].copy()
+    elif predictor == DUO_PREDICT_LEFTRIGHT:
+        images[:, 1] -= images[:, 0]
+
+def _unpredict( images, predictor ):
+    if predictor == DUO_PREDICT_TEMPORAL:
+        np.cumsum( images, axis = 0, dtype = np.uint8, out = images )
+    elif predictor == DUO_PREDICT_LEFTRIGHT:
+        images[:, 1] += images[:, 0]
+
+def _pool_context():
+    # The pool starts its workers on the first submit, from the collector thread
+    # while the DUO capture thread runs: never fork this multi-threaded process
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context( "forkserver" )
+    return multiprocessing.get_context( "spawn" )
+
+def _compress_chunk( payload, frames, width, height, codec, level, predictor ):
+    """
+    Process pool worker: applies the prediction and compresses the chunk payload
+    """
+    data = bytearray( payload )
+    if predictor != DUO_PREDICT_NONE:
+        start = frames * _META_DTYPE.itemsize
+        images = np.frombuffer( data, np.uint8, frames * 2 * width * height, start )
+        _predict( images.reshape( frames, 2, height, width ), predictor )
+    if codec == DUO_CODEC_LZMA:
+        return lzma.compress( data, preset = level )
+    return zlib.compress( data, level )
+
+def _decompress_chunk( data, frames, width, height, codec, predictor ):
+    raw = bytearray( lzma.decompress( data ) if codec == DUO_CODEC_LZMA else zlib.decompress( data ) )
+    meta = np.frombuffer( raw, _META_DTYPE, frames )
+    start = frames * _META_DTYPE.itemsize
+    images = np.frombuffer( raw, np.uint8, frames * 2 * width * height, start )
+    images = images.reshape( frames, 2, height, width )
+    _unpredict( images, predictor )
+    imu_start = start + images.nbytes
+    imu = np.frombuffer( raw, DUO_IMU_DTYPE, ( len( raw ) - imu_start ) // DUO_IMU_DTYPE.itemsize, imu_start )
+    return meta, images, imu
+
+class _ChunkBuilder( object ):
+    """
+    Collects frames into a preallocated chunk payload
+    """
+
+    def __init__( self, width, height, chunkFrames ):
+        self.width = width
+        self.height = height
+        self.chunkFrames = chunkFrames
+        self.meta = np.zeros( chunkFrames, _META_DTYPE )
+        self.images = np.empty( ( chunkFrames, 2, height, width ), np.uint8 )
+        self.imu = np.empty( chunkFrames * DUO_MAX_IMU_SAMPLES, DUO_IMU_DTYPE )
+        self.stamps = []
+        self.frames = 0
+        self.samples = 0
+
+    def add( self, slot, stamp ):
+        i = self.frames
+        m = self.meta[i]
+        m["seq"], m["timeStamp"], m["IMUSamples"] = slot.seq, slot.timeStamp, slot.IMUSamples
+        m["ledSeqTag"], m["IMUPresent"] = slot.ledSeqTag, slot.IMUPresent
+        self.images[i, 0] = slot.left
+        self.images[i, 1] = slot.right
+        n = slot.IMUSamples
+        self.imu[self.samples:self.samples + n] = slot.imu
+        self.samples += n
+        self.stamps.append( stamp )
+        self.frames += 1
+        return self.frames == self.chunkFrames
+
+    def payload( self ):
+        n = self.frames
+        return b"".join( ( self.meta[:n].tobytes(), self.images[:n].tobytes(),
+                           self.imu[:self.samples].tobytes() ) )
+
+    def reset( self ):
+        self.stamps = []
+        self.frames = 0
+        self.samples = 0
+
+class DUOCompressedRecorder( object ):
+    """
+    Writes a losslessly compressed recording using a process pool.
+
+    Usage:
+        with DUOCompressedRecorder( "session.duoz", width, height, workers = 4 ) as rec:
+            StartDUO( duo, rec.callback, None )
+            ...
+            StopDUO( duo )
+    """
+
+    def __init__( self, path, width, height, chunkFrames = 30, workers = None,
+                  codec = DUO_CODEC_ZLIB, level = 6, predictor = DUO_PREDICT_TEMPORAL,
+                  queueSize = 64, executor = None ):
+        """
+        @param path: recording file path (overwritten)
+        @param width: frame width
+        @param height: frame height
+        @param chunkFrames: frames per compressed chunk (random access granularity)
+        @param workers: number of compression processes (os.cpu_count() by default)
+        @param codec: DUO_CODEC_ZLIB or DUO_CODEC_LZMA
+        @param level: zlib level [0,9] or lzma preset [0,9]
+        @param predictor: DUO_PREDICT_NONE, DUO_PREDICT_LEFTRIGHT or DUO_PREDICT_TEMPORAL
+        @param queueSize: frames buffered between the callback and the collector thread
+        @param executor: optional concurrent.futures executor to use instead of a new process pool
+        """
+        if codec not in ( DUO_CODEC_ZLIB, DUO_CODEC_LZMA ):
+            raise ValueError( "unknown codec: %r" % ( codec, ) )
+        if predictor not in ( DUO_PREDICT_NONE, DUO_PREDICT_LEFTRIGHT, DUO_PREDICT_TEMPORAL ):
+            raise ValueError( "unknown predictor: %r" % ( predictor, ) )
+        self.path = path
+        self.width = width
+        self.height = height
+        self.chunkFrames = chunkFrames
+        self.codec = codec
+        self.level = level
+        self.predictor = predictor
+        self.workers = workers or os.cpu_count() or 1
+        self.frames = 0
+        self.rawBytes = 0
+        self.compressedBytes = 0
+
+        self._ownExecutor = executor is None
+        self._executor = executor or concurrent.futures.ProcessPoolExecutor( self.workers,
+                                                                             mp_context = _pool_context() )
+        self._ring = DUOFrameRing( width, height, queueSize, DUO_RING_DROP_NEWEST )
+        self.callback = self._ring.callback
+
+        self._file = open( path, "wb" )
+        self._file.write( self._header( 0, 0 ) )
+        self._offset = _HEADER.size
+        self._index = []
+        self._pending = collections.deque()
+        self._lastStamp = None
+        self._stampHigh = 0
+        self._error = None
+        self._collector = threading.Thread( target = self._run, name = "DUOCompressedRecorder" )
+        self._collector.daemon = True
+        self._collector.start()
+
+    def _header( self, index_offset, chunks ):
+        return _HEADER.pack( _MAGIC, _VERSION, self.width, self.height, self.codec,
+                             self.predictor, self.chunkFrames, index_offset, chunks )
+
+    @property
+    def dropped( self ):
+        """
+        Frames dropped because the collector could not keep up
+        """
+        return self._ring.dropped
+
+    @property
+    def ratio( self ):
+        """
+        Compression ratio of the chunks written so far
+        """
+        return self.rawBytes / float( self.compressedBytes ) if self.compressedBytes else 0.0
+
+    def write( self, frame ):
+        """
+        Queues a DUOFrame for compression (same as the callback does)
+
+        @return: False if the frame was dropped
+        """
+        return self._ring.push( frame )
+
+    def _submit( self, builder ):
+        payload = builder.payload()
+        future = self._executor.submit( _compress_chunk, payload, builder.frames, self.width,
+                                        self.height, self.codec, self.level, self.predictor )
+        self._pending.append( ( future, builder.frames, len( payload ),
+                                builder.stamps[0], builder.stamps[-1] ) )
+        builder.reset()
+        # Keep a bounded number of chunks in flight, write them in order
+        while self._pending and ( self._pending[0][0].done() or len( self._pending ) > 2 * self.workers ):
+            self._write_chunk( *self._pending.popleft() )
+
+    def _write_chunk( self, future, frames, raw_size, first_stamp, last_stamp ):
+        data = future.result()
+        self._file.write( _CHUNK.pack( _CHUNK_MAGIC, frames, raw_size, len( data ) ) )
+        self._file.write( data )
+        self._index.append( ( first_stamp, last_stamp, self._offset, len( data ),
+                              self.frames, frames ) )
+        self._offset += _CHUNK.size + len( data )
+        self.frames += frames
+        self.rawBytes += raw_size
+        self.compressedBytes += len( data )
+
+    def _run( self ):
+        ring = self._ring
+        builder = _ChunkBuilder( self.width, self.height, self.chunkFrames )
+        try:
+            while True:
+                slot = ring.get()
+                if slot is None:
+                    break
+                stamp = slot.timeStamp
+                if self._lastStamp is not None and stamp < self._lastStamp:
+                    self._stampHigh += 1 << 32
+                self._lastStamp = stamp
+                if builder.add( slot, self._stampHigh + stamp ):
+                    self._submit( builder )
+            if builder.frames:
+                self._submit( builder )
+            while self._pending:
+                self._write_chunk( *self._pending.popleft() )
+        except Exception as e:  # Reported by close()
+            self._error = e
+            ring.close()
+
+    def close( self ):
+        """
+        Compresses the queued frames and writes the index. Call after StopDUO.
+        """
+        if self._file is None:
+            return
+        self._ring.close()
+        self._collector.join()
+        try:
+            if self._error is None:
+                index = np.array( self._index, DUO_CHUNK_INDEX_DTYPE )
+                self._file.write( index.tobytes() )
+                self._file.seek( 0 )
+                self._file.write( self._header( self._offset, len( index ) ) )
+        finally:
+            self._file.close()
+            self._file = None
+            if self._ownExecutor:
+                self._executor.shutdown()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, exc_type, exc, tb ):
+        self.close()
+
+class DUOCompressedFrame( object ):
+    """
+    Decompressed frame of a DUOCompressedRecording
+    """
+    __slots__ = ( "index", "seq", "width", "height", "ledSeqTag", "timeStamp",
+                  "left", "right", "IMUPresent", "IMUSamples", "imu" )
+
+class DUOCompressedRecording( object ):
+    """
+    Reader of recordings written by DUOCompressedRecorder.
+    The most recently used chunk is kept decompressed.
+    """
+
+    def __init__( self, path ):
+        self.path = path
+        self._file = open( path, "rb" )
+        header = self._file.read( _HEADER.size )
+        if len( header ) < _HEADER.size or header[:8] != _MAGIC:
+            self._file.close()
+            raise ValueError( "%s is not a compressed DUO recording" % path )
+        ( magic, version, self.width, self.height, self.codec, self.predictor,
+          self.chunkFrames, index_offset, chunks ) = _HEADER.unpack( header )
+        if version != _VERSION:
+            self._file.close()
+            raise ValueError( "unsupported compressed DUO recording version %d" % version )
+        if not index_offset:
+            self.index = self._scan()
+        else:
+            self._file.seek( index_offset )
+            self.index = np.frombuffer( self._file.read( chunks * DUO_CHUNK_INDEX_DTYPE.itemsize ),
+                                        DUO_CHUNK_INDEX_DTYPE )
+        self._frameStarts = self.index["firstFrame"]
+        self._cached = None
+
+    def _scan( self ):
+        # Rebuilds the index of a recording that was not closed (time stamps need decompression)
+        entries = []
+        offset, frame = _HEADER.size, 0
+        self._file.seek( offset )
+        while True:
+            header = self._file.read( _CHUNK.size )
+            if len( header ) < _CHUNK.size:
+                break
+            magic, frames, raw_size, size = _CHUNK.unpack( header )
+            data = self._file.read( size )
+            if magic != _CHUNK_MAGIC or len( data ) < size:
+                break
+            meta = _decompress_chunk( data, frames, self.width, self.height,
+                                      self.codec, self.predictor )[0]
+            entries.append( ( meta["timeStamp"][0], meta["timeStamp"][-1], offset, size, frame, frames ) )
+            offset += _CHUNK.size + size
+            frame += frames
+        index = np.array( entries, DUO_CHUNK_INDEX_DTYPE )
+        if len( index ):
+            # Unwrap the 32-bit time stamps
+            stamps = np.stack( [ index["firstTimeStamp"], index["lastTimeStamp"] ], 1 ).reshape( -1 )
+            wraps = np.concatenate( [ [ 0 ], np.cumsum( np.diff( stamps.astype( np.int64 ) ) < 0 ) ] )
+            stamps = stamps + ( wraps.astype( np.uint64 ) << np.uint64( 32 ) )
+            index["firstTimeStamp"], index["lastTimeStamp"] = stamps[0::2], stamps[1::2]
+        return index
+
+    def __len__( self ):
+        if not len( self.index ):
+            return 0
+        return int( self.index["firstFrame"][-1] + self.index["frames"][-1] )
+
+    def chunk( self, c ):
+        """
+        Decompresses chunk c
+
+        @return: tuple(metadata, images (frames, 2, height, width), IMU samples)
+        """
+        if self._cached is not None and self._cached[0] == c:
+            return self._cached[1]
+        entry = self.index[c]
+        self._file.seek( int( entry["offset"] ) + _CHUNK.size )
+        data = self._file.read( int( entry["size"] ) )
+        chunk = _decompress_chunk( data, int( entry["frames"] ), self.width, self.height,
+                                   self.codec, self.predictor )
+        self._cached = ( c, chunk )
+        return chunk
+
+    def frame( self, i ):
+        """
+        Returns frame i as DUOCompressedFrame (decompressing its chunk if needed)
+        """
+        if i < 0:
+            i += len( self )
+        c = int( np.searchsorted( self._frameStarts, i, "right" ) ) - 1
+        meta, images, imu = self.chunk( c )
+        k = i - int( self._frameStarts[c] )
+        first_sample = int( meta["IMUSamples"][:k].sum() )
+
+        f = DUOCompressedFrame()
+        m = meta[k]
+        f.index = i
+        f.seq = int( m["seq"] )
+        f.width, f.height = self.width, self.height
+        f.ledSeqTag = int( m["ledSeqTag"] )
+        f.timeStamp = int( m["timeStamp"] )
+        f.IMUPresent = bool( m["IMUPresent"] )
+        f.IMUSamples = int( m["IMUSamples"] )
+        f.left = images[k, 0]
+        f.right = images[k, 1]
+        f.imu = imu[first_sample:first_sample + f.IMUSamples]
+        return f
+
+    def find_chunk( self, timeStamp ):
+        """
+        Returns the index of the chunk containing the unwrapped timeStamp (binary search)
+        """
+        return max( 0, int( np.searchsorted( self.index["firstTimeStamp"], timeStamp, "right" ) ) - 1 )
+
+    def __iter__( self ):
+        for i in range( len( self ) ):
+            yield self.frame( i )
+
+    def close( self ):
+        self._cached = None
+        self._file.close()
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, exc_type, exc, tb ):
+        self.close()
+
+def MeasureDUOCompression( recording, workerCounts = ( 1, 2, 4 ), codec = DUO_CODEC_ZLIB,
+                           level = 6, predictors = ( DUO_PREDICT_NONE, DUO_PREDICT_LEFTRIGHT,
+                                                     DUO_PREDICT_TEMPORAL ),
+                           chunkFrames = 30, maxFrames = None ):
+    """
+    Compresses frames of a raw recording (duo3d.recording.DUORecording) in memory
+    and reports compression ratio and throughput for every worker count and predictor.
+
+    @return: list of dicts
+    """
+    frames = len( recording ) if maxFrames is None else min( maxFrames, len( recording ) )
+    builder = _ChunkBuilder( recording.width, recording.height, chunkFrames )
+    payloads = []
+    for i in range( frames ):
+        f = recording.frame( i )
+        if builder.add( f, i ):
+            payloads.append( ( builder.payload(), builder.frames ) )
+            builder.reset()
+    if builder.frames:
+        payloads.append( ( builder.payload(), builder.frames ) )
+    raw_size = sum( len( p ) for p, n in payloads )
+
+    results = []
+    for predictor in predictors:
+        for workers in workerCounts:
+            with concurrent.futures.ProcessPoolExecutor( workers, mp_context = _pool_context() ) as pool:
+                # Warm up the worker processes
+                list( pool.map( abs, range( workers ) ) )
+                start = time.time()
+                futures = [ pool.submit( _compress_chunk, p, n, recording.width, recording.height,
+                                         codec, level, predictor ) for p, n in payloads ]
+                compressed = sum( len( f.result() ) for f in futures )
+                elapsed = time.time() - start
+            results.append( {
+                "codec": codec,
+                "level": level,
+                "predictor": predictor,
+                "workers": workers,
+                "frames": frames,
+                "ratio": raw_size / float( compressed ) if compressed else 0.0,
+                "mb_per_s": raw_size / elapsed / 1e6 if elapsed > 0 else 0.0,
+                "fps": frames / elapsed if elapsed > 0 else 0.0,
+                } )
+    return results
+
+def main( argv = None ):
+    from .recording import DUORecording
+
+    parser = argparse.ArgumentParser( description = "DUO recording compression benchmark" )
+    parser.add_argument( "recording", help = "raw recording written by DUORecorder" )
+    parser.add_argument( "--workers", type = int, action = "append", help = "worker count (repeatable)" )
+    parser.add_argument( "--lzma", action = "store_true", help = "use lzma instead of zlib" )
+    parser.add_argument( "--level", type = int, default = 6 )
+    parser.add_argument( "--chunk", type = int, default = 30, help = "frames per chunk" )
+    parser.add_argument( "--frames", type = int, help = "limit the number of frames" )
+    args = parser.parse_args( argv )
+
+    names = { DUO_PREDICT_NONE: "none", DUO_PREDICT_LEFTRIGHT: "leftright", DUO_PREDICT_TEMPORAL: "temporal" }
+    with DUORecording( args.recording ) as recording:
+        results = MeasureDUOCompression( recording, args.workers or ( 1, 2, 4 ),
+                                         DUO_CODEC_LZMA if args.lzma else DUO_CODEC_ZLIB,
+                                         args.level, chunkFrames = args.chunk, maxFrames = args.frames )
+    for r in results:
+        print( "%-9s workers %2d  ratio %5.2f  %8.1f MB/s  %8.1f fps" % (
+            names[r["predictor"]], r["workers"], r["ratio"], r["mb_per_s"], r["fps"] ) )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit( main() )
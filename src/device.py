@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.device
+
+    @brief: DUO device controller with cached parameters
+
+    DUODevice reads all the readable parameters in one batch and serves them
+    from a cache. Setting a parameter to its current value is a no-op, and
+    exposure, gain and LED updates are coalesced: only the latest value is
+    written by a background thread, at most once per writeInterval, so a
+    tuning loop does not flood the device with control transfers:
+
+        with DUODevice() as device:  # opens the first device
+            device.resolution = ri
+            device.exposure = 50      # queued, returns immediately
+            device.gain = 10          # written together with the exposure
+            print( device.snapshot() )
+
+    Other parameters are written immediately. flush() waits for the queued writes.
+"""
+
+import ctypes as ct
+import threading
+import time
+import weakref
+
+from . import duo3d as _duo3d
+from .duo3d import (CloseDUO, GetDUOAutoExposure, GetDUOCalibrationPresent, GetDUOCameraSwap,
+                    GetDUODeviceName, GetDUOExposure, GetDUOExposureMS, GetDUOFirmwareBuild,
+                    GetDUOFirmwareVersion, GetDUOFOV, GetDUOFrameDimension, GetDUOGain, GetDUOHFlip,
+                    GetDUOIMURange, GetDUOLedPWM, GetDUORectifiedFOV, GetDUOResolutionInfo,
+                    GetDUOSerialNumber, GetDUOUndistort, GetDUOVFlip, OpenDUO, SetDUOAutoExposure,
+                    SetDUOCameraSwap, SetDUOExposure, SetDUOExposureMS, SetDUOGain, SetDUOHFlip,
+                    SetDUOIMURange, SetDUOIMURate, SetDUOLedPWM, SetDUOResolutionInfo,
+                    SetDUOUndistort, SetDUOVFlip, DUOInstance, DUOResolutionInfo)
+
+__all__ = [
+    "DUODevice",
+    ]
+
+def _set_imu_range( duo, val ):
+    return SetDUOIMURange( duo, val[0], val[1] )
+
+# name: ( getter, setter, coalesced )
+_PARAMETERS = {
+    "resolution": ( GetDUOResolutionInfo, SetDUOResolutionInfo, False ),
+    "frameDimension": ( GetDUOFrameDimension, None, False ),
+    "exposure": ( GetDUOExposure, SetDUOExposure, True ),
+    "exposureMS": ( GetDUOExposureMS, SetDUOExposureMS, True ),
+    "autoExposure": ( GetDUOAutoExposure, SetDUOAutoExposure, False ),
+    "gain": ( GetDUOGain, SetDUOGain, True ),
+    "hFlip": ( GetDUOHFlip, SetDUOHFlip, False ),
+    "vFlip": ( GetDUOVFlip, SetDUOVFlip, False ),
+    "cameraSwap": ( GetDUOCameraSwap, SetDUOCameraSwap, False ),
+    "ledPWM": ( GetDUOLedPWM, SetDUOLedPWM, True ),
+    "undistort": ( GetDUOUndistort, SetDUOUndistort, False ),
+    "IMURange": ( GetDUOIMURange, _set_imu_range, False ),
+    "IMURate": ( None, SetDUOIMURate, False ),  # Write-only
+    "calibrationPresent": ( GetDUOCalibrationPresent, None, False ),
+    "FOV": ( GetDUOFOV, None, False ),
+    "rectifiedFOV": ( GetDUORectifiedFOV, None, False ),
+    }
+
+# Read once, do not change while the device is opened
+_STATIC = {
+    "deviceName": GetDUODeviceName,
+    "serialNumber": GetDUOSerialNumber,
+    "firmwareVersion": GetDUOFirmwareVersion,
+    "firmwareBuild": GetDUOFirmwareBuild,
+    }
+
+# Parameters whose cached value is stale after writing the key
+_DEPENDENTS = {
+    "resolution": ( "frameDimension", "exposure", "exposureMS", "FOV", "rectifiedFOV" ),
+    "exposure": ( "exposureMS", ),
+    "exposureMS": ( "exposure", ),
+    "autoExposure": ( "exposure", "exposureMS" ),
+    }
+
+# Parameters changed by the device while auto exposure is enabled
+_AUTO_EXPOSURE = ( "exposure", "exposureMS" )
+
+def _key( value ):
+    """
+    Comparable form of a parameter value
+    """
+    if isinstance( value, DUOResolutionInfo ):
+        return ( value.width, value.height, value.binning, round( value.fps, 3 ) )
+    return value
+
+def _copy( value ):
+    """
+    Copy of structure values (DUOResolutionInfo), so the cache never shares them with the caller
+    """
+    if isinstance( value, ct.Structure ):
+        return type( value ).from_buffer_copy( value )
+    return value
+
+class DUODevice( object ):
+    """
+    Opened DUO device with cached parameter state and coalesced writes
+    """
+
+    def __init__( self, duo = None, writeInterval = 0.02 ):
+        """
+        @param duo: opened DUOInstance (the first available device is opened if None)
+        @param writeInterval: minimum time between two coalesced writes in seconds
+        """
+        self._owner = duo is None
+        if duo is None:
+            duo = DUOInstance()
+            if not OpenDUO( duo ):
+                raise IOError( "Could not open DUO camera" )
+        self.duo = duo
+        self.writeInterval = writeInterval
+        self.writes = 0  # Setter calls issued to the device
+        self.skipped = 0  # Redundant sets not issued
+        self.coalesced = 0  # Queued values replaced by a newer one before being written
+        self.errors = 0  # Failed writes
+
+        self._lock = threading.Lock()
+        self._changed = threading.Condition( self._lock )
+        self._values = {}
+        self._stale = set( _PARAMETERS )
+        self._pending = {}
+        self._writing = False
+        self._closed = False
+        for name, getter in _STATIC.items():
+            value = getter( duo )
+            self._values[name] = value.decode( "ascii", "replace" ) if isinstance( value, bytes ) else value
+        self.refresh()
+
+        self._writer = threading.Thread( target = self._run, name = "DUODevice" )
+        self._writer.daemon = True
+        self._writer.start()
+
+        # Mode changes made with the plain API invalidate the cache
+        ref = weakref.ref( self )
+        handle = duo.value
+
+        def listener( changed ):
+            device = ref()
+            if device is not None and ( changed is None or changed.value == handle ):
+                device.invalidate( "resolution" )
+        self._listener = listener
+        _duo3d._deviceListeners.append( listener )
+
+    def refresh( self ):
+        """
+        Reads all the readable parameters from the device
+
+        @return: dict with all the cached values
+        """
+        values = {}
+        for name, ( getter, setter, coalesced ) in _PARAMETERS.items():
+            if getter is not None:
+                values[name] = _copy( getter( self.duo ) )
+        with self._lock:
+            for name, value in values.items():
+                # Queued values are newer than the device state
+                if name not in self._pending:
+                    self._values[name] = value
+            self._stale.clear()
+        return self.snapshot()
+
+    def snapshot( self ):
+        """
+        Returns a dict with the cached values (no device access)
+        """
+        with self._lock:
+            return dict( ( name, _copy( value ) ) for name, value in self._values.items() )
+
+    def invalidate( self, name = None ):
+        """
+        Marks a parameter (and the ones depending on it) or all of them to be read again
+        """
+        with self._lock:
+            if name is None:
+                self._stale.update( _PARAMETERS )
+            else:
+                self._stale.add( name )
+                self._stale.update( _DEPENDENTS.get( name, () ) )
+
+    def get( self, name ):
+        """
+        Returns the cached value, reading it from the device if stale
+        """
+        if name in _STATIC:
+            return self._values[name]
+        getter = _PARAMETERS[name][0]
+        with self._lock:
+            if name in self._pending or getter is None:
+                return _copy( self._values.get( name ) )
+            volatile = name in _AUTO_EXPOSURE and self._values.get( "autoExposure" )
+            if name not in self._stale and not volatile:
+                return _copy( self._values[name] )
+        value = getter( self.duo )
+        with self._lock:
+            if name not in self._pending:
+                self._values[name] = _copy( value )
+                self._stale.discard( name )
+        return value
+
+    def set( self, name, value, immediate = False ):
+        """
+        Sets a parameter unless it already has the value.
+        Coalesced parameters are queued for the background writer unless immediate.
+
+        @return: False if the immediate write failed
+        """
+        getter, setter, coalesced = _PARAMETERS[name]
+        if setter is None:
+            raise AttributeError( "%s is read-only" % name )
+        value = _copy( value )
+        with self._lock:
+            if self._closed:
+                raise IOError( "DUODevice is closed" )
+            current = self._values.get( name )
+            stale = name in self._stale or ( name in _AUTO_EXPOSURE and self._values.get( "autoExposure" ) )
+            if name in self._pending or ( not stale and name in self._values ):
+                if _key( current ) == _key( value ):
+                    self.skipped += 1
+                    return True
+            self._values[name] = value
+            for dependent in _DEPENDENTS.get( name, () ):
+                self._stale.add( dependent )
+                # The pending value of a dependent would undo this one
+                self._pending.pop( dependent, None )
+            if coalesced and not immediate:
+                if name in self._pending:
+                    self.coalesced += 1
+                self._pending[name] = value
+                self._changed.notify()
+                return True
+            self._pending.pop( name, None )
+            self._stale.discard( name )
+            self.writes += 1
+        result = setter( self.duo, value )
+        with self._lock:
+            if result:
+                # Written value is current even if a listener marked it stale
+                self._stale.discard( name )
+            else:
+                self.errors += 1
+                self._stale.add( name )
+        return result
+
+    def _run( self ):
+        last = 0.0
+        with self._lock:
+            while True:
+                while not self._pending and not self._closed:
+                    self._changed.wait()
+                if not self._pending:
+                    break
+                delay = last + self.writeInterval - time.time()
+                if delay > 0:
+                    # Let more updates coalesce, closing flushes immediately
+                    self._changed.wait( delay )
+                    if not self._closed and last + self.writeInterval > time.time():
+                        continue
+                pending, self._pending = self._pending, {}
+                self._writing = True
+                self._lock.release()
+                failed = []
+                try:
+                    for name, value in pending.items():
+                        if not _PARAMETERS[name][1]( self.duo, value ):
+                            failed.append( name )
+                finally:
+                    self._lock.acquire()
+                self.writes += len( pending )
+                self.errors += len( failed )
+                self._stale.update( failed )
+                self._writing = False
+                last = time.time()
+                self._changed.notify_all()
+
+    def flush( self, timeout = None ):
+        """
+        Waits until the queued values are written
+
+        @return: True if nothing is left to write
+        """
+        with self._lock:
+            self._changed.notify_all()
+            end = None if timeout is None else time.time() + timeout
+            while self._pending or self._writing:
+                remaining = None if end is None else end - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._changed.wait( remaining )
+        return True
+
+    def close( self ):
+        """
+        Writes the queued values and stops the writer; closes the device if it was opened here
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._changed.notify_all()
+        self._writer.join()
+        if self._listener in _duo3d._deviceListeners:
+            _duo3d._deviceListeners.remove( self._listener )
+        if self._owner:
+            CloseDUO( self.duo )
+            self.duo.value = None
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, exc_type, exc, tb ):
+        self.close()
+
+def _parameter( name, doc ):
+    def getter( self ):
+        return self.get( name )
+
+    def setter( self, value ):
+        self.set( name, value )
+    return property( getter, setter if _PARAMETERS[name][1] else None, doc = doc )
+
+def _static( name, doc ):
+    return property( lambda self: self._values[name], doc = doc )
+
+DUODevice.deviceName = _static( "deviceName", "DUO device name" )
+DUODevice.serialNumber = _static( "serialNumber", "DUO serial number" )
+DUODevice.firmwareVersion = _static( "firmwareVersion", "DUO firmware version" )
+DUODevice.firmwareBuild = _static( "firmwareBuild", "DUO firmware build" )
+DUODevice.resolution = _parameter( "resolution", "DUOResolutionInfo, setting it writes immediately" )
+DUODevice.frameDimension = _parameter( "frameDimension", "tuple(width, height)" )
+DUODevice.exposure = _parameter( "exposure", "Exposure in percentage [0,100] (coalesced)" )
+DUODevice.exposureMS = _parameter( "exposureMS", "Exposure in milliseconds (coalesced)" )
+DUODevice.autoExposure = _parameter( "autoExposure", "Auto exposure enabled" )
+DUODevice.gain = _parameter( "gain", "Gain in percentage [0,100] (coalesced)" )
+DUODevice.hFlip = _parameter( "hFlip", "Horizontal flip" )
+DUODevice.vFlip = _parameter( "vFlip", "Vertical flip" )
+DUODevice.cameraSwap = _parameter( "cameraSwap", "Left and right camera swap" )
+DUODevice.ledPWM = _parameter( "ledPWM", "LED brightness in percentage [0,100] (coalesced)" )
+DUODevice.undistort = _parameter( "undistort", "Image undistortion enabled" )
+DUODevice.IMURange = _parameter( "IMURange", "tuple(accel, gyro) range, see DUO_ACCEL_* and DUO_GYRO_*" )
+DUODevice.IMURate = _parameter( "IMURate", "IMU sampling rate [50,500] Hz (write-only, last set value)" )
+DUODevice.calibrationPresent = _parameter( "calibrationPresent", "Calibration present" )
+DUODevice.FOV = _parameter( "FOV", "Field of view for the current resolution" )
+DUODevice.rectifiedFOV = _parameter( "rectifiedFOV", "Rectified field of view for the current resolution" )
@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.disparity
+
+    @brief: Block matching stereo disparity
+
+    DUOStereoMatcher computes a left image disparity map from a rectified
+    uint8 stereo pair with SAD or census block matching. Costs are aggregated
+    with cumulative sums (one box filter per disparity, independent of the
+    block size), the image is split into horizontal bands matched by a thread
+    pool (NumPy releases the GIL in its loops) and a left-right consistency
+    check invalidates occluded and mismatched pixels:
+
+        matcher = DUOStereoMatcher( width, height, numDisparities = 64 )
+        disparity = matcher.compute( left, right )
+
+    Invalid pixels are set to DUO_DISPARITY_INVALID.
+
+        python -m duo3d.disparity --workers 4
+
+    benchmarks the matcher for every frame size returned by EnumerateDUOResolutions.
+"""
+
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+
+import numpy as np
+
+from .duo3d import EnumerateDUOResolutions, SetDUOBackend, DUOResolutionInfo
+from .frame import GetDUOFrameImages
+
+__all__ = [
+    "BenchmarkDUOStereoMatcher", "DUOStereoMatcher",
+
+    "DUO_DISPARITY_INVALID", "DUO_MATCH_CENSUS", "DUO_MATCH_SAD",
+    ]
+
+# Matching cost
+DUO_MATCH_SAD = 0  # Sum of absolute differences
+DUO_MATCH_CENSUS = 1  # Hamming distance of census transforms (robust to exposure differences)
+
+# Disparity of unmatched pixels
+DUO_DISPARITY_INVALID = -1.0
+
+_COST_MAX = np.iinfo( np.int32 ).max
+
+_popcount = getattr( np, "bitwise_count", None )
+if _popcount is None:
+    _POPCOUNT8 = np.array( [ bin( i ).count( "1" ) for i in range( 256 ) ], np.uint8 )
+
+    def _popcount( x ):
+        b = x.view( np.uint8 ).reshape( x.shape + ( x.itemsize, ) )
+        return _POPCOUNT8[b].sum( axis = -1, dtype = np.uint8 )
+
+def _census( image, window ):
+    """
+    Census transform, bit set where the neighbour is darker than the center
+
+    @param image: padded uint8 image, window // 2 pixels on each side
+    @return: uint32 codes of the unpadded area
+    """
+    r = window // 2
+    h, w = image.shape[0] - 2 * r, image.shape[1] - 2 * r
+    center = image[r:r + h, r:r + w]
+    codes = np.zeros( ( h, w ), np.uint32 )
+    bit = np.empty( ( h, w ), np.bool_ )
+    for dy in range( window ):
+        for dx in range( window ):
+            if dy == r and dx == r:
+                continue
+            np.less( image[dy:dy + h, dx:dx + w], center, out = bit )
+            codes <<= 1
+            codes |= bit
+    return codes
+
+class _Band( object ):
+    """
+    Rows matched by one worker and its preallocated buffers
+    """
+
+    def __init__( self, top, bottom, width, halo ):
+        self.top = top
+        self.bottom = bottom
+        rows = bottom - top
+        padded = width + 2 * halo
+        self.cost = np.empty( ( rows + 2 * halo, padded ), np.int32 )
+        self.vertical = np.zeros( ( rows + 2 * halo + 1, padded ), np.int32 )
+        self.columns = np.empty( ( rows, padded ), np.int32 )
+        self.horizontal = np.zeros( ( rows, padded + 1 ), np.int32 )
+        self.aggregated = np.empty( ( 2, rows, width ), np.int32 )  # Current and previous disparity
+        self.best = np.empty( ( rows, width ), np.int32 )
+        self.bestCost = np.empty( ( rows, width ), np.int32 )
+        self.prevCost = np.empty( ( rows, width ), np.int32 )
+        self.nextCost = np.empty( ( rows, width ), np.int32 )
+        self.rightBest = np.empty( ( rows, width ), np.int32 )
+        self.rightCost = np.empty( ( rows, width ), np.int32 )
+        self.mask = np.empty( ( rows, width ), np.bool_ )
+
+class DUOStereoMatcher( object ):
+    """
+    Multi-threaded SAD/census block matcher
+    """
+
+    def __init__( self, width, height, numDisparities = 64, blockSize = 9, method = DUO_MATCH_SAD,
+                  minDisparity = 0, lrCheck = 1, subpixel = True, censusSize = 5,
+                  workers = None, bands = None ):
+        """
+        @param width: image width
+        @param height: image height
+        @param numDisparities: number of disparities searched
+        @param blockSize: odd matching block size
+        @param method: DUO_MATCH_SAD or DUO_MATCH_CENSUS
+        @param minDisparity: smallest disparity searched (>= 0)
+        @param lrCheck: maximum left-right disparity difference, None to disable the check
+        @param subpixel: refine the disparity with a parabola fit of the neighbouring costs
+        @param censusSize: odd census window size (at most 5, 24-bit codes)
+        @param workers: number of threads (os.cpu_count() by default)
+        @param bands: number of horizontal bands (2 * workers by default)
+        """
+        if blockSize < 1 or blockSize % 2 == 0:
+            raise ValueError( "blockSize must be odd" )
+        if censusSize < 3 or censusSize > 5 or censusSize % 2 == 0:
+            raise ValueError( "censusSize must be 3 or 5" )
+        if minDisparity < 0 or numDisparities < 1:
+            raise ValueError( "invalid disparity range" )
+        if method not in ( DUO_MATCH_SAD, DUO_MATCH_CENSUS ):
+            raise ValueError( "unknown matching method: %r" % ( method, ) )
+        self.width = width
+        self.height = height
+        self.numDisparities = numDisparities
+        self.minDisparity = minDisparity
+        self.blockSize = blockSize
+        self.method = method
+        self.lrCheck = lrCheck
+        self.subpixel = subpixel
+        self.censusSize = censusSize
+        self.workers = workers or os.cpu_count() or 1
+        self.disparity = np.empty( ( height, width ), np.float32 )
+
+        halo = blockSize // 2
+        count = max( 1, min( height, bands or 2 * self.workers ) )
+        edges = np.linspace( 0, height, count + 1 ).astype( int )
+        self._halo = halo
+        self._bands = [ _Band( edges[i], edges[i + 1], width, halo )
+                        for i in range( count ) if edges[i + 1] > edges[i] ]
+        self._executor = concurrent.futures.ThreadPoolExecutor( self.workers ) if self.workers > 1 else None
+        # Padded images, edge pixels replicated by the halo (and census radius)
+        pad = halo + ( censusSize // 2 if method == DUO_MATCH_CENSUS else 0 )
+        self._pad = pad
+        self._left = np.empty( ( height + 2 * pad, width + 2 * pad ), np.uint8 )
+        self._right = np.empty( ( height + 2 * pad, width + 2 * pad ), np.uint8 )
+
+    def _prepare( self, image, padded ):
+        p = self._pad
+        h, w = self.height, self.width
+        padded[p:p + h, p:p + w] = image
+        padded[p:p + h, :p] = padded[p:p + h, p:p + 1]
+        padded[p:p + h, p + w:] = padded[p:p + h, p + w - 1:p + w]
+        padded[:p] = padded[p]
+        padded[p + h:] = padded[p + h - 1]
+
+    def _costs( self, band ):
+        """
+        Per-pixel features of the band rows including the halo
+        """
+        top, bottom = band.top, band.bottom + 2 * self._halo
+        if self.method == DUO_MATCH_CENSUS:
+            r = self.censusSize // 2
+            left = _census( self._left[top:bottom + 2 * r], self.censusSize )
+            right = _census( self._right[top:bottom + 2 * r], self.censusSize )
+        else:
+            left = self._left[top:bottom].astype( np.int16 )
+            right = self._right[top:bottom].astype( np.int16 )
+        return left, right
+
+    def _match( self, band, out ):
+        halo, width = self._halo, self.width
+        size = 2 * halo + 1
+        rows = band.bottom - band.top
+        padded = width + 2 * halo
+        left, right = self._costs( band )
+        best, best_cost = band.best, band.bestCost
+        prev_cost, next_cost = band.prevCost, band.nextCost
+        right_best, right_cost = band.rightBest, band.rightCost
+        aggregated_prev = None
+        best.fill( -1 )
+        best_cost.fill( _COST_MAX )
+        prev_cost.fill( _COST_MAX )
+        next_cost.fill( _COST_MAX )
+        right_best.fill( -1 )
+        right_cost.fill( _COST_MAX )
+
+        for d in range( self.minDisparity, min( self.minDisparity + self.numDisparities, width ) ):
+            n = padded - d
+            cost = band.cost[:, :n]
+            if self.method == DUO_MATCH_CENSUS:
+                cost[...] = _popcount( np.bitwise_xor( left[:, d:], right[:, :n] ) )
+            else:
+                np.subtract( left[:, d:], right[:, :n], out = cost, casting = "unsafe" )
+                np.abs( cost, out = cost )
+            # Box filter: vertical then horizontal running sums
+            np.cumsum( cost, axis = 0, out = band.vertical[1:, :n] )
+            columns = band.columns[:, :n]
+            np.subtract( band.vertical[size:, :n], band.vertical[:rows, :n], out = columns )
+            np.cumsum( columns, axis = 1, out = band.horizontal[:, 1:n + 1] )
+            # Aggregated cost of left pixels x in [d, width), right pixels x - d
+            m = width - d
+            aggregated = band.aggregated[d & 1, :, :m]
+            np.subtract( band.horizontal[:, size:size + m], band.horizontal[:, :m], out = aggregated )
+
+            # Cost of the disparity following the current best one
+            if d > self.minDisparity:
+                mask = band.mask[:, d:]
+                np.equal( best[:, d:], d - 1, out = mask )
+                np.copyto( next_cost[:, d:], aggregated, where = mask )
+            mask = band.mask[:, d:]
+            np.less( aggregated, best_cost[:, d:], out = mask )
+            np.copyto( best_cost[:, d:], aggregated, where = mask )
+            np.copyto( best[:, d:], d, where = mask )
+            if aggregated_prev is not None:
+                np.copyto( prev_cost[:, d:], aggregated_prev[:, 1:m + 1], where = mask )
+            else:
+                np.copyto( prev_cost[:, d:], _COST_MAX, where = mask )
+            np.copyto( next_cost[:, d:], _COST_MAX, where = mask )
+
+            if self.lrCheck is not None:
+                mask = band.mask[:, :m]
+                np.less( aggregated, right_cost[:, :m], out = mask )
+                np.copyto( right_cost[:, :m], aggregated, where = mask )
+                np.copyto( right_best[:, :m], d, where = mask )
+            aggregated_prev = aggregated
+
+        disparity = out[band.top:band.bottom]
+        disparity[...] = best
+        if self.subpixel:
+            valid = ( prev_cost < _COST_MAX ) & ( next_cost < _COST_MAX )
+            p = prev_cost.astype( np.float32 )
+            c = best_cost.astype( np.float32 )
+            q = next_cost.astype( np.float32 )
+            denom = p + q - 2 * c
+            valid &= denom > 0
+            np.divide( p - q, 2 * denom, out = p, where = valid )
+            disparity[valid] += p[valid]
+        invalid = best < 0
+        if self.lrCheck is not None:
+            x = np.arange( width )
+            xr = np.clip( x - best, 0, width - 1 )
+            matched = np.take_along_axis( right_best, xr, axis = 1 )
+            invalid |= np.abs( matched - best ) > self.lrCheck
+        disparity[invalid] = DUO_DISPARITY_INVALID
+
+    def compute( self, left, right, out = None ):
+        """
+        Computes the left image disparity map
+
+        @param left: (height, width) uint8 rectified left image
+        @param right: (height, width) uint8 rectified right image
+        @param out: optional (height, width) float32 output (the matcher's own buffer by default)
+        @return: disparity map in pixels, DUO_DISPARITY_INVALID where unmatched
+        """
+        out = self.disparity if out is None else out
+        self._prepare( left, self._left )
+        self._prepare( right, self._right )
+        if self._executor is None:
+            for band in self._bands:
+                self._match( band, out )
+        else:
+            for f in [ self._executor.submit( self._match, band, out ) for band in self._bands ]:
+                f.result()
+        return out
+
+    def compute_frame( self, frame, out = None ):
+        """
+        Computes the disparity of a DUOFrame (or PDUOFrame) without copying its images first
+        """
+        left, right = GetDUOFrameImages( frame )
+        return self.compute( left, right, out )
+
+    def close( self ):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+def _frame_sizes():
+    modes = ( DUOResolutionInfo * 256 )()
+    try:
+        count = EnumerateDUOResolutions( modes, len( modes ) )
+    except ImportError:
+        SetDUOBackend( "synthetic" )
+        count = EnumerateDUOResolutions( modes, len( modes ) )
+    sizes = []
+    for ri in modes[:count]:
+        if ( ri.width, ri.height ) not in sizes:
+            sizes.append( ( ri.width, ri.height ) )
+    return sizes
+
+def _test_pair( width, height, disparity, seed = 0 ):
+    rng = np.random.RandomState( seed )
+    texture = rng.randint( 0, 256, ( height, width + disparity ) ).astype( np.uint8 )
+    return texture[:, :width].copy(), texture[:, disparity:disparity + width].copy()
+
+def BenchmarkDUOStereoMatcher( sizes = None, numDisparities = 64, blockSize = 9,
+                               method = DUO_MATCH_SAD, workers = None, repeat = 5, report = None ):
+    """
+    Measures the matcher for every frame size returned by EnumerateDUOResolutions
+    (synthetic backend if DUOLib is not available) on a textured pair of known disparity.
+
+    @return: list of dicts
+    """
+    results = []
+    for width, height in sizes or _frame_sizes():
+        truth = min( numDisparities // 2, width // 4 )
+        left, right = _test_pair( width, height, truth )
+        matcher = DUOStereoMatcher( width, height, numDisparities, blockSize, method, workers = workers )
+        try:
+            disparity = matcher.compute( left, right )
+            start = time.perf_counter()
+            for _ in range( repeat ):
+                matcher.compute( left, right )
+            elapsed = ( time.perf_counter() - start ) / repeat
+        finally:
+            matcher.close()
+        inner = disparity[:, numDisparities:]
+        result = {
+            "width": width,
+            "height": height,
+            "method": method,
+            "numDisparities": numDisparities,
+            "blockSize": blockSize,
+            "workers": matcher.workers,
+            "ms": elapsed * 1e3,
+            "fps": 1.0 / elapsed if elapsed > 0 else 0.0,
+            "valid": float( ( disparity >= 0 ).mean() ),
+            "correct": float( ( np.abs( inner - truth ) <= 1 ).mean() ) if inner.size else None,
+            }
+        results.append( result )
+        if report is not None:
+            report( result )
+    return results
+
+def _print_result( r ):
+    print( "%4dx%-4d %s d %3d block %2d workers %2d  %8.2f ms  %7.1f fps  valid %5.1f%%" % (
+        r["width"], r["height"], "census" if r["method"] == DUO_MATCH_CENSUS else "sad   ",
+        r["numDisparities"], r["blockSize"], r["workers"], r["ms"], r["fps"], 100 * r["valid"] ) )
+
+def main( argv = None ):
+    parser = argparse.ArgumentParser( description = "DUO stereo matcher benchmark" )
+    parser.add_argument( "--disparities", type = int, default = 64 )
+    parser.add_argument( "--block", type = int, default = 9 )
+    parser.add_argument( "--census", action = "store_true", help = "census instead of SAD cost" )
+    parser.add_argument( "--workers", type = int )
+    parser.add_argument( "--repeat", type = int, default = 5 )
+    parser.add_argument( "--size", action = "append", metavar = "WxH",
+                         help = "limit to frame size (repeatable)" )
+    args = parser.parse_args( argv )
+    sizes = [ tuple( int( v ) for v in s.lower().split( "x" ) ) for s in args.size or [] ]
+    BenchmarkDUOStereoMatcher( sizes, args.disparities, args.block,
+                               DUO_MATCH_CENSUS if args.census else DUO_MATCH_SAD,
+                               args.workers, args.repeat, _print_result )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit( main() )
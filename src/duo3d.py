@@ -23,9 +23,12 @@
 """
 
 import os
+import threading
 import ctypes as ct
 
 __all__ = [
+    "GetDUOBackend", "LoadDUOLibrary", "SetDUOBackend",
+
     "CloseDUO", "EnumerateDUOResolutions", "FindOptimalBinning",
     "GetDUOCalibrationPresent", "GetDUOCameraSwap", "GetDUODeviceName",
     "GetDUOExposure", "GetDUOExposureMS", "GetDUOExtrinsics", "GetDUOFOV",
@@ -48,23 +51,173 @@ __all__ = [
     "DUO_GYRO_1000", "DUO_GYRO_2000", "DUO_GYRO_250", "DUO_GYRO_500",
     ]
 
-# Load shared library
+# Shared library
 if os.sys.platform.startswith( "win" ):
+    _duolib_name = "DUOLib"
     _duolib_filename = "DUOLib.dll"
-elif os.sys.platform.startswith( "linux" ):
-    _duolib_filename = "libDUO.so"
 elif os.sys.platform.startswith( "darwin" ):
+    _duolib_name = "DUO"
     _duolib_filename = "libDUO.dylib"
-_duolib_filepath = os.path.abspath( os.path.join( os.path.dirname( __file__ ),
-                                                "..",
-                                                _duolib_filename ) )
+else:
+    _duolib_name = "DUO"
+    _duolib_filename = "libDUO.so"
 
-if not os.path.isfile( _duolib_filepath ):
-    _duolib_dir = os.path.dirname( _duolib_filepath )
-    error_str = "You need to copy '%s' from DUOSDK into %s to make this package work"
-    raise ImportError( error_str % ( _duolib_filename, _duolib_dir ) )
+# Environment variable with DUOLib path (file or directory)
+DUO3D_LIB_ENV = "DUO3D_LIB"
+# Environment variable selecting the default backend ("duolib" or "synthetic")
+DUO3D_BACKEND_ENV = "DUO3D_BACKEND"
+
+class _DUOLibLoader( object ):
+    """
+    Loads DUOLib (or the selected backend, see SetDUOBackend) on first use.
+    Function prototypes are registered at import time, but argtypes/restype
+    are bound only when a function is used for the first time. Bound
+    functions are cached as attributes, so __getattr__ runs once per function.
+    """
+
+    def __init__( self ):
+        self._lib = None
+        self._prototypes = {}
+        self._lock = threading.Lock()
+        self._wrapper = None
+
+    def prototype( self, name, argtypes, restype ):
+        """
+        Registers argtypes and restype of DUOLib function
+        """
+        self._prototypes[name] = ( argtypes, restype )
+
+    def _candidates( self, path ):
+        if path:
+            yield path
+        env_path = os.environ.get( DUO3D_LIB_ENV )
+        if env_path:
+            if os.path.isdir( env_path ):
+                env_path = os.path.join( env_path, _duolib_filename )
+            yield env_path
+        package_dir = os.path.dirname( os.path.abspath( __file__ ) )
+        yield os.path.abspath( os.path.join( package_dir, "..", _duolib_filename ) )
+        yield os.path.join( package_dir, _duolib_filename )
+
+    def _load_duolib( self, path ):
+        for filepath in self._candidates( path ):
+            if os.path.isfile( filepath ):
+                return ct.cdll.LoadLibrary( filepath )
+
+        import ctypes.util  # Slow to import, needed only here
+        system_path = ctypes.util.find_library( _duolib_name ) or _duolib_filename
+        try:
+            return ct.cdll.LoadLibrary( system_path )
+        except OSError:
+            package_dir = os.path.dirname( os.path.abspath( __file__ ) )
+            error_str = ( "You need to copy '%s' from DUOSDK into %s "
+                          "(or set %s) to make this package work" )
+            raise ImportError( error_str % ( _duolib_filename,
+                                             os.path.dirname( package_dir ),
+                                             DUO3D_LIB_ENV ) )
+
+    def _create_backend( self, backend, path = None ):
+        if backend is None:
+            backend = os.environ.get( DUO3D_BACKEND_ENV ) or "duolib"
+        if backend == "duolib":
+            return self._load_duolib( path )
+        if backend == "synthetic":
+            from .synthetic import SyntheticDUOLib
+            return SyntheticDUOLib()
+        if isinstance( backend, str ):
+            raise ValueError( "unknown DUO backend: %r" % ( backend, ) )
+        return backend
+
+    def load( self, path = None ):
+        """
+        Loads the backend (if not loaded yet).
+        DUOLib is searched for in: path, $DUO3D_LIB, the directory above
+        the package (where setup.py installs it), the package directory and
+        finally the system library search path.
+        """
+        with self._lock:
+            if self._lib is None:
+                self._lib = self._create_backend( None, path )
+            return self._lib
+
+    def _unbind( self ):
+        for name in list( self.__dict__ ):
+            if not name.startswith( "_" ):
+                delattr( self, name )
+
+    def use( self, backend ):
+        """
+        Replaces the backend and unbinds all the cached functions
+        """
+        with self._lock:
+            self._lib = None if backend is None else self._create_backend( backend )
+            self._unbind()
+
+    def intercept( self, wrapper ):
+        """
+        Binds every function through wrapper( name, func ) returning its replacement
+        (None binds the functions directly again). Cached functions are unbound.
+        """
+        with self._lock:
+            self._wrapper = wrapper
+            self._unbind()
+
+    def __getattr__( self, name ):
+        # Called only for functions that are not bound yet
+        if name.startswith( "_" ):
+            raise AttributeError( name )
+        lib = self._lib if self._lib is not None else self.load()
+        func = getattr( lib, name )
+        if isinstance( lib, ct.CDLL ) and name in self._prototypes:
+            func.argtypes, func.restype = self._prototypes[name]
+        if self._wrapper is not None:
+            func = self._wrapper( name, func )
+        setattr( self, name, func )
+        return func
+
+_duolib = _DUOLibLoader()
+
+# Functions called with the DUOInstance when its resolution changed or it was
+# closed (None when the backend changed), helper modules drop cached state
+_deviceListeners = []
+
+def _notify_device( duo ):
+    for listener in list( _deviceListeners ):
+        listener( duo )
+
+def LoadDUOLibrary( path = None ):
+    """
+    Loads DUOLib immediately instead of on the first call.
 
-_duolib = ct.cdll.LoadLibrary( _duolib_filepath )
+    @note: Not a part of DUO API, just a helper function
+    @param path: optional path to the DUOLib shared library
+    @return: True on success
+    """
+    _duolib.load( path )
+    return True
+
+def SetDUOBackend( backend = None ):
+    """
+    Selects the implementation behind all the DUO API functions.
+    Stop and close the devices before switching.
+
+    @note: Not a part of DUO API, just a helper function
+    @param backend: "duolib" for the DUOLib shared library,
+                    "synthetic" for duo3d.synthetic.SyntheticDUOLib with default settings,
+                    any object implementing DUOLib functions (e.g. configured SyntheticDUOLib)
+                    or None to pick the backend from $DUO3D_BACKEND on the next call
+    """
+    _duolib.use( backend )
+    _notify_device( None )
+
+def GetDUOBackend():
+    """
+    Returns the object implementing the DUO API functions
+    (ctypes.CDLL of DUOLib or e.g. SyntheticDUOLib), loading it if needed.
+
+    @note: Not a part of DUO API, just a helper function
+    """
+    return _duolib.load()
 
 # DUO instance
 DUOInstance = ct.c_void_p
@@ -205,8 +358,7 @@ class DUO_STEREO( ct.Structure ):
         ( "Q", ct.c_double * 16 )  # 4x4 - Disparity to depth mapping matrix
         ]
 
-_duolib.GetDUOLibVersion.argtypes = None
-_duolib.GetDUOLibVersion.restype = ct.c_char_p
+_duolib.prototype( "GetDUOLibVersion", None, ct.c_char_p )
 
 def GetDUOLibVersion():
     """
@@ -215,15 +367,14 @@ def GetDUOLibVersion():
     return _duolib.GetDUOLibVersion()
 
 # DUO resolution enumeration
-_duolib.EnumerateDUOResolutions.argtypes = [
+_duolib.prototype( "EnumerateDUOResolutions", [
     PDUOResolutionInfo,
     ct.c_int32,
     ct.c_int32,
     ct.c_int32,
     ct.c_int32,
     ct.c_float
-    ]
-_duolib.EnumerateDUOResolutions.restype = ct.c_int
+    ], ct.c_int )
 
 def EnumerateDUOResolutions( resList, resListSize, width = -1, height = -1,
                           binning = DUO_BIN_ANY, fps = -1.0 ):
@@ -270,8 +421,7 @@ def FindOptimalBinning( width, height ):
     return binning
 
 # DUO device initialization
-_duolib.OpenDUO.argtypes = [ ct.POINTER( DUOInstance ) ]
-_duolib.OpenDUO.restype = ct.c_bool
+_duolib.prototype( "OpenDUO", [ ct.POINTER( DUOInstance ) ], ct.c_bool )
 
 def OpenDUO( duo ):
     """
@@ -282,8 +432,7 @@ def OpenDUO( duo ):
     """
     return _duolib.OpenDUO( ct.byref( duo ) )
 
-_duolib.CloseDUO.argtypes = [ DUOInstance ]
-_duolib.CloseDUO.restype = ct.c_bool
+_duolib.prototype( "CloseDUO", [ DUOInstance ], ct.c_bool )
 
 def CloseDUO( duo ):
     """
@@ -292,7 +441,9 @@ def CloseDUO( duo ):
     @param duo: DUOInstance handle pointer
     @return: True on success
     """
-    return _duolib.CloseDUO( duo )
+    result = _duolib.CloseDUO( duo )
+    _notify_device( duo )
+    return result
 
 # DUO frame callback function
 # NOTE: This function is called in the context of the DUO capture thread.
@@ -300,11 +451,10 @@ def CloseDUO( duo ):
 DUOFrameCallback = ct.CFUNCTYPE( None, PDUOFrame, ct.c_void_p )
 
 # DUO device capture control
-_duolib.StartDUO.argtypes = [ DUOInstance,
-                             DUOFrameCallback,
-                             ct.c_void_p,
-                             ct.c_bool ]
-_duolib.StartDUO.restype = ct.c_bool
+_duolib.prototype( "StartDUO", [ DUOInstance,
+                                DUOFrameCallback,
+                                ct.c_void_p,
+                                ct.c_bool ], ct.c_bool )
 
 def StartDUO( duo, frameCallback = None, pUserData = None, masterMode = True ):
     """
@@ -319,8 +469,7 @@ def StartDUO( duo, frameCallback = None, pUserData = None, masterMode = True ):
     callback = ( frameCallback if frameCallback is not None else DUOFrameCallback() )
     return _duolib.StartDUO( duo, callback, pUserData, masterMode )
 
-_duolib.StopDUO.argtypes = [ DUOInstance ]
-_duolib.StopDUO.restype = ct.c_bool
+_duolib.prototype( "StopDUO", [ DUOInstance ], ct.c_bool )
 
 def StopDUO( duo ):
     """
@@ -332,9 +481,8 @@ def StopDUO( duo ):
     return _duolib.StopDUO( duo )
 
 # Get DUO parameters
-_duolib.GetDUODeviceName.argtypes = [ DUOInstance,
-                                     ct.c_char_p ]
-_duolib.GetDUODeviceName.restype = ct.c_bool
+_duolib.prototype( "GetDUODeviceName", [ DUOInstance,
+                                        ct.c_char_p ], ct.c_bool )
 
 def GetDUODeviceName( duo ):
     """
@@ -344,9 +492,8 @@ def GetDUODeviceName( duo ):
     _duolib.GetDUODeviceName( duo, val )
     return val.value
 
-_duolib.GetDUOSerialNumber.argtypes = [ DUOInstance,
-                                       ct.c_char_p ]
-_duolib.GetDUOSerialNumber.restype = ct.c_bool
+_duolib.prototype( "GetDUOSerialNumber", [ DUOInstance,
+                                          ct.c_char_p ], ct.c_bool )
 
 def GetDUOSerialNumber( duo ):
     """
@@ -356,9 +503,8 @@ def GetDUOSerialNumber( duo ):
     _duolib.GetDUOSerialNumber( duo, val )
     return val.value
 
-_duolib.GetDUOFirmwareVersion.argtypes = [ DUOInstance,
-                                          ct.c_char_p ]
-_duolib.GetDUOFirmwareVersion.restype = ct.c_bool
+_duolib.prototype( "GetDUOFirmwareVersion", [ DUOInstance,
+                                             ct.c_char_p ], ct.c_bool )
 
 def GetDUOFirmwareVersion( duo ):
     """
@@ -368,9 +514,8 @@ def GetDUOFirmwareVersion( duo ):
     _duolib.GetDUOFirmwareVersion( duo, val )
     return val.value
 
-_duolib.GetDUOFirmwareBuild.argtypes = [ DUOInstance,
-                                        ct.c_char_p ]
-_duolib.GetDUOFirmwareBuild.restype = ct.c_bool
+_duolib.prototype( "GetDUOFirmwareBuild", [ DUOInstance,
+                                           ct.c_char_p ], ct.c_bool )
 
 def GetDUOFirmwareBuild( duo ):
     """
@@ -380,9 +525,8 @@ def GetDUOFirmwareBuild( duo ):
     _duolib.GetDUOFirmwareBuild( duo, val )
     return val.value
 
-_duolib.GetDUOResolutionInfo.argtypes = [ DUOInstance,
-                                         PDUOResolutionInfo ]
-_duolib.GetDUOResolutionInfo.restype = ct.c_bool
+_duolib.prototype( "GetDUOResolutionInfo", [ DUOInstance,
+                                            PDUOResolutionInfo ], ct.c_bool )
 
 def GetDUOResolutionInfo( duo ):
     """
@@ -392,10 +536,9 @@ def GetDUOResolutionInfo( duo ):
     _duolib.GetDUOResolutionInfo( duo, ct.byref( res_info ) )
     return res_info
 
-_duolib.GetDUOFrameDimension.argtypes = [ DUOInstance,
-                                         ct.POINTER( ct.c_uint32 ),
-                                         ct.POINTER( ct.c_uint32 ) ]
-_duolib.GetDUOFrameDimension.restype = ct.c_bool
+_duolib.prototype( "GetDUOFrameDimension", [ DUOInstance,
+                                            ct.POINTER( ct.c_uint32 ),
+                                            ct.POINTER( ct.c_uint32 ) ], ct.c_bool )
 
 def GetDUOFrameDimension( duo ):
     """
@@ -407,9 +550,8 @@ def GetDUOFrameDimension( duo ):
     _duolib.GetDUOFrameDimension( duo, ct.byref( w ), ct.byref( h ) )
     return ( w.value, h.value )
 
-_duolib.GetDUOExposure.argtypes = [ DUOInstance,
-                                   ct.POINTER( ct.c_double ) ]
-_duolib.GetDUOExposure.restype = ct.c_bool
+_duolib.prototype( "GetDUOExposure", [ DUOInstance,
+                                      ct.POINTER( ct.c_double ) ], ct.c_bool )
 
 def GetDUOExposure( duo ):
     """
@@ -419,9 +561,8 @@ def GetDUOExposure( duo ):
     _duolib.GetDUOExposure( duo, ct.byref( val ) )
     return val.value
 
-_duolib.GetDUOExposureMS.argtypes = [ DUOInstance,
-                                     ct.POINTER( ct.c_double ) ]
-_duolib.GetDUOExposureMS.restype = ct.c_bool
+_duolib.prototype( "GetDUOExposureMS", [ DUOInstance,
+                                        ct.POINTER( ct.c_double ) ], ct.c_bool )
 
 def GetDUOExposureMS( duo ):
     """
@@ -431,9 +572,8 @@ def GetDUOExposureMS( duo ):
     _duolib.GetDUOExposureMS( duo, ct.byref( val ) )
     return val.value
 
-_duolib.GetDUOAutoExposure.argtypes = [ DUOInstance,
-                                       ct.POINTER( ct.c_bool ) ]
-_duolib.GetDUOAutoExposure.restype = ct.c_bool
+_duolib.prototype( "GetDUOAutoExposure", [ DUOInstance,
+                                          ct.POINTER( ct.c_bool ) ], ct.c_bool )
 
 def GetDUOAutoExposure( duo ):
     """
@@ -443,9 +583,8 @@ def GetDUOAutoExposure( duo ):
     _duolib.GetDUOAutoExposure( duo, ct.byref( val ) )
     return val.value
 
-_duolib.GetDUOGain.argtypes = [ DUOInstance,
-                               ct.POINTER( ct.c_double ) ]
-_duolib.GetDUOGain.restype = ct.c_bool
+_duolib.prototype( "GetDUOGain", [ DUOInstance,
+                                  ct.POINTER( ct.c_double ) ], ct.c_bool )
 
 def GetDUOGain( duo ):
     """
@@ -455,9 +594,8 @@ def GetDUOGain( duo ):
     _duolib.GetDUOGain( duo, ct.byref( val ) )
     return val.value
 
-_duolib.GetDUOHFlip.argtypes = [ DUOInstance,
-                               ct.POINTER( ct.c_bool ) ]
-_duolib.GetDUOHFlip.restype = ct.c_bool
+_duolib.prototype( "GetDUOHFlip", [ DUOInstance,
+                                  ct.POINTER( ct.c_bool ) ], ct.c_bool )
 
 def GetDUOHFlip( duo ):
     """
@@ -467,9 +605,8 @@ def GetDUOHFlip( duo ):
     _duolib.GetDUOHFlip( duo, ct.byref( val ) )
     return val.value
 
-_duolib.GetDUOVFlip.argtypes = [ DUOInstance,
-                               ct.POINTER( ct.c_bool ) ]
-_duolib.GetDUOVFlip.restype = ct.c_bool
+_duolib.prototype( "GetDUOVFlip", [ DUOInstance,
+                                  ct.POINTER( ct.c_bool ) ], ct.c_bool )
 
 def GetDUOVFlip( duo ):
     """
@@ -479,9 +616,8 @@ def GetDUOVFlip( duo ):
     _duolib.GetDUOVFlip( duo, ct.byref( val ) )
     return val.value
 
-_duolib.GetDUOCameraSwap.argtypes = [ DUOInstance,
-                               ct.POINTER( ct.c_bool ) ]
-_duolib.GetDUOCameraSwap.restype = ct.c_bool
+_duolib.prototype( "GetDUOCameraSwap", [ DUOInstance,
+                                  ct.POINTER( ct.c_bool ) ], ct.c_bool )
 
 def GetDUOCameraSwap( duo ):
     """
@@ -491,9 +627,8 @@ def GetDUOCameraSwap( duo ):
     _duolib.GetDUOCameraSwap( duo, ct.byref( val ) )
     return val.value
 
-_duolib.GetDUOLedPWM.argtypes = [ DUOInstance,
-                               ct.POINTER( ct.c_double ) ]
-_duolib.GetDUOLedPWM.restype = ct.c_bool
+_duolib.prototype( "GetDUOLedPWM", [ DUOInstance,
+                                  ct.POINTER( ct.c_double ) ], ct.c_bool )
 
 def GetDUOLedPWM( duo ):
     """
@@ -503,9 +638,8 @@ def GetDUOLedPWM( duo ):
     _duolib.GetDUOLedPWM( duo, ct.byref( val ) )
     return val.value
 
-_duolib.GetDUOCalibrationPresent.argtypes = [ DUOInstance,
-                               ct.POINTER( ct.c_bool ) ]
-_duolib.GetDUOCalibrationPresent.restype = ct.c_bool
+_duolib.prototype( "GetDUOCalibrationPresent", [ DUOInstance,
+                                  ct.POINTER( ct.c_bool ) ], ct.c_bool )
 
 def GetDUOCalibrationPresent( duo ):
     """
@@ -515,9 +649,8 @@ def GetDUOCalibrationPresent( duo ):
     _duolib.GetDUOCalibrationPresent( duo, ct.byref( val ) )
     return val.value
 
-_duolib.GetDUOFOV.argtypes = [ DUOInstance,
-                              ct.POINTER( ct.c_double ) ]
-_duolib.GetDUOFOV.restype = ct.c_bool
+_duolib.prototype( "GetDUOFOV", [ DUOInstance,
+                                 ct.POINTER( ct.c_double ) ], ct.c_bool )
 
 def GetDUOFOV( duo ):
     """
@@ -527,9 +660,8 @@ def GetDUOFOV( duo ):
     _duolib.GetDUOFOV( duo, val )
     return tuple( val )
 
-_duolib.GetDUORectifiedFOV.argtypes = [ DUOInstance,
-                                       ct.POINTER( ct.c_double ) ]
-_duolib.GetDUORectifiedFOV.restype = ct.c_bool
+_duolib.prototype( "GetDUORectifiedFOV", [ DUOInstance,
+                                          ct.POINTER( ct.c_double ) ], ct.c_bool )
 
 def GetDUORectifiedFOV( duo ):
     """
@@ -539,9 +671,8 @@ def GetDUORectifiedFOV( duo ):
     _duolib.GetDUORectifiedFOV( duo, val )
     return tuple( val )
 
-_duolib.GetDUOUndistort.argtypes = [ DUOInstance,
-                                    ct.POINTER( ct.c_bool ) ]
-_duolib.GetDUOUndistort.restype = ct.c_bool
+_duolib.prototype( "GetDUOUndistort", [ DUOInstance,
+                                       ct.POINTER( ct.c_bool ) ], ct.c_bool )
 
 def GetDUOUndistort( duo ):
     """
@@ -551,46 +682,45 @@ def GetDUOUndistort( duo ):
     _duolib.GetDUOUndistort( duo, ct.byref( val ) )
     return val.value
 
-_duolib.GetDUOIntrinsics.argtypes = [ DUOInstance,
-                                     ct.POINTER( DUO_INTR ) ]
-_duolib.GetDUOIntrinsics.restype = ct.c_bool
+_duolib.prototype( "GetDUOIntrinsics", [ DUOInstance,
+                                        ct.POINTER( DUO_INTR ) ], ct.c_bool )
 
-def GetDUOIntrinsics( duo ):
+def GetDUOIntrinsics( duo, val = None ):
     """
     Returns DUO camera intrinsics parameters, see DUO_INTR structure
+    @param val: optional DUO_INTR to fill instead of a new one
     """
-    val = DUO_INTR()
+    val = DUO_INTR() if val is None else val
     _duolib.GetDUOIntrinsics( duo, ct.byref( val ) )
     return val
 
-_duolib.GetDUOExtrinsics.argtypes = [ DUOInstance,
-                                     ct.POINTER( DUO_EXTR ) ]
-_duolib.GetDUOExtrinsics.restype = ct.c_bool
+_duolib.prototype( "GetDUOExtrinsics", [ DUOInstance,
+                                        ct.POINTER( DUO_EXTR ) ], ct.c_bool )
 
-def GetDUOExtrinsics( duo, val ):
+def GetDUOExtrinsics( duo, val = None ):
     """
     Returns DUO camera extrinsics parameters, see DUO_EXTR structure
+    @param val: optional DUO_EXTR to fill instead of a new one
     """
-    val = DUO_EXTR()
+    val = DUO_EXTR() if val is None else val
     _duolib.GetDUOExtrinsics( duo, ct.byref( val ) )
     return val
 
-_duolib.GetDUOStereoParameters.argtypes = [ DUOInstance,
-                                     ct.POINTER( DUO_STEREO ) ]
-_duolib.GetDUOStereoParameters.restype = ct.c_bool
+_duolib.prototype( "GetDUOStereoParameters", [ DUOInstance,
+                                        ct.POINTER( DUO_STEREO ) ], ct.c_bool )
 
-def GetDUOStereoParameters( duo ):
+def GetDUOStereoParameters( duo, val = None ):
     """
     Returns DUO camera stereo parameters, see DUO_STEREO structure
+    @param val: optional DUO_STEREO to fill instead of a new one
     """
-    val = DUO_STEREO()
-    return _duolib.GetDUOStereoParameters( duo, ct.byref( val ) )
+    val = DUO_STEREO() if val is None else val
+    _duolib.GetDUOStereoParameters( duo, ct.byref( val ) )
     return val
 
-_duolib.GetDUOIMURange.argtypes = [ DUOInstance,
-                                   ct.POINTER( ct.c_int ),
-                                   ct.POINTER( ct.c_int ) ]
-_duolib.GetDUOIMURange.restype = ct.c_bool
+_duolib.prototype( "GetDUOIMURange", [ DUOInstance,
+                                      ct.POINTER( ct.c_int ),
+                                      ct.POINTER( ct.c_int ) ], ct.c_bool )
 
 def GetDUOIMURange( duo ):
     """
@@ -603,8 +733,7 @@ def GetDUOIMURange( duo ):
     return ( accel.value, gyro.value )
 
 # Set DUO parameters
-_duolib.SetDUOResolutionInfo.argtypes = [ DUOInstance, DUOResolutionInfo ]
-_duolib.SetDUOResolutionInfo.restype = ct.c_bool
+_duolib.prototype( "SetDUOResolutionInfo", [ DUOInstance, DUOResolutionInfo ], ct.c_bool )
 
 def SetDUOResolutionInfo( duo, res_info ):
     """
@@ -613,10 +742,12 @@ def SetDUOResolutionInfo( duo, res_info ):
     with desired image size, binning and frame rate.
     @return: True on success
     """
-    return _duolib.SetDUOResolutionInfo( duo, res_info )
+    result = _duolib.SetDUOResolutionInfo( duo, res_info )
+    if result:
+        _notify_device( duo )
+    return result
 
-_duolib.SetDUOExposure.argtypes = [ DUOInstance, ct.c_double ]
-_duolib.SetDUOExposure.restype = ct.c_bool
+_duolib.prototype( "SetDUOExposure", [ DUOInstance, ct.c_double ], ct.c_bool )
 
 def SetDUOExposure( duo, val ):
     """
@@ -625,8 +756,7 @@ def SetDUOExposure( duo, val ):
     """
     return _duolib.SetDUOExposure( duo, ct.c_double( val ) )
 
-_duolib.SetDUOExposureMS.argtypes = [ DUOInstance, ct.c_double ]
-_duolib.SetDUOExposureMS.restype = ct.c_bool
+_duolib.prototype( "SetDUOExposureMS", [ DUOInstance, ct.c_double ], ct.c_bool )
 
 def SetDUOExposureMS( duo, val ):
     """
@@ -635,8 +765,7 @@ def SetDUOExposureMS( duo, val ):
     """
     return _duolib.SetDUOExposureMS( duo, ct.c_double( val ) )
 
-_duolib.SetDUOAutoExposure.argtypes = [ DUOInstance, ct.c_bool ]
-_duolib.SetDUOAutoExposure.restype = ct.c_bool
+_duolib.prototype( "SetDUOAutoExposure", [ DUOInstance, ct.c_bool ], ct.c_bool )
 
 def SetDUOAutoExposure( duo, val ):
     """
@@ -646,8 +775,7 @@ def SetDUOAutoExposure( duo, val ):
     """
     return _duolib.SetDUOAutoExposure( duo, ct.c_bool( val ) )
 
-_duolib.SetDUOGain.argtypes = [ DUOInstance, ct.c_double ]
-_duolib.SetDUOGain.restype = ct.c_bool
+_duolib.prototype( "SetDUOGain", [ DUOInstance, ct.c_double ], ct.c_bool )
 
 def SetDUOGain( duo, val ):
     """
@@ -656,8 +784,7 @@ def SetDUOGain( duo, val ):
     """
     return _duolib.SetDUOGain( duo, ct.c_double( val ) )
 
-_duolib.SetDUOHFlip.argtypes = [ DUOInstance, ct.c_bool ]
-_duolib.SetDUOHFlip.restype = ct.c_bool
+_duolib.prototype( "SetDUOHFlip", [ DUOInstance, ct.c_bool ], ct.c_bool )
 
 def SetDUOHFlip( duo, val ):
     """
@@ -666,8 +793,7 @@ def SetDUOHFlip( duo, val ):
     """
     return _duolib.SetDUOHFlip( duo, ct.c_bool( val ) )
 
-_duolib.SetDUOVFlip.argtypes = [ DUOInstance, ct.c_bool ]
-_duolib.SetDUOVFlip.restype = ct.c_bool
+_duolib.prototype( "SetDUOVFlip", [ DUOInstance, ct.c_bool ], ct.c_bool )
 
 def SetDUOVFlip( duo, val ):
     """
@@ -676,8 +802,7 @@ def SetDUOVFlip( duo, val ):
     """
     return _duolib.SetDUOVFlip( duo, ct.c_bool( val ) )
 
-_duolib.SetDUOCameraSwap.argtypes = [ DUOInstance, ct.c_bool ]
-_duolib.SetDUOCameraSwap.restype = ct.c_bool
+_duolib.prototype( "SetDUOCameraSwap", [ DUOInstance, ct.c_bool ], ct.c_bool )
 
 def SetDUOCameraSwap( duo, val ):
     """
@@ -686,8 +811,7 @@ def SetDUOCameraSwap( duo, val ):
     """
     return _duolib.SetDUOCameraSwap( duo, ct.c_bool( val ) )
 
-_duolib.SetDUOLedPWM.argtypes = [ DUOInstance, ct.c_double ]
-_duolib.SetDUOLedPWM.restype = ct.c_bool
+_duolib.prototype( "SetDUOLedPWM", [ DUOInstance, ct.c_double ], ct.c_bool )
 
 def SetDUOLedPWM( duo, val ):
     """
@@ -696,8 +820,7 @@ def SetDUOLedPWM( duo, val ):
     """
     return _duolib.SetDUOLedPWM( duo, ct.c_double( val ) )
 
-_duolib.SetDUOLedPWMSeq.argtypes = [ DUOInstance, PDUOLEDSeq, ct.c_uint32 ]
-_duolib.SetDUOLedPWMSeq.restype = ct.c_bool
+_duolib.prototype( "SetDUOLedPWMSeq", [ DUOInstance, PDUOLEDSeq, ct.c_uint32 ], ct.c_bool )
 
 def SetDUOLedPWMSeq( duo, val, size ):
     """
@@ -707,8 +830,7 @@ def SetDUOLedPWMSeq( duo, val, size ):
     """
     return _duolib.SetDUOLedPWMSeq( duo, val, ct.c_uint32( size ) )
 
-_duolib.SetDUOUndistort.argtypes = [ DUOInstance, ct.c_bool ]
-_duolib.SetDUOUndistort.restype = ct.c_bool
+_duolib.prototype( "SetDUOUndistort", [ DUOInstance, ct.c_bool ], ct.c_bool )
 
 def SetDUOUndistort( duo, val ):
     """
@@ -717,8 +839,7 @@ def SetDUOUndistort( duo, val ):
     """
     return _duolib.SetDUOUndistort( duo, ct.c_bool( val ) )
 
-_duolib.SetDUOIMURange.argtypes = [ DUOInstance, ct.c_int, ct.c_int ]
-_duolib.SetDUOIMURange.restype = ct.c_bool
+_duolib.prototype( "SetDUOIMURange", [ DUOInstance, ct.c_int, ct.c_int ], ct.c_bool )
 
 def SetDUOIMURange( duo, accel, gyro ):
     """
@@ -727,8 +848,7 @@ def SetDUOIMURange( duo, accel, gyro ):
     """
     return _duolib.SetDUOIMURange( duo, ct.c_int( accel ), ct.c_int( gyro ) )
 
-_duolib.SetDUOIMURate.argtypes = [ DUOInstance, ct.c_double ]
-_duolib.SetDUOIMURate.restype = ct.c_bool
+_duolib.prototype( "SetDUOIMURate", [ DUOInstance, ct.c_double ], ct.c_bool )
 
 def SetDUOIMURate( duo, rate ):
     """
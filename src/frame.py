@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.frame
+
+    @brief: NumPy access to DUOFrame image and IMU data
+
+    The views returned by GetDUOFrameImages point straight into the buffers
+    owned by DUOLib, so they are only valid inside DUOFrameCallback.
+    Use DetachDUOFrameImages to copy a frame into (preallocated) arrays that
+    may outlive the callback.
+    IMU samples are returned as DUO_IMU_DTYPE structured arrays copied from
+    DUOFrame.IMUData in a single memmove.
+"""
+
+import ctypes as ct
+import numpy as np
+
+from .duo3d import DUOFrame, DUOIMUSample, DUO_MAX_IMU_SAMPLES
+
+__all__ = [
+    "GetDUOFrameLeft", "GetDUOFrameRight", "GetDUOFrameImages",
+    "DetachDUOFrameImages", "GetDUOFrameIMU", "GetDUOFrameIMUArrays",
+
+    "DUO_IMU_DTYPE",
+    ]
+
+# NumPy equivalent of DUOIMUSample
+DUO_IMU_DTYPE = np.dtype( [
+    ( "timeStamp", np.uint32 ),  # DUO IMU time stamp in 100us increments
+    ( "tempData", np.float32 ),  # DUO temperature data in degrees Centigrade
+    ( "accelData", np.float32, ( 3, ) ),  # DUO accelerometer data (x,y,z) in g units
+    ( "gyroData", np.float32, ( 3, ) ),  # DUO gyroscope data (x,y,z) in degrees/s
+    ] )
+assert DUO_IMU_DTYPE.itemsize == ct.sizeof( DUOIMUSample )
+
+_IMU_OFFSET = DUOFrame.IMUData.offset
+
+def _contents( frame ):
+    """
+    Accepts both DUOFrame and PDUOFrame (as passed to DUOFrameCallback)
+    """
+    return frame if isinstance( frame, DUOFrame ) else frame.contents
+
+def _address( data ):
+    """
+    Returns the address of the buffer pointed by DUOFrame.leftData / rightData
+    """
+    address = ct.cast( data, ct.c_void_p ).value
+    if not address:
+        raise ValueError( "DUOFrame image pointer is NULL" )
+    return address
+
+def _view( data, width, height ):
+    buf = ( ct.c_uint8 * ( width * height ) ).from_address( _address( data ) )
+    return np.frombuffer( buf, np.uint8 ).reshape( height, width )
+
+def _check_out( out, size ):
+    if not isinstance( out, np.ndarray ) or out.dtype != np.uint8:
+        raise TypeError( "output buffer must be a numpy.uint8 array" )
+    if not out.flags.c_contiguous or not out.flags.writeable:
+        raise ValueError( "output buffer must be C-contiguous and writeable" )
+    if out.size != size:
+        raise ValueError( "output buffer has %d elements, frame needs %d" % ( out.size, size ) )
+
+def GetDUOFrameLeft( frame ):
+    """
+    Returns left frame data as a (height, width) uint8 array (no copy).
+
+    @param frame: DUOFrame or PDUOFrame
+    @return: numpy.ndarray view valid only until DUOFrameCallback returns
+    """
+    f = _contents( frame )
+    return _view( f.leftData, f.width, f.height )
+
+def GetDUOFrameRight( frame ):
+    """
+    Returns right frame data as a (height, width) uint8 array (no copy).
+
+    @param frame: DUOFrame or PDUOFrame
+    @return: numpy.ndarray view valid only until DUOFrameCallback returns
+    """
+    f = _contents( frame )
+    return _view( f.rightData, f.width, f.height )
+
+def GetDUOFrameImages( frame ):
+    """
+    Returns left and right frame data as (height, width) uint8 arrays (no copy).
+
+    @param frame: DUOFrame or PDUOFrame
+    @return: tuple(left, right) of numpy.ndarray views
+    """
+    f = _contents( frame )
+    return ( _view( f.leftData, f.width, f.height ),
+             _view( f.rightData, f.width, f.height ) )
+
+def DetachDUOFrameImages( frame, left = None, right = None ):
+    """
+    Copies left and right frame data out of the DUOLib buffers.
+    Each eye is copied with a single memmove into the given arrays,
+    new ones are allocated only if left / right are not given.
+
+    @param frame: DUOFrame or PDUOFrame
+    @param left: preallocated C-contiguous uint8 array of width*height elements
+    @param right: preallocated C-contiguous uint8 array of width*height elements
+    @return: tuple(left, right) of (height, width) numpy.ndarray
+    """
+    f = _contents( frame )
+    width, height = f.width, f.height
+    size = width * height
+    if left is None:
+        left = np.empty( ( height, width ), np.uint8 )
+    if right is None:
+        right = np.empty( ( height, width ), np.uint8 )
+    _check_out( left, size )
+    _check_out( right, size )
+
+    ct.memmove( left.ctypes.data, _address( f.leftData ), size )
+    ct.memmove( right.ctypes.data, _address( f.rightData ), size )
+
+    if left.shape != ( height, width ):
+        left = left.reshape( height, width )
+    if right.shape != ( height, width ):
+        right = right.reshape( height, width )
+    return ( left, right )
+
+def GetDUOFrameIMU( frame, out = None ):
+    """
+    Returns valid IMU samples of the frame (first IMUSamples entries of IMUData)
+    as a DUO_IMU_DTYPE structured array, copied with a single memmove.
+
+    @param frame: DUOFrame or PDUOFrame
+    @param out: preallocated C-contiguous DUO_IMU_DTYPE array, at least IMUSamples long
+    @return: numpy.ndarray of IMUSamples elements (a view of out if given)
+    """
+    f = _contents( frame )
+    samples = min( f.IMUSamples, DUO_MAX_IMU_SAMPLES )
+    if out is None:
+        out = np.empty( samples, DUO_IMU_DTYPE )
+    else:
+        if not isinstance( out, np.ndarray ) or out.dtype != DUO_IMU_DTYPE:
+            raise TypeError( "output buffer must be a DUO_IMU_DTYPE array" )
+        if not out.flags.c_contiguous or not out.flags.writeable:
+            raise ValueError( "output buffer must be C-contiguous and writeable" )
+        if out.shape[0] < samples:
+            raise ValueError( "output buffer has %d elements, frame needs %d" % ( out.shape[0], samples ) )
+        out = out[:samples]
+    if samples:
+        ct.memmove( out.ctypes.data, ct.addressof( f ) + _IMU_OFFSET,
+                    samples * DUO_IMU_DTYPE.itemsize )
+    return out
+
+def GetDUOFrameIMUArrays( frame, out = None ):
+    """
+    Same as GetDUOFrameIMU, but splits the samples into separate arrays.
+    The arrays are views of the (possibly preallocated) structured array.
+
+    @param frame: DUOFrame or PDUOFrame
+    @param out: preallocated DUO_IMU_DTYPE array, see GetDUOFrameIMU
+    @return: tuple(timeStamp (N,), tempData (N,), accelData (N,3), gyroData (N,3))
+    """
+    samples = GetDUOFrameIMU( frame, out )
+    return ( samples["timeStamp"], samples["tempData"],
+             samples["accelData"], samples["gyroData"] )
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.imu
+
+    @brief: Continuous IMU timeline with vectorized queries
+
+    DUOIMUTimeline appends the IMU samples of every frame into contiguous
+    NumPy arrays (time stamps unwrapped to int64, accelerometer and gyroscope
+    as (N, 3) float32) and answers range, interpolation and resampling queries
+    with binary searches and vectorized arithmetic:
+
+        timeline = DUOIMUTimeline( maxSamples = 60000 )
+        for frame in ring:
+            timeline.append( frame )
+            stamps, accel, gyro, temp = timeline.between( previous.timeStamp, frame.timeStamp )
+            accel, gyro = timeline.interpolate( frame.timeStamp )
+
+    Time stamps are in the DUO 100us increments; query stamps may be the raw
+    32-bit DUOFrame.timeStamp values, they are unwrapped next to the newest
+    sample. Arrays returned by between() and the properties are views valid
+    until the next append().
+"""
+
+import numpy as np
+
+from .frame import GetDUOFrameIMU, DUO_IMU_DTYPE
+from .duo3d import DUO_MAX_IMU_SAMPLES
+
+__all__ = [
+    "DUOIMUTimeline",
+    ]
+
+_WRAP = 1 << 32
+
+class DUOIMUTimeline( object ):
+    """
+    Growable (or bounded) store of IMU samples in time order
+    """
+
+    def __init__( self, capacity = 4096, maxSamples = None ):
+        """
+        @param capacity: initial number of samples, doubled when full
+        @param maxSamples: keep only the newest maxSamples samples (unbounded if None)
+        """
+        if maxSamples is not None:
+            capacity = min( capacity, maxSamples )
+        self.maxSamples = maxSamples
+        self._count = 0
+        self._start = 0  # First valid sample, advanced when bounded
+        self._high = 0  # Unwrap offset of the last appended stamp
+        self._last = None  # Last appended raw 32-bit stamp
+        self._scratch = np.empty( DUO_MAX_IMU_SAMPLES, DUO_IMU_DTYPE )
+        self._allocate( max( capacity, DUO_MAX_IMU_SAMPLES ) )
+
+        self.appended = 0  # Samples stored
+        self.duplicates = 0  # Samples ignored because not newer than the last one
+        self.discarded = 0  # Old samples dropped because of maxSamples
+
+    def _allocate( self, capacity ):
+        # Bounded timelines keep twice maxSamples so that old samples are
+        # dropped with one move every maxSamples appended samples
+        storage = capacity if self.maxSamples is None else max( capacity, 2 * self.maxSamples )
+        stamps = np.empty( storage, np.int64 )
+        accel = np.empty( ( storage, 3 ), np.float32 )
+        gyro = np.empty( ( storage, 3 ), np.float32 )
+        temp = np.empty( storage, np.float32 )
+        n, s = self._count, self._start
+        if n:
+            stamps[:n] = self._stamps[s:s + n]
+            accel[:n] = self._accel[s:s + n]
+            gyro[:n] = self._gyro[s:s + n]
+            temp[:n] = self._temp[s:s + n]
+        self._stamps, self._accel, self._gyro, self._temp = stamps, accel, gyro, temp
+        self._start = 0
+
+    def _reserve( self, extra ):
+        n = self._count + extra
+        if self.maxSamples is not None and n > self.maxSamples:
+            drop = min( n - self.maxSamples, self._count )
+            self._start += drop
+            self._count -= drop
+            self.discarded += drop
+        if self._start + self._count + extra <= len( self._stamps ):
+            return
+        if self.maxSamples is None:
+            self._allocate( max( 2 * len( self._stamps ), self._count + extra ) )
+        else:
+            self._allocate( len( self._stamps ) )
+
+    def __len__( self ):
+        return self._count
+
+    def clear( self ):
+        """
+        Removes all the samples (the storage is kept)
+        """
+        self._count = 0
+        self._start = 0
+        self._high = 0
+        self._last = None
+
+    def append( self, data ):
+        """
+        Appends the IMU samples of a frame
+
+        @param data: DUOFrame, PDUOFrame, object with an imu attribute (DUOFrameSlot,
+                     played back frames) or DUO_IMU_DTYPE array
+        @return: number of samples stored
+        """
+        if isinstance( data, np.ndarray ):
+            samples = data
+        elif hasattr( data, "imu" ):
+            samples = data.imu
+        else:
+            samples = GetDUOFrameIMU( data, self._scratch )
+        if len( samples ) == 0:
+            return 0
+        if samples.dtype != DUO_IMU_DTYPE:
+            raise TypeError( "IMU samples must be a DUO_IMU_DTYPE array" )
+
+        raw = samples["timeStamp"].astype( np.int64 )
+        # Unwrap the 32-bit stamps, also across the previous batch
+        previous = raw[0] if self._last is None else self._last
+        wraps = np.cumsum( np.diff( raw, prepend = previous ) < -( _WRAP >> 1 ) )
+        stamps = raw + self._high + wraps * _WRAP
+        if self._count:
+            keep = stamps > self._stamps[self._start + self._count - 1]
+        else:
+            keep = np.ones( len( stamps ), np.bool_ )
+        keep[1:] &= stamps[1:] > stamps[:-1]
+        self._last = int( raw[-1] )
+        self._high += int( wraps[-1] ) * _WRAP
+        n = int( np.count_nonzero( keep ) )
+        self.duplicates += len( stamps ) - n
+        if n == 0:
+            return 0
+        if n < len( stamps ):
+            stamps = stamps[keep]
+            samples = samples[keep]
+        if self.maxSamples is not None and n > self.maxSamples:
+            self.discarded += n - self.maxSamples
+            stamps = stamps[-self.maxSamples:]
+            samples = samples[-self.maxSamples:]
+            n = self.maxSamples
+        self._reserve( n )
+        i = self._start + self._count
+        self._stamps[i:i + n] = stamps
+        self._accel[i:i + n] = samples["accelData"]
+        self._gyro[i:i + n] = samples["gyroData"]
+        self._temp[i:i + n] = samples["tempData"]
+        self._count += n
+        self.appended += n
+        return n
+
+    @property
+    def timeStamp( self ):
+        """
+        Unwrapped time stamps (int64, 100us increments)
+        """
+        return self._stamps[self._start:self._start + self._count]
+
+    @property
+    def accel( self ):
+        """
+        Accelerometer data (N, 3) in g units
+        """
+        return self._accel[self._start:self._start + self._count]
+
+    @property
+    def gyro( self ):
+        """
+        Gyroscope data (N, 3) in degrees/s
+        """
+        return self._gyro[self._start:self._start + self._count]
+
+    @property
+    def temperature( self ):
+        """
+        Temperature in degrees Centigrade
+        """
+        return self._temp[self._start:self._start + self._count]
+
+    def unwrap( self, stamps ):
+        """
+        Converts 32-bit time stamps (e.g. DUOFrame.timeStamp) to the timeline stamps,
+        choosing the wrap-around period closest to the newest sample
+
+        @param stamps: scalar or array-like
+        @return: int64 scalar or array
+        """
+        stamps = np.asarray( stamps, np.int64 )
+        if self._last is None:
+            return stamps if stamps.ndim else stamps[()]
+        newest = self._high + self._last
+        unwrapped = self._high + ( stamps & ( _WRAP - 1 ) )
+        unwrapped = np.where( unwrapped - newest > _WRAP >> 1, unwrapped - _WRAP, unwrapped )
+        unwrapped = np.where( newest - unwrapped > _WRAP >> 1, unwrapped + _WRAP, unwrapped )
+        return unwrapped if unwrapped.ndim else unwrapped[()]
+
+    def index( self, begin, end, unwrapped = False ):
+        """
+        Returns the (start, stop) indexes of the samples with begin < timeStamp <= end,
+        i.e. the samples captured between two consecutive frames
+        """
+        if not unwrapped:
+            begin, end = self.unwrap( begin ), self.unwrap( end )
+        stamps = self.timeStamp
+        return ( int( np.searchsorted( stamps, begin, "right" ) ),
+                 int( np.searchsorted( stamps, end, "right" ) ) )
+
+    def between( self, begin, end, unwrapped = False ):
+        """
+        Returns the samples with begin < timeStamp <= end
+
+        @param begin: time stamp (32-bit like DUOFrame.timeStamp, or unwrapped)
+        @param end: time stamp
+        @param unwrapped: begin and end are already timeline stamps
+        @return: tuple(timeStamp, accel, gyro, temperature) views
+        """
+        start, stop = self.index( begin, end, unwrapped )
+        s = slice( self._start + start, self._start + stop )
+        return self._stamps[s], self._accel[s], self._gyro[s], self._temp[s]
+
+    def _weights( self, t ):
+        """
+        Returns the indexes of the samples around t and the interpolation weights
+        """
+        times = self.timeStamp
+        right = np.searchsorted( times, t, "left" )
+        np.clip( right, 1, max( self._count - 1, 1 ), out = right )
+        left = right - 1
+        if self._count == 1:
+            return left, left, np.zeros( ( len( t ), 1 ), np.float32 )
+        t0 = times[left]
+        w = ( t - t0 ) / ( times[right] - t0 )
+        np.clip( w, 0.0, 1.0, out = w )
+        return left, right, w.astype( np.float32 )[:, None]
+
+    def interpolate( self, stamps, unwrapped = False, accel = None, gyro = None ):
+        """
+        Linearly interpolates the accelerometer and gyroscope data at arbitrary time stamps
+        (clamped to the first / last sample outside the timeline)
+
+        @param stamps: scalar or array of time stamps
+        @param unwrapped: stamps are already timeline stamps (may be fractional)
+        @param accel: optional (M, 3) float32 output
+        @param gyro: optional (M, 3) float32 output
+        @return: tuple(accel, gyro) of shape (M, 3), or (3,) for a scalar stamp
+        """
+        if not self._count:
+            raise ValueError( "IMU timeline is empty" )
+        t = np.asarray( stamps if unwrapped else self.unwrap( stamps ) )
+        scalar = t.ndim == 0
+        left, right, w = self._weights( t.reshape( -1 ) )
+        results = []
+        for data, out in ( ( self.accel, accel ), ( self.gyro, gyro ) ):
+            a = data[left]
+            b = data[right]
+            b -= a
+            b *= w
+            if out is None:
+                out = a
+                out += b
+            else:
+                np.add( a, b, out = out )
+            results.append( out[0] if scalar else out )
+        return tuple( results )
+
+    def _range( self, begin, end, unwrapped ):
+        times = self.timeStamp
+        if begin is None:
+            begin = times[0]
+        elif not unwrapped:
+            begin = self.unwrap( begin )
+        if end is None:
+            end = times[-1]
+        elif not unwrapped:
+            end = self.unwrap( end )
+        return begin, end
+
+    def resample( self, rate, begin = None, end = None, unwrapped = False ):
+        """
+        Resamples the timeline on a regular time grid
+
+        @param rate: output sampling rate in Hz
+        @param begin: first time stamp of the grid (first sample by default)
+        @param end: last time stamp of the grid (last sample by default)
+        @return: tuple(timeStamp (float64, 100us increments), accel, gyro)
+        """
+        if not self._count:
+            raise ValueError( "IMU timeline is empty" )
+        begin, end = self._range( begin, end, unwrapped )
+        step = 10000.0 / rate
+        grid = begin + np.arange( int( ( end - begin ) / step ) + 1 ) * step
+        accel, gyro = self.interpolate( grid, True )
+        return grid, accel, gyro
+
+    def downsample( self, factor, begin = None, end = None, unwrapped = False ):
+        """
+        Averages blocks of factor consecutive samples (a trailing partial block is ignored)
+
+        @param begin: first time stamp (included, first sample by default)
+        @param end: last time stamp (included, last sample by default)
+        @return: tuple(timeStamp (float64), accel, gyro) block means
+        """
+        if not self._count:
+            raise ValueError( "IMU timeline is empty" )
+        begin, end = self._range( begin, end, unwrapped )
+        stamps, accel, gyro, temp = self.between( begin - 1, end, True )
+        n = len( stamps ) // factor * factor
+        return ( stamps[:n].reshape( -1, factor ).mean( axis = 1 ),
+                 accel[:n].reshape( -1, factor, 3 ).mean( axis = 1 ),
+                 gyro[:n].reshape( -1, factor, 3 ).mean( axis = 1 ) )
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.modes
+
+    @brief: Cached table of the DUO resolution modes
+
+    GetDUOModeTable enumerates all the modes once per backend
+    (EnumerateDUOResolutions with every filter set to "any") and answers
+    queries from in-memory indexes, without calling the library:
+
+        table = GetDUOModeTable()
+        ri = table.best( 320, 240, 30 )  # DUOResolutionInfo for SetDUOResolutionInfo
+        fast = table.with_fps( 100 )  # list of DUOResolutionInfo
+        binning = FindDUOOptimalBinning( 320, 240 )
+
+    Every query returns new DUOResolutionInfo structures. Pure Python (no NumPy).
+    FindOptimalBinning in duo3d.duo3d stays a plain calculation for the
+    752x480 sensor, FindDUOOptimalBinning looks the size up in the table.
+"""
+
+import bisect
+import threading
+
+from . import duo3d as _duo3d
+from .duo3d import (EnumerateDUOResolutions, FindOptimalBinning, GetDUOBackend, DUOResolutionInfo,
+                    DUO_BIN_ANY, DUO_BIN_HORIZONTAL2, DUO_BIN_HORIZONTAL4, DUO_BIN_VERTICAL2, DUO_BIN_VERTICAL4)
+
+__all__ = [
+    "DUOModeTable", "FindDUOOptimalBinning", "GetDUOModeTable",
+    ]
+
+def _binning_factors( binning ):
+    """
+    @return: tuple(horizontal, vertical) binning factors
+    """
+    h = 4 if binning & DUO_BIN_HORIZONTAL4 else 2 if binning & DUO_BIN_HORIZONTAL2 else 1
+    v = 4 if binning & DUO_BIN_VERTICAL4 else 2 if binning & DUO_BIN_VERTICAL2 else 1
+    return h, v
+
+class DUOModeTable( object ):
+    """
+    Resolution modes with indexed queries.
+
+    Every mode is a tuple(width, height, binning, minFps, maxFps, sensorArea),
+    sensorArea being the number of sensor pixels covered by the frame.
+    """
+
+    def __init__( self, modes ):
+        """
+        @param modes: iterable of DUOResolutionInfo
+        """
+        self.modes = []
+        for ri in modes:
+            h, v = _binning_factors( ri.binning )
+            self.modes.append( ( ri.width, ri.height, ri.binning, ri.minFps, ri.maxFps,
+                                 ri.width * h * ri.height * v ) )
+        # (width, height) -> modes, largest sensor area first
+        self._bySize = {}
+        for mode in sorted( self.modes, key = lambda m: -m[5] ):
+            self._bySize.setdefault( mode[:2], [] ).append( mode )
+        # Modes sorted by maximum fps
+        self._byFps = sorted( self.modes, key = lambda m: m[4] )
+        self._maxFps = [ m[4] for m in self._byFps ]
+
+    @classmethod
+    def enumerate( cls ):
+        """
+        Creates the table from EnumerateDUOResolutions (use GetDUOModeTable for the cached one)
+        """
+        size = 256
+        while True:
+            modes = ( DUOResolutionInfo * size )()
+            count = EnumerateDUOResolutions( modes, size, -1, -1, DUO_BIN_ANY, -1.0 )
+            if count < size:
+                return cls( modes[:count] )
+            size *= 2
+
+    def __len__( self ):
+        return len( self.modes )
+
+    def __iter__( self ):
+        for mode in self.modes:
+            yield self.resolution( mode )
+
+    @staticmethod
+    def resolution( mode, fps = None ):
+        """
+        Returns a new DUOResolutionInfo of the mode at fps (maximum by default)
+        """
+        width, height, binning, min_fps, max_fps = mode[:5]
+        return DUOResolutionInfo( width, height, binning, max_fps if fps is None else fps,
+                                  min_fps, max_fps )
+
+    def sizes( self ):
+        """
+        Returns the list of supported (width, height)
+        """
+        return sorted( self._bySize, reverse = True )
+
+    def select( self, width = -1, height = -1, binning = DUO_BIN_ANY, fps = -1.0 ):
+        """
+        Returns the modes matching the filters (-1 or DUO_BIN_ANY for any),
+        same semantics as EnumerateDUOResolutions
+
+        @return: list of DUOResolutionInfo set to fps (maximum fps if any)
+        """
+        if width != -1 and height != -1:
+            modes = self._bySize.get( ( width, height ), [] )
+        else:
+            modes = self.modes
+        return [ self.resolution( m, fps if fps > 0 else None ) for m in modes
+                 if ( width == -1 or m[0] == width ) and ( height == -1 or m[1] == height ) and
+                 ( binning == DUO_BIN_ANY or m[2] == binning ) and
+                 ( fps <= 0 or m[3] <= fps <= m[4] ) ]
+
+    def with_fps( self, fps ):
+        """
+        Returns the modes able to run at fps or faster (binary search)
+
+        @return: list of DUOResolutionInfo set to fps (or the mode's minimum fps if higher)
+        """
+        return [ self.resolution( m, max( fps, m[3] ) ) for m in self._byFps[bisect.bisect_left( self._maxFps, fps ):] ]
+
+    def optimal_binning( self, width, height ):
+        """
+        Returns the binning maximizing the sensor imaging area for the frame size,
+        None if the size is not supported
+        """
+        modes = self._bySize.get( ( width, height ) )
+        return modes[0][2] if modes else None
+
+    def best( self, width, height, fps = None, binning = DUO_BIN_ANY ):
+        """
+        Returns the best mode for the requested frame size and rate:
+        the exact size with the largest sensor area, otherwise the smallest
+        larger frame size (the caller crops or scales).
+
+        @param fps: required frame rate (any by default)
+        @return: DUOResolutionInfo set to fps (maximum fps by default), None if nothing fits
+        """
+        def usable( m ):
+            return ( fps is None or m[3] <= fps <= m[4] ) and \
+                ( binning == DUO_BIN_ANY or m[2] == binning )
+
+        for mode in self._bySize.get( ( width, height ), [] ):
+            if usable( mode ):
+                return self.resolution( mode, fps )
+        larger = [ m for m in self.modes if m[0] >= width and m[1] >= height and usable( m ) ]
+        if not larger:
+            return None
+        mode = min( larger, key = lambda m: ( m[0] * m[1], -m[5] ) )
+        return self.resolution( mode, fps )
+
+def FindDUOOptimalBinning( width, height ):
+    """
+    Finds the binning maximizing the sensor imaging area among the enumerated
+    modes of the current backend (loads DUOLib and enumerates on first use)
+
+    @return: binning for (width, height), FindOptimalBinning if the size is not enumerated
+    """
+    binning = GetDUOModeTable().optimal_binning( width, height )
+    return FindOptimalBinning( width, height ) if binning is None else binning
+
+_tableLock = threading.Lock()
+_tables = {}
+
+def GetDUOModeTable():
+    """
+    Returns the DUOModeTable of the current backend, enumerated on first use
+    """
+    # SetDUOBackend drops the tables (see _backend_changed)
+    key = id( GetDUOBackend() )
+    with _tableLock:
+        table = _tables.get( key )
+        if table is None:
+            table = _tables[key] = DUOModeTable.enumerate()
+    return table
+
+def _backend_changed( duo ):
+    if duo is None:
+        with _tableLock:
+            _tables.clear()
+
+_duo3d._deviceListeners.append( _backend_changed )
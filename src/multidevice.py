@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.multidevice
+
+    @brief: Synchronized capture from several DUO devices
+
+    DUOMultiCapture opens (or takes) N devices, starts the first one as the
+    master and the others as slaves (masterMode = False, frames triggered by
+    the master over the sync cable), and emits DUOFrameSet objects holding
+    one frame per device captured at the same time:
+
+        with DUOMultiCapture( count = 3, resolution = ri ) as rig:
+            for frameSet in rig:
+                left0, right0 = frameSet[0].left, frameSet[0].right
+                ...
+
+    Every device has its own sink (DUONativeCapture when the native helper
+    is available, so the DUO capture threads never wait for the GIL,
+    otherwise DUOFrameRing) and its own consumer thread copying frames into
+    a per-device pool. DUOFrame.timeStamp counts from each device's start,
+    so every device clock is mapped to the host clock with a running minimum
+    of (arrival time - timeStamp). An alignment thread then matches the
+    frames nearest in time, within the tolerance, and counts the frames
+    that have no partner (see statistics()).
+
+    Test without hardware: SetDUOBackend( SyntheticDUOLib( devices = 3 ) )
+"""
+
+import collections
+import ctypes as ct
+import threading
+import time
+
+import numpy as np
+
+from .duo3d import (CloseDUO, GetDUOResolutionInfo, GetDUOSerialNumber, OpenDUO,
+                    SetDUOResolutionInfo, StartDUO, StopDUO, DUOInstance, DUOIMUSample)
+from .capture import DUOFrameRing, DUOFrameSlot, DUO_RING_OVERWRITE_OLDEST
+
+__all__ = [
+    "DUOFrameSet", "DUOMultiCapture",
+    ]
+
+_IMU_SAMPLE_SIZE = ct.sizeof( DUOIMUSample )
+
+class DUOFrameSet( object ):
+    """
+    Frames of all the devices captured at the same time (in device order)
+    """
+    __slots__ = ( "seq", "time", "skew", "frames" )
+
+    def __init__( self, seq, time, skew, frames ):
+        self.seq = seq
+        self.time = time  # Host clock (time.perf_counter) of the capture, mean over the devices
+        self.skew = skew  # Time between the first and the last frame in seconds
+        self.frames = frames  # DUOFrameSlot per device
+
+    def __len__( self ):
+        return len( self.frames )
+
+    def __getitem__( self, i ):
+        return self.frames[i]
+
+    def __iter__( self ):
+        return iter( self.frames )
+
+class _DeviceSink( object ):
+    """
+    Capture sink, frame pool and statistics of one device
+    """
+
+    def __init__( self, index, duo, master, width, height, ringSize, poolSize, native ):
+        self.index = index
+        self.duo = duo
+        self.master = master
+        serial = GetDUOSerialNumber( duo )
+        self.serial = serial.decode( "ascii", "replace" ) if isinstance( serial, bytes ) else serial
+        self.native = False
+        self.sink = None
+        if native is not False:
+            try:
+                from .native import DUONativeCapture
+                self.sink = DUONativeCapture( width, height, ringSize )
+                self.native = True
+            except ( ImportError, OSError ):
+                if native:
+                    raise
+        if self.sink is None:
+            self.sink = DUOFrameRing( width, height, ringSize, DUO_RING_OVERWRITE_OLDEST )
+        self.free = [ DUOFrameSlot( i, width, height ) for i in range( poolSize ) ]
+        self.pending = collections.deque()  # ( device time in seconds, slot )
+        self.offset = None  # Host time - device time
+        self.thread = None
+
+        self.received = 0  # Frames taken from the sink
+        self.poolDropped = 0  # Pending frames discarded because the pool was empty
+        self.unmatched = 0  # Frames without a partner within the tolerance
+        self.matched = 0
+        self.skewSum = 0.0
+        self.skewMax = 0.0
+
+        self._stampHigh = 0
+        self._lastStamp = None
+
+    @property
+    def lost( self ):
+        """
+        Frames lost in the sink before the consumer thread read them
+        """
+        if self.native:
+            return self.sink.lost + self.sink.stats()[2]
+        return self.sink.overwritten + self.sink.dropped
+
+    def start( self ):
+        if self.native:
+            return StartDUO( self.duo, self.sink.callback, self.sink.userData, self.master )
+        return StartDUO( self.duo, self.sink.callback, None, self.master )
+
+    def unwrap( self, stamp ):
+        if self._lastStamp is not None and stamp < self._lastStamp:
+            self._stampHigh += 1 << 32
+        self._lastStamp = stamp
+        return ( self._stampHigh + stamp ) / 10000.0
+
+def _copy_slot( src, dst ):
+    np.copyto( dst.left, src.left )
+    np.copyto( dst.right, src.right )
+    if src.IMUSamples:
+        ct.memmove( dst._imuAddr, src._imuAddr, src.IMUSamples * _IMU_SAMPLE_SIZE )
+    dst.IMUSamples = src.IMUSamples
+    dst.IMUPresent = src.IMUPresent
+    dst.ledSeqTag = src.ledSeqTag
+    dst.timeStamp = src.timeStamp
+    dst.seq = src.seq
+
+class DUOMultiCapture( object ):
+    """
+    Captures from several devices and aligns their frames by time
+    """
+
+    def __init__( self, devices = None, count = None, resolution = None, sync = True,
+                  tolerance = None, native = None, ringSize = 4, poolSize = None,
+                  maxSets = 4, callback = None ):
+        """
+        @param devices: list of opened DUOInstance (opened here if None)
+        @param count: number of devices to open if devices is None (all available by default)
+        @param resolution: DUOResolutionInfo set on every device (current one if None)
+        @param sync: start the first device as master and the others as slaves,
+                     otherwise every device runs free (masterMode = True)
+        @param tolerance: maximum time difference of matched frames in seconds
+                          (half of the frame period by default)
+        @param native: use DUONativeCapture sinks (None: if available)
+        @param ringSize: slots of every device sink
+        @param poolSize: frames per device waiting for alignment or held in sets
+        @param maxSets: aligned sets queued for get(), the oldest is dropped when full
+        @param callback: optional function called with every DUOFrameSet from the
+                         alignment thread (the set is released when it returns)
+        """
+        self._owned = devices is None
+        if devices is None:
+            devices = []
+            while count is None or len( devices ) < count:
+                duo = DUOInstance()
+                if not OpenDUO( duo ):
+                    break
+                devices.append( duo )
+            if not devices or ( count is not None and len( devices ) < count ):
+                for duo in devices:
+                    CloseDUO( duo )
+                raise IOError( "Could not open %s DUO cameras" % ( count or "any" ) )
+        try:
+            if resolution is not None:
+                for duo in devices:
+                    if not SetDUOResolutionInfo( duo, resolution ):
+                        raise IOError( "Could not set DUO resolution %dx%d@%.1f" % (
+                            resolution.width, resolution.height, resolution.fps ) )
+            ri = GetDUOResolutionInfo( devices[0] )
+            self.width, self.height, self.fps = ri.width, ri.height, ri.fps
+            self.tolerance = tolerance if tolerance is not None else 0.5 / self.fps
+            self.callback = callback
+            self.maxSets = maxSets
+            poolSize = poolSize or maxSets + 8
+            self.devices = [ _DeviceSink( i, duo, not sync or i == 0, self.width, self.height,
+                                          ringSize, poolSize, native )
+                             for i, duo in enumerate( devices ) ]
+        except Exception:
+            if self._owned:
+                for duo in devices:
+                    CloseDUO( duo )
+            raise
+
+        self.sets = 0  # Aligned sets emitted
+        self.setsDropped = 0  # Sets discarded because the consumer did not keep up
+        self._cond = threading.Condition( threading.Lock() )
+        self._ready = collections.deque()
+        self._held = None
+        self._running = False
+        self._aligner = None
+
+    def start( self ):
+        """
+        Starts the slaves, then the master (the slaves wait for its trigger)
+
+        @return: True on success
+        """
+        if self._running:
+            return False
+        self._running = True
+        for dev in self.devices:
+            dev.thread = threading.Thread( target = self._consume, args = ( dev, ),
+                                           name = "DUOMultiCapture-%d" % dev.index )
+            dev.thread.daemon = True
+            dev.thread.start()
+        self._aligner = threading.Thread( target = self._align, name = "DUOMultiCapture-align" )
+        self._aligner.daemon = True
+        self._aligner.start()
+        for dev in sorted( self.devices, key = lambda d: d.master ):
+            if not dev.start():
+                self.stop()
+                return False
+        return True
+
+    def _consume( self, dev ):
+        cond = self._cond
+        clock = time.perf_counter
+        while self._running:
+            slot = dev.sink.get( 0.1 )
+            if slot is None:
+                continue
+            now = clock()
+            stamp = dev.unwrap( slot.timeStamp )
+            with cond:
+                estimate = now - stamp
+                if dev.offset is None or estimate < dev.offset:
+                    dev.offset = estimate
+                if dev.free:
+                    target = dev.free.pop()
+                else:
+                    target = dev.pending.popleft()[1]
+                    dev.poolDropped += 1
+            _copy_slot( slot, target )
+            with cond:
+                dev.pending.append( ( stamp, target ) )
+                dev.received += 1
+                cond.notify_all()
+
+    def _release_set( self, frameSet ):
+        # Must be called with the lock held
+        for dev, slot in zip( self.devices, frameSet.frames ):
+            dev.free.append( slot )
+
+    def _drop_head( self, dev ):
+        dev.free.append( dev.pending.popleft()[1] )
+        dev.unmatched += 1
+
+    def _match( self ):
+        """
+        Returns the next DUOFrameSet or None if more frames are needed.
+        Must be called with the lock held.
+        """
+        devices = self.devices
+        tolerance = self.tolerance
+        while all( dev.pending for dev in devices ):
+            times = [ dev.pending[0][0] + dev.offset for dev in devices ]
+            ref = max( times )
+            dropped = False
+            for dev, t in zip( devices, times ):
+                if t < ref - tolerance:
+                    self._drop_head( dev )
+                    dropped = True
+            if dropped:
+                continue
+            # Prefer a later pending frame that is even closer to the reference
+            for dev in devices:
+                while len( dev.pending ) > 1 and dev.pending[1][0] + dev.offset <= ref:
+                    self._drop_head( dev )
+            times = [ dev.pending[0][0] + dev.offset for dev in devices ]
+            mean = sum( times ) / len( times )
+            frames = []
+            for dev, t in zip( devices, times ):
+                frames.append( dev.pending.popleft()[1] )
+                dev.matched += 1
+                skew = abs( t - mean )
+                dev.skewSum += skew
+                dev.skewMax = max( dev.skewMax, skew )
+            frameSet = DUOFrameSet( self.sets, mean, max( times ) - min( times ), frames )
+            self.sets += 1
+            return frameSet
+        return None
+
+    def _align( self ):
+        cond = self._cond
+        with cond:
+            while self._running:
+                frameSet = self._match()
+                if frameSet is None:
+                    cond.wait( 0.1 )
+                    continue
+                if self.callback is not None:
+                    cond.release()
+                    try:
+                        self.callback( frameSet )
+                    finally:
+                        cond.acquire()
+                    self._release_set( frameSet )
+                    continue
+                self._ready.append( frameSet )
+                if len( self._ready ) > self.maxSets:
+                    self._release_set( self._ready.popleft() )
+                    self.setsDropped += 1
+                cond.notify_all()
+
+    def get( self, timeout = None ):
+        """
+        Returns the oldest aligned DUOFrameSet, waiting for it if necessary.
+        The set belongs to the caller until the next get() / release() call.
+
+        @return: DUOFrameSet, or None on timeout / when stopped
+        """
+        cond = self._cond
+        with cond:
+            self._release()
+            if not self._ready and self._running:
+                cond.wait_for( lambda: self._ready or not self._running, timeout )
+            if not self._ready:
+                return None
+            self._held = frameSet = self._ready.popleft()
+            return frameSet
+
+    def _release( self ):
+        if self._held is not None:
+            self._release_set( self._held )
+            self._held = None
+
+    def release( self ):
+        """
+        Returns the frames of the set held by the caller to the pools
+        """
+        with self._cond:
+            self._release()
+
+    def statistics( self ):
+        """
+        @return: list of dicts with the per-device counters, skew in seconds
+        """
+        with self._cond:
+            return [ {
+                "serial": dev.serial,
+                "master": dev.master,
+                "native": dev.native,
+                "received": dev.received,
+                "lost": dev.lost,
+                "poolDropped": dev.poolDropped,
+                "unmatched": dev.unmatched,
+                "matched": dev.matched,
+                "skewMean": dev.skewSum / dev.matched if dev.matched else 0.0,
+                "skewMax": dev.skewMax,
+                "offset": dev.offset,
+                } for dev in self.devices ]
+
+    def stop( self ):
+        """
+        Stops the master first, then the slaves, and the capture threads
+        """
+        for dev in sorted( self.devices, key = lambda d: not d.master ):
+            StopDUO( dev.duo )
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for dev in self.devices:
+            dev.sink.close()
+            if dev.thread is not None:
+                dev.thread.join()
+                dev.thread = None
+        if self._aligner is not None:
+            self._aligner.join()
+            self._aligner = None
+
+    def close( self ):
+        """
+        Stops the capture and closes the devices opened here
+        """
+        if self._running:
+            self.stop()
+        if self._owned:
+            for dev in self.devices:
+                CloseDUO( dev.duo )
+                dev.duo.value = None
+            self._owned = False
+
+    def __iter__( self ):
+        """
+        Yields aligned sets until stopped
+        """
+        while True:
+            frameSet = self.get()
+            if frameSet is None:
+                return
+            yield frameSet
+
+    def __enter__( self ):
+        self.start()
+        return self
+
+    def __exit__( self, exc_type, exc, tb ):
+        self.close()
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.native
+
+    @brief: GIL-free capture path
+
+    DUONativeCapture passes the DUOCaptureCallback function of the native
+    duocapture library (built by setup.py) to StartDUO, so the DUO capture
+    thread copies frames and bumps the sequence counter without acquiring
+    the GIL. Python consumers wait for frames on their own threads.
+
+    Usage:
+        cap = DUONativeCapture( width, height, 4 )
+        StartDUO( duo, cap.callback, cap.userData )
+        for slot in cap:
+            process( slot.left, slot.right )
+        StopDUO( duo )
+        cap.close()
+
+    The DUONativeCapture object must stay alive until StopDUO returns.
+"""
+
+import ctypes as ct
+import os
+
+from .duo3d import DUOFrameCallback
+from .capture import DUOFrameSlot
+
+__all__ = [
+    "DUONativeCapture", "DUOCaptureInfo",
+    ]
+
+class DUOCaptureInfo( ct.Structure ):
+    """
+    Frame metadata filled by DUOCaptureRead
+    """
+    _fields_ = [
+        ( "seq", ct.c_uint64 ),
+        ( "width", ct.c_uint32 ),
+        ( "height", ct.c_uint32 ),
+        ( "timeStamp", ct.c_uint32 ),
+        ( "IMUSamples", ct.c_uint32 ),
+        ( "ledSeqTag", ct.c_uint8 ),
+        ( "IMUPresent", ct.c_uint8 ),
+        ]
+
+_caplib = None
+
+# Shared library names of the native capture helper built by setup.py
+_CAPLIB_FILENAMES = ( "libduocapture.so", "libduocapture.dylib", "duocapture.dll" )
+
+def _find_caplib():
+    package_dir = os.path.dirname( os.path.abspath( __file__ ) )
+    for filename in _CAPLIB_FILENAMES:
+        filepath = os.path.join( package_dir, filename )
+        if os.path.isfile( filepath ):
+            return filepath
+    raise ImportError( "duo3d native capture helper (duocapture) is not built, "
+                       "reinstall the package with a C compiler available" )
+
+def _load_caplib():
+    global _caplib
+    if _caplib is not None:
+        return _caplib
+
+    lib = ct.cdll.LoadLibrary( _find_caplib() )
+    lib.DUOCaptureCreate.argtypes = [ ct.c_uint32, ct.c_uint32, ct.c_uint32 ]
+    lib.DUOCaptureCreate.restype = ct.c_void_p
+    lib.DUOCaptureDestroy.argtypes = [ ct.c_void_p ]
+    lib.DUOCaptureDestroy.restype = None
+    lib.DUOCaptureWait.argtypes = [ ct.c_void_p, ct.c_uint64, ct.c_int32 ]
+    lib.DUOCaptureWait.restype = ct.c_uint64
+    lib.DUOCaptureRead.argtypes = [ ct.c_void_p, ct.c_uint64,
+                                    ct.c_void_p, ct.c_void_p, ct.c_void_p,
+                                    ct.POINTER( DUOCaptureInfo ) ]
+    lib.DUOCaptureRead.restype = ct.c_int
+    lib.DUOCaptureClose.argtypes = [ ct.c_void_p ]
+    lib.DUOCaptureClose.restype = None
+    lib.DUOCaptureStats.argtypes = [ ct.c_void_p,
+                                     ct.POINTER( ct.c_uint64 ),
+                                     ct.POINTER( ct.c_uint64 ),
+                                     ct.POINTER( ct.c_uint64 ) ]
+    lib.DUOCaptureStats.restype = None
+    _caplib = lib
+    return lib
+
+class DUONativeCapture( object ):
+    """
+    Native frame ring filled on the DUO capture thread without the GIL.
+
+    The ring always overwrites the oldest frame; consumers that fall behind
+    skip to the oldest frame still available (see lost).
+    Slots returned by get() / latest() are reused by the next call.
+    """
+
+    def __init__( self, width, height, size = 4 ):
+        """
+        @param width: frame width (as set with SetDUOResolutionInfo)
+        @param height: frame height
+        @param size: number of native ring slots, at least 2
+        """
+        if size < 2:
+            raise ValueError( "DUONativeCapture needs at least 2 slots" )
+        self._lib = lib = _load_caplib()
+        self._handle = lib.DUOCaptureCreate( width, height, size )
+        if not self._handle:
+            raise MemoryError( "could not allocate DUONativeCapture ring" )
+
+        self.width = width
+        self.height = height
+        self.size = size
+        self.lost = 0  # Frames overwritten before this consumer read them
+        self.skipped = 0  # Unread frames passed over by latest()
+
+        # Pass both to StartDUO
+        self.callback = ct.cast( lib.DUOCaptureCallback, DUOFrameCallback )
+        self.userData = self._handle
+
+        self._slot = DUOFrameSlot( 0, width, height )
+        self._info = DUOCaptureInfo()
+        self._last = 0
+
+    def __del__( self ):
+        handle, self._handle = getattr( self, "_handle", None ), None
+        if handle:
+            self._lib.DUOCaptureDestroy( handle )
+
+    def wait( self, after, timeout = None ):
+        """
+        Waits (without holding the GIL) for a frame newer than 'after'.
+
+        @param after: sequence number of the last frame seen, 0 for none
+        @param timeout: seconds to wait, None waits forever
+        @return: sequence number of the latest frame, 'after' on timeout or close
+        """
+        timeout_ms = -1 if timeout is None else max( 0, int( timeout * 1000 ) )
+        return self._lib.DUOCaptureWait( self._handle, after, timeout_ms )
+
+    def read( self, seq, slot ):
+        """
+        Copies frame 'seq' into the given DUOFrameSlot (without holding the GIL).
+
+        @return: True on success, False if the frame is no longer in the ring
+        """
+        info = self._info
+        if not self._lib.DUOCaptureRead( self._handle, seq, slot._leftAddr, slot._rightAddr,
+                                         slot._imuAddr, ct.byref( info ) ):
+            return False
+        slot.seq = info.seq
+        slot.width = info.width
+        slot.height = info.height
+        slot.timeStamp = info.timeStamp
+        slot.ledSeqTag = info.ledSeqTag
+        slot.IMUPresent = bool( info.IMUPresent )
+        slot.IMUSamples = info.IMUSamples
+        return True
+
+    def _read_next( self, want ):
+        # Reads frame 'want' or, if it was overwritten, the oldest one still in the ring
+        first = want
+        while not self.read( want, self._slot ):
+            latest = self.wait( want - 1, 0 )
+            want = max( want + 1, latest - self.size + 2 )
+        self.lost += want - first
+        self._last = want
+        return self._slot
+
+    def get( self, timeout = None ):
+        """
+        Returns the next frame in capture order, waiting for it if necessary.
+
+        @param timeout: seconds to wait, None waits forever
+        @return: DUOFrameSlot, or None on timeout / when the capture is closed
+        """
+        latest = self.wait( self._last, timeout )
+        if latest <= self._last:
+            return None
+        want = max( self._last + 1, latest - self.size + 1 )
+        self.lost += want - self._last - 1
+        return self._read_next( want )
+
+    def latest( self, timeout = 0 ):
+        """
+        Returns the most recent frame, skipping the older unread ones (see skipped).
+
+        @param timeout: seconds to wait for a new frame, None waits forever
+        @return: DUOFrameSlot, or None if there is no new frame
+        """
+        latest = self.wait( self._last, timeout )
+        if latest <= self._last:
+            return None
+        self.skipped += latest - self._last - 1
+        return self._read_next( latest )
+
+    def stats( self ):
+        """
+        @return: tuple(last sequence number, frames received, frames dropped by the callback)
+        """
+        seq, received, dropped = ct.c_uint64(), ct.c_uint64(), ct.c_uint64()
+        self._lib.DUOCaptureStats( self._handle, ct.byref( seq ), ct.byref( received ),
+                                   ct.byref( dropped ) )
+        return ( seq.value, received.value, dropped.value )
+
+    def close( self ):
+        """
+        Wakes up all the waiting consumers; call after StopDUO
+        """
+        if self._handle:
+            self._lib.DUOCaptureClose( self._handle )
+
+    def __iter__( self ):
+        """
+        Yields frames in capture order until closed
+        """
+        while True:
+            slot = self.get()
+            if slot is None:
+                return
+            yield slot
@@ -0,0 +1,636 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.network
+
+    @brief: Frame streaming over Unix-domain or TCP sockets
+
+    DUOFrameServer sends the captured frames to any number of clients in
+    other processes or containers on the same host:
+
+        server = DUOFrameServer( "/run/duo/left.sock", ri.width, ri.height )
+        server.start()
+        StartDUO( duo, server.callback, None )
+
+        client = DUOFrameClient( "/run/duo/left.sock", region = ( 0, 0, 320, 240 ),
+                                 scale = 2, encoding = "delta" )
+        for frame in client:  # DUOFrameSlot like frames
+            process( frame.left, frame.right, frame.imu )
+
+    Every client negotiates a region of interest, an integer downscale factor
+    and an encoding when it connects:
+        "raw"    uncompressed images
+        "zlib"   zlib compressed images
+        "delta"  XOR with the previous frame + zlib, a keyframe every
+                 keyInterval frames (small for near-static scenes)
+    Clients asking for the same region, scale and encoding share the encoded
+    frames, so a frame is encoded once per configuration (configurations are
+    encoded in parallel, zlib and NumPy release the GIL). Every client has a
+    bounded send queue and its own sender thread: a client that does not
+    keep up has its queue dropped and continues with the latest frame
+    (a keyframe for "delta"), without slowing down the others.
+"""
+
+import collections
+import concurrent.futures
+import ctypes as ct
+import json
+import os
+import socket
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from .capture import DUOFrameRing, DUOFrameSlot, DUO_RING_OVERWRITE_OLDEST
+from .duo3d import DUOFrameCallback
+from .frame import DUO_IMU_DTYPE
+
+__all__ = [
+    "DUOFrameClient", "DUOFrameServer",
+
+    "DUO_NET_DELTA", "DUO_NET_RAW", "DUO_NET_ZLIB",
+    ]
+
+DUO_NET_RAW = "raw"
+DUO_NET_ZLIB = "zlib"
+DUO_NET_DELTA = "delta"
+
+_ENCODINGS = ( DUO_NET_RAW, DUO_NET_ZLIB, DUO_NET_DELTA )
+
+_MAGIC = b"DUOF"
+_LENGTH = struct.Struct( "<I" )
+# magic, kind, compressed, width, height, seq, timeStamp, ledSeqTag, IMUPresent,
+# IMUSamples, left size, right size
+_FRAME = struct.Struct( "<4sBBHHIIBBHII" )
+
+_KEY = 0
+_DELTA = 1
+
+def _is_unix( address ):
+    return isinstance( address, str )
+
+def _recv_exact( sock, size ):
+    buf = bytearray( size )
+    view = memoryview( buf )
+    pos = 0
+    while pos < size:
+        n = sock.recv_into( view[pos:] )
+        if not n:
+            raise EOFError( "DUO frame server closed the connection" )
+        pos += n
+    return buf
+
+def _send_message( sock, obj ):
+    data = json.dumps( obj ).encode( "utf-8" )
+    sock.sendall( _LENGTH.pack( len( data ) ) + data )
+
+def _recv_message( sock ):
+    size, = _LENGTH.unpack( _recv_exact( sock, _LENGTH.size ) )
+    return json.loads( _recv_exact( sock, size ).decode( "utf-8" ) )
+
+class _Profile( object ):
+    """
+    Encoder shared by the clients with the same region, scale and encoding
+    """
+
+    def __init__( self, region, scale, encoding, level, keyInterval ):
+        x, y, w, h = region
+        self.key = ( region, scale, encoding )
+        self.rows = slice( y, y + h, scale )
+        self.cols = slice( x, x + w, scale )
+        self.width = ( w + scale - 1 ) // scale
+        self.height = ( h + scale - 1 ) // scale
+        self.encoding = encoding
+        self.level = level
+        self.keyInterval = keyInterval
+        self.clients = []
+        shape = ( self.height, self.width )
+        self._current = [ np.empty( shape, np.uint8 ), np.empty( shape, np.uint8 ) ]
+        self._previous = [ np.empty( shape, np.uint8 ), np.empty( shape, np.uint8 ) ]
+        self._xor = np.empty( shape, np.uint8 )
+        self._sinceKey = None  # Frames since the last keyframe, None before the first one
+
+    def _pack( self, kind, images, slot, imu ):
+        compressed = self.encoding != DUO_NET_RAW
+        header = _FRAME.pack( _MAGIC, kind, compressed, self.width, self.height,
+                              slot.seq & 0xFFFFFFFF, slot.timeStamp, slot.ledSeqTag,
+                              slot.IMUPresent, slot.IMUSamples, len( images[0] ), len( images[1] ) )
+        return ( kind, ( header, images[0], images[1], imu ) )
+
+    def _compress( self, image ):
+        if self.encoding == DUO_NET_RAW:
+            return image.tobytes()
+        return zlib.compress( image, self.level )
+
+    def encode( self, slot, imu, keyRequired ):
+        """
+        Encodes a frame
+
+        @param keyRequired: some client needs a keyframe
+        @return: tuple(message, keyframe message or None), messages being
+                 tuple(kind, parts); the message is a keyframe itself when a delta
+                 can not be used
+        """
+        current, previous = self._current, self._previous
+        np.copyto( current[0], slot.left[self.rows, self.cols] )
+        np.copyto( current[1], slot.right[self.rows, self.cols] )
+        key = None
+        if self.encoding != DUO_NET_DELTA:
+            message = self._pack( _KEY, [ self._compress( image ) for image in current ], slot, imu )
+        elif self._sinceKey is None or self._sinceKey + 1 >= self.keyInterval:
+            message = self._pack( _KEY, [ self._compress( image ) for image in current ], slot, imu )
+            self._sinceKey = 0
+        else:
+            deltas = []
+            for image, reference in zip( current, previous ):
+                np.bitwise_xor( image, reference, out = self._xor )
+                deltas.append( self._compress( self._xor ) )
+            message = self._pack( _DELTA, deltas, slot, imu )
+            self._sinceKey += 1
+            if keyRequired:
+                key = self._pack( _KEY, [ self._compress( image ) for image in current ], slot, imu )
+        self._current, self._previous = previous, current
+        return message, key
+
+class _Client( object ):
+    """
+    Connected client: bounded queue and sender thread
+    """
+
+    def __init__( self, server, sock, peer, profile, maxQueue ):
+        self.server = server
+        self.sock = sock
+        self.peer = peer
+        self.profile = profile
+        self.maxQueue = maxQueue
+        self.queue = collections.deque()
+        self.cond = threading.Condition( threading.Lock() )
+        self.needKey = True
+        self.closed = False
+
+        self.sent = 0
+        self.dropped = 0  # Frames dropped because the client did not keep up
+        self.keyframes = 0
+        self.bytes = 0
+        self.latencySum = 0.0
+        self.latencyMax = 0.0
+
+        self.thread = threading.Thread( target = self._send, name = "DUOFrameServer-%s" % ( peer, ) )
+        self.thread.daemon = True
+
+    def overflowing( self ):
+        return len( self.queue ) >= self.maxQueue
+
+    def enqueue( self, message, key, arrival ):
+        with self.cond:
+            if self.closed:
+                return
+            if len( self.queue ) >= self.maxQueue:
+                # Drop to the latest frame
+                self.dropped += len( self.queue )
+                self.queue.clear()
+                self.needKey = True
+            if message[0] == _DELTA and self.needKey:
+                if key is None:
+                    self.dropped += 1
+                    return
+                message = key
+            if message[0] == _KEY:
+                self.needKey = False
+            self.queue.append( ( message, arrival ) )
+            self.cond.notify()
+
+    def _send( self ):
+        sock = self.sock
+        while True:
+            with self.cond:
+                while not self.queue and not self.closed:
+                    self.cond.wait()
+                if self.closed:
+                    break
+                ( kind, parts ), arrival = self.queue.popleft()
+            try:
+                for part in parts:
+                    sock.sendall( part )
+            except OSError:
+                break
+            latency = time.perf_counter() - arrival
+            with self.cond:
+                self.sent += 1
+                if kind == _KEY:
+                    self.keyframes += 1
+                self.bytes += sum( len( part ) for part in parts )
+                self.latencySum += latency
+                self.latencyMax = max( self.latencyMax, latency )
+        self.server._remove( self )
+
+    def close( self ):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        try:
+            self.sock.shutdown( socket.SHUT_RDWR )
+        except OSError:
+            pass
+        self.sock.close()
+
+class DUOFrameServer( object ):
+    """
+    Streams frames to DUOFrameClient connections
+    """
+
+    def __init__( self, address, width, height, maxQueue = 2, keyInterval = 30, level = 1,
+                  ringSize = 3, workers = None ):
+        """
+        @param address: Unix-domain socket path, or tuple(host, port) for TCP
+                        (port 0 picks a free one, see address)
+        @param width: frame width (as set with SetDUOResolutionInfo)
+        @param height: frame height
+        @param maxQueue: frames queued per client before it is dropped to the latest one
+        @param keyInterval: frames between "delta" keyframes
+        @param level: zlib compression level
+        @param ringSize: frames buffered between the capture callback and the encoder
+        @param workers: encoder threads (os.cpu_count() by default)
+        """
+        self.address = address
+        self.width = width
+        self.height = height
+        self.maxQueue = maxQueue
+        self.keyInterval = keyInterval
+        self.level = level
+        self.workers = workers or os.cpu_count() or 1
+        self.ringSize = ringSize
+        self.ring = DUOFrameRing( width, height, ringSize, DUO_RING_OVERWRITE_OLDEST )
+        self.frames = 0  # Frames encoded
+
+        self._lock = threading.Lock()
+        self._clients = []
+        self._profiles = {}
+        self._listener = None
+        self._handshakes = set()  # Sockets of the clients still negotiating
+        self._threads = []
+        self._running = False
+        self._pool = None
+
+        # Keep the reference, ctypes callbacks must outlive the capture
+        self.callback = DUOFrameCallback( self._callback )
+
+    def _callback( self, pFrameData, pUserData ):
+        # DUO capture thread
+        self.ring.push( pFrameData.contents )
+
+    def publish( self, frame ):
+        """
+        Queues a frame for the clients (instead of passing callback to StartDUO)
+
+        @param frame: DUOFrame or PDUOFrame
+        @return: True if the frame was stored
+        """
+        if isinstance( frame, ct._Pointer ):
+            frame = frame.contents
+        return self.ring.push( frame )
+
+    def start( self ):
+        """
+        Binds the socket and starts the accept and encoder threads
+        """
+        if self._running:
+            return
+        if self.ring.closed:  # Stopped before
+            self.ring = DUOFrameRing( self.width, self.height, self.ringSize, DUO_RING_OVERWRITE_OLDEST )
+        if _is_unix( self.address ):
+            if os.path.exists( self.address ):
+                os.unlink( self.address )
+            listener = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+            listener.bind( self.address )
+        else:
+            listener = socket.socket( socket.AF_INET, socket.SOCK_STREAM )
+            listener.setsockopt( socket.SOL_SOCKET, socket.SO_REUSEADDR, 1 )
+            listener.bind( self.address )
+            self.address = listener.getsockname()
+        listener.listen( 16 )
+        self._listener = listener
+        if self.workers > 1:
+            self._pool = concurrent.futures.ThreadPoolExecutor( self.workers )
+        self._running = True
+        self._threads = [ threading.Thread( target = self._accept, name = "DUOFrameServer-accept" ),
+                          threading.Thread( target = self._encode, name = "DUOFrameServer-encode" ) ]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def _negotiate( self, request ):
+        region = request.get( "region" ) or ( 0, 0, self.width, self.height )
+        x, y, w, h = [ int( v ) for v in region ]
+        x, y = max( 0, x ), max( 0, y )
+        w, h = min( w, self.width - x ), min( h, self.height - y )
+        scale = int( request.get( "scale", 1 ) )
+        encoding = request.get( "encoding", DUO_NET_DELTA )
+        if w <= 0 or h <= 0:
+            raise ValueError( "empty region %r" % ( region, ) )
+        if scale < 1:
+            raise ValueError( "invalid scale %r" % ( scale, ) )
+        if encoding not in _ENCODINGS:
+            raise ValueError( "unknown encoding %r" % ( encoding, ) )
+        return ( x, y, w, h ), scale, encoding
+
+    def _accept( self ):
+        while self._running:
+            try:
+                sock, peer = self._listener.accept()
+            except OSError:  # Closed
+                return
+            with self._lock:
+                if not self._running:
+                    sock.close()
+                    return
+                self._handshakes.add( sock )
+            # A client that does not send its request must not block the others
+            thread = threading.Thread( target = self._handshake, args = ( sock, peer or "unix" ),
+                                       name = "DUOFrameServer-handshake" )
+            thread.daemon = True
+            thread.start()
+
+    def _handshake( self, sock, peer ):
+        client = None
+        try:
+            sock.settimeout( 5.0 )
+            request = _recv_message( sock )
+            try:
+                region, scale, encoding = self._negotiate( request )
+            except ( ValueError, TypeError ) as e:
+                _send_message( sock, { "error": str( e ) } )
+                return
+            sock.settimeout( None )
+            if not _is_unix( self.address ):
+                sock.setsockopt( socket.IPPROTO_TCP, socket.TCP_NODELAY, 1 )
+            with self._lock:
+                if not self._running:
+                    return
+                key = ( region, scale, encoding )
+                profile = self._profiles.get( key )
+                if profile is None:
+                    profile = self._profiles[key] = _Profile( region, scale, encoding,
+                                                              self.level, self.keyInterval )
+                client = _Client( self, sock, peer, profile, self.maxQueue )
+                _send_message( sock, { "width": profile.width, "height": profile.height,
+                                       "region": region, "scale": scale, "encoding": encoding,
+                                       "source": ( self.width, self.height ) } )
+                profile.clients.append( client )
+                self._clients.append( client )
+            client.thread.start()
+        except ( OSError, EOFError, ValueError ):
+            if client is not None:
+                self._remove( client )
+                client = None
+        finally:
+            with self._lock:
+                self._handshakes.discard( sock )
+            if client is None:
+                sock.close()
+
+    def _remove( self, client ):
+        client.close()
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove( client )
+                profile = client.profile
+                profile.clients.remove( client )
+                if not profile.clients:
+                    self._profiles.pop( profile.key, None )
+
+    def _encode( self ):
+        ring = self.ring
+        while self._running:
+            slot = ring.get( 0.1 )
+            if slot is None:
+                continue
+            arrival = time.perf_counter()
+            imu = slot.imu.tobytes()
+            with self._lock:
+                profiles = [ ( profile, list( profile.clients ) ) for profile in self._profiles.values() ]
+            profiles = [ ( profile, clients ) for profile, clients in profiles if clients ]
+            jobs = [ ( profile, any( client.needKey or client.overflowing() for client in clients ) )
+                     for profile, clients in profiles ]
+            if self._pool is not None and len( jobs ) > 1:
+                messages = self._pool.map( lambda job: job[0].encode( slot, imu, job[1] ), jobs )
+            else:
+                messages = [ profile.encode( slot, imu, keyRequired ) for profile, keyRequired in jobs ]
+            for ( profile, clients ), ( message, key ) in zip( profiles, messages ):
+                for client in clients:
+                    client.enqueue( message, key, arrival )
+            self.frames += 1
+
+    @property
+    def clients( self ):
+        """
+        Number of connected clients
+        """
+        return len( self._clients )
+
+    def statistics( self ):
+        """
+        @return: list of dicts with the per-client counters, latency in seconds
+                 (from the encoder getting the frame to the end of the send)
+        """
+        with self._lock:
+            clients = list( self._clients )
+        stats = []
+        for client in clients:
+            with client.cond:
+                region, scale, encoding = client.profile.key
+                stats.append( {
+                    "peer": client.peer,
+                    "region": region,
+                    "scale": scale,
+                    "encoding": encoding,
+                    "sent": client.sent,
+                    "dropped": client.dropped,
+                    "keyframes": client.keyframes,
+                    "bytes": client.bytes,
+                    "queue": len( client.queue ),
+                    "latencyMean": client.latencySum / client.sent if client.sent else 0.0,
+                    "latencyMax": client.latencyMax,
+                    } )
+        return stats
+
+    def close( self ):
+        """
+        Disconnects the clients and stops the server (call after StopDUO),
+        start() binds it again
+        """
+        if not self._running:
+            return
+        self._running = False
+        self.ring.close()
+        try:
+            self._listener.shutdown( socket.SHUT_RDWR )  # Wakes up accept()
+        except OSError:
+            pass
+        self._listener.close()
+        with self._lock:
+            handshakes = list( self._handshakes )
+        for sock in handshakes:
+            try:
+                sock.shutdown( socket.SHUT_RDWR )  # Wakes up the handshake
+            except OSError:
+                pass
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        with self._lock:
+            clients = list( self._clients )
+        for client in clients:
+            client.close()
+            client.thread.join()
+        if _is_unix( self.address ) and os.path.exists( self.address ):
+            os.unlink( self.address )
+
+    def __enter__( self ):
+        self.start()
+        return self
+
+    def __exit__( self, exc_type, exc, tb ):
+        self.close()
+
+class DUOFrameClient( object ):
+    """
+    Receives frames from a DUOFrameServer as DUOFrameSlot objects
+    """
+
+    def __init__( self, address, region = None, scale = 1, encoding = DUO_NET_DELTA, timeout = 5.0 ):
+        """
+        @param address: server Unix-domain socket path or tuple(host, port)
+        @param region: tuple(x, y, width, height) of the source frame (whole frame by default)
+        @param scale: integer downscale factor (every scale-th pixel)
+        @param encoding: DUO_NET_RAW, DUO_NET_ZLIB or DUO_NET_DELTA
+        @param timeout: connection timeout in seconds
+        """
+        if _is_unix( address ):
+            sock = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+            sock.settimeout( timeout )
+            sock.connect( address )
+        else:
+            sock = socket.create_connection( address, timeout )
+            sock.setsockopt( socket.IPPROTO_TCP, socket.TCP_NODELAY, 1 )
+        try:
+            _send_message( sock, { "region": region, "scale": scale, "encoding": encoding } )
+            reply = _recv_message( sock )
+        except Exception:
+            sock.close()
+            raise
+        if "error" in reply:
+            sock.close()
+            raise ValueError( "DUO frame server refused the connection: %s" % reply["error"] )
+        sock.settimeout( None )
+        self.sock = sock
+        self.width = reply["width"]
+        self.height = reply["height"]
+        self.region = tuple( reply["region"] )
+        self.scale = reply["scale"]
+        self.encoding = reply["encoding"]
+        self.sourceWidth, self.sourceHeight = reply["source"]
+
+        # Frames are decoded alternately into two slots, the previous one is the delta reference
+        self._slots = [ DUOFrameSlot( 0, self.width, self.height ),
+                        DUOFrameSlot( 1, self.width, self.height ) ]
+        self._current = None
+        self._imageSize = self.width * self.height
+        self.received = 0
+        self.bytes = 0
+
+    def _decode( self, payload, compressed ):
+        data = zlib.decompress( payload ) if compressed else payload
+        if len( data ) != self._imageSize:
+            raise ValueError( "DUO frame payload has %d bytes, expected %d" % ( len( data ), self._imageSize ) )
+        return np.frombuffer( data, np.uint8 ).reshape( self.height, self.width )
+
+    def get( self, timeout = None ):
+        """
+        Receives the next frame. The returned slot is valid until the next call.
+
+        @param timeout: seconds to wait, None waits forever
+        @return: DUOFrameSlot, or None on timeout / when the server closed the connection
+        """
+        sock = self.sock
+        if sock is None:
+            return None
+        # The timeout only applies until the first bytes of a frame arrive,
+        # a frame is never abandoned halfway (the stream would be out of sync)
+        header = bytearray( _FRAME.size )
+        sock.settimeout( timeout )
+        try:
+            received = sock.recv_into( header )
+        except OSError:  # Timeout, or connection closed
+            return None
+        finally:
+            if self.sock is not None:
+                sock.settimeout( None )
+        if not received:
+            return None
+        try:
+            if received < _FRAME.size:
+                header[received:] = _recv_exact( sock, _FRAME.size - received )
+        except ( EOFError, OSError ):
+            return None
+        ( magic, kind, compressed, width, height, seq, timeStamp, ledSeqTag, IMUPresent,
+          IMUSamples, leftSize, rightSize ) = _FRAME.unpack( header )
+        if magic != _MAGIC or ( width, height ) != ( self.width, self.height ):
+            raise ValueError( "invalid DUO frame stream" )
+        try:
+            left = _recv_exact( sock, leftSize )
+            right = _recv_exact( sock, rightSize )
+            imu = _recv_exact( sock, IMUSamples * DUO_IMU_DTYPE.itemsize )
+        except ( EOFError, OSError ):
+            return None
+
+        previous = self._current
+        slot = self._slots[0] if previous is not self._slots[0] else self._slots[1]
+        if kind == _DELTA:
+            if previous is None:
+                raise ValueError( "DUO frame stream starts with a delta frame" )
+            np.bitwise_xor( previous.left, self._decode( left, compressed ), out = slot.left )
+            np.bitwise_xor( previous.right, self._decode( right, compressed ), out = slot.right )
+        else:
+            np.copyto( slot.left, self._decode( left, compressed ) )
+            np.copyto( slot.right, self._decode( right, compressed ) )
+        if IMUSamples:
+            slot._imu[:IMUSamples] = np.frombuffer( imu, DUO_IMU_DTYPE )
+        slot.IMUSamples = IMUSamples
+        slot.IMUPresent = bool( IMUPresent )
+        slot.ledSeqTag = ledSeqTag
+        slot.timeStamp = timeStamp
+        slot.seq = seq
+        self._current = slot
+        self.received += 1
+        self.bytes += _FRAME.size + leftSize + rightSize + len( imu )
+        return slot
+
+    def close( self ):
+        """
+        Closes the connection
+        """
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def __iter__( self ):
+        """
+        Yields frames until the server closes the connection
+        """
+        while True:
+            frame = self.get()
+            if frame is None:
+                return
+            yield frame
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, exc_type, exc, tb ):
+        self.close()
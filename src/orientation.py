@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.orientation
+
+    @brief: Batched orientation filter for the DUO MLX IMU
+
+    DUOOrientationFilter consumes the IMU samples of a whole frame per call
+    and returns one unit quaternion (w, x, y, z) per sample, rotating sensor
+    coordinates to the world frame (z up):
+
+        imu = CreateDUOOrientationFilter( duo )  # reads GetDUOIMURange
+        def onFrame( pFrame, pUserData ):
+            stamps, quaternions = imu.update( pFrame )
+
+    DUOIMUSample holds accelerometer data in g and gyroscope data in deg/s.
+    The conversions, the time steps (100us stamps) and the rejection of the
+    accelerometer samples saturated at the configured SetDUOIMURange are
+    computed for the whole batch with NumPy; only the filter recurrence runs
+    as a tight loop over plain floats.
+
+    Methods:
+        DUO_ORIENTATION_MADGWICK       gradient descent, gain = beta
+        DUO_ORIENTATION_COMPLEMENTARY  gravity error fed back to the gyroscope, gain = kp
+"""
+
+import math
+
+import numpy as np
+
+from .duo3d import (GetDUOIMURange, DUO_ACCEL_2G, DUO_ACCEL_4G, DUO_ACCEL_8G, DUO_ACCEL_16G,
+                    DUO_GYRO_250, DUO_GYRO_500, DUO_GYRO_1000, DUO_GYRO_2000, DUO_MAX_IMU_SAMPLES)
+from .frame import GetDUOFrameIMU, DUO_IMU_DTYPE
+
+__all__ = [
+    "CreateDUOOrientationFilter", "DUOOrientationFilter",
+
+    "DUO_ORIENTATION_COMPLEMENTARY", "DUO_ORIENTATION_MADGWICK",
+    ]
+
+DUO_ORIENTATION_MADGWICK = 0
+DUO_ORIENTATION_COMPLEMENTARY = 1
+
+# Full scale of the SetDUOIMURange settings, in g and deg/s
+_ACCEL_SCALE = { DUO_ACCEL_2G: 2.0, DUO_ACCEL_4G: 4.0, DUO_ACCEL_8G: 8.0, DUO_ACCEL_16G: 16.0 }
+_GYRO_SCALE = { DUO_GYRO_250: 250.0, DUO_GYRO_500: 500.0, DUO_GYRO_1000: 1000.0, DUO_GYRO_2000: 2000.0 }
+
+_DEFAULT_GAIN = { DUO_ORIENTATION_MADGWICK: 0.1, DUO_ORIENTATION_COMPLEMENTARY: 1.0 }
+
+_WRAP_MASK = ( 1 << 32 ) - 1
+_SATURATION = 0.99  # Fraction of the full scale considered saturated
+
+class DUOOrientationFilter( object ):
+    """
+    Orientation estimator updated with batches of DUOIMUSample
+    """
+
+    def __init__( self, method = DUO_ORIENTATION_MADGWICK, gain = None,
+                  accelRange = DUO_ACCEL_2G, gyroRange = DUO_GYRO_250,
+                  gyroBias = None, accelTolerance = 0.2, maxStep = 0.1 ):
+        """
+        @param method: DUO_ORIENTATION_MADGWICK or DUO_ORIENTATION_COMPLEMENTARY
+        @param gain: filter gain (0.1 for Madgwick, 1.0 for the complementary filter by default)
+        @param accelRange: DUO_ACCEL_* range set with SetDUOIMURange
+        @param gyroRange: DUO_GYRO_* range set with SetDUOIMURange
+        @param gyroBias: (x, y, z) gyroscope offset in deg/s subtracted from every sample
+        @param accelTolerance: accelerometer samples whose norm differs from 1g by more
+                               are not used for the correction (None to use all)
+        @param maxStep: longest time step in seconds, larger gaps are clamped
+        """
+        if method not in _DEFAULT_GAIN:
+            raise ValueError( "unknown orientation filter method %r" % ( method, ) )
+        self.method = method
+        self.gain = _DEFAULT_GAIN[method] if gain is None else gain
+        self.gyroBias = np.zeros( 3 ) if gyroBias is None else np.asarray( gyroBias, np.float64 )
+        self.accelTolerance = accelTolerance
+        self.maxStep = maxStep
+        self.set_range( accelRange, gyroRange )
+
+        self.q = np.array( [ 1.0, 0.0, 0.0, 0.0 ] )  # Current orientation (w, x, y, z)
+        self.samples = 0  # Samples processed
+        self.rejected = 0  # Accelerometer samples not used for the correction
+        self.saturated = 0  # Gyroscope samples at the end of the range
+
+        self._last = None  # Raw 32-bit stamp of the last sample
+        self._init = True  # Initialize the tilt from the accelerometer
+        self._scratch = np.empty( DUO_MAX_IMU_SAMPLES, DUO_IMU_DTYPE )
+        self._allocate( DUO_MAX_IMU_SAMPLES )
+
+    def _allocate( self, size ):
+        self._stamps = np.empty( size, np.uint32 )
+        self._quaternions = np.empty( ( size, 4 ), np.float64 )
+        self._gyro = np.empty( ( size, 3 ), np.float64 )
+        self._accel = np.empty( ( size, 3 ), np.float64 )
+        self._norm = np.empty( size, np.float64 )
+        self._valid = np.empty( size, np.bool_ )
+        self._dt = np.empty( size, np.float64 )
+
+    def set_range( self, accelRange, gyroRange ):
+        """
+        Sets the IMU range (call after SetDUOIMURange)
+        """
+        self.accelRange = accelRange
+        self.gyroRange = gyroRange
+        self._accelLimit = _ACCEL_SCALE[accelRange] * _SATURATION
+        self._gyroLimit = _GYRO_SCALE[gyroRange] * _SATURATION
+
+    def reset( self, q = None ):
+        """
+        Resets the orientation (to the tilt of the next accelerometer sample if q is None)
+        """
+        self.q[:] = ( 1.0, 0.0, 0.0, 0.0 ) if q is None else q
+        self._last = None
+        self._init = q is None
+
+    def _prepare( self, samples, n ):
+        """
+        Vectorized part of the update: time steps, units and accelerometer rejection
+        """
+        stamps = self._stamps[:n]
+        stamps[...] = samples["timeStamp"]
+        dt = self._dt[:n]
+        previous = stamps[0] if self._last is None else self._last
+        dt[0] = ( int( stamps[0] ) - int( previous ) ) & _WRAP_MASK
+        if n > 1:
+            dt[1:] = ( stamps[1:].astype( np.int64 ) - stamps[:-1] ) & _WRAP_MASK
+        dt[dt >= 1 << 31] = 0  # Out of order / repeated stamps
+        dt *= 1e-4
+        np.minimum( dt, self.maxStep, out = dt )
+        self._last = int( stamps[-1] )
+
+        gyro = self._gyro[:n]
+        gyro[...] = samples["gyroData"]
+        self.saturated += int( np.count_nonzero( np.abs( gyro ).max( axis = 1 ) >= self._gyroLimit ) )
+        gyro -= self.gyroBias
+        gyro *= math.pi / 180.0
+
+        accel = self._accel[:n]
+        accel[...] = samples["accelData"]
+        valid = self._valid[:n]
+        np.less( np.abs( accel ).max( axis = 1 ), self._accelLimit, out = valid )
+        norm = self._norm[:n]
+        np.sqrt( np.einsum( "ij,ij->i", accel, accel ), out = norm )
+        valid &= norm > 0
+        if self.accelTolerance is not None:
+            valid &= np.abs( norm - 1.0 ) <= self.accelTolerance
+        np.divide( accel, norm[:, None], out = accel, where = valid[:, None] )
+        self.rejected += n - int( np.count_nonzero( valid ) )
+        return dt, gyro, accel, valid
+
+    def _initialize( self, accel, valid ):
+        # Tilt from the first usable accelerometer sample, yaw = 0
+        index = np.flatnonzero( valid )
+        if not len( index ):
+            return
+        ax, ay, az = accel[index[0]]
+        roll = math.atan2( ay, az )
+        pitch = math.atan2( -ax, math.sqrt( ay * ay + az * az ) )
+        cr, sr = math.cos( roll / 2 ), math.sin( roll / 2 )
+        cp, sp = math.cos( pitch / 2 ), math.sin( pitch / 2 )
+        self.q[:] = ( cr * cp, sr * cp, cr * sp, -sr * sp )
+        self._init = False
+
+    def update( self, data ):
+        """
+        Updates the orientation with the IMU samples of a frame
+
+        @param data: DUOFrame, PDUOFrame, object with an imu attribute (DUOFrameSlot,
+                     played back frames) or DUO_IMU_DTYPE array
+        @return: tuple(timeStamp (N,) uint32, quaternions (N, 4) w, x, y, z) views
+                 of buffers reused by the next update
+        """
+        if isinstance( data, np.ndarray ):
+            samples = data
+        elif hasattr( data, "imu" ):
+            samples = data.imu
+        else:
+            samples = GetDUOFrameIMU( data, self._scratch )
+        n = len( samples )
+        if n > len( self._stamps ):
+            self._allocate( n )
+        if n == 0:
+            return self._stamps[:0], self._quaternions[:0]
+        if samples.dtype != DUO_IMU_DTYPE:
+            raise TypeError( "IMU samples must be a DUO_IMU_DTYPE array" )
+
+        dt, gyro, accel, valid = self._prepare( samples, n )
+        if self._init:
+            self._initialize( accel, valid )
+        out = self._quaternions[:n]
+        if self.method == DUO_ORIENTATION_MADGWICK:
+            q = _madgwick( self.q.tolist(), dt.tolist(), gyro.tolist(), accel.tolist(),
+                           valid.tolist(), self.gain, out )
+        else:
+            q = _complementary( self.q.tolist(), dt.tolist(), gyro.tolist(), accel.tolist(),
+                                valid.tolist(), self.gain, out )
+        self.q[:] = q
+        self.samples += n
+        return self._stamps[:n], out
+
+    def euler( self, q = None ):
+        """
+        Returns roll, pitch and yaw in degrees (of the current orientation by default)
+
+        @param q: optional (4,) or (N, 4) quaternions
+        """
+        q = self.q if q is None else np.asarray( q, np.float64 )
+        w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+        roll = np.arctan2( 2 * ( w * x + y * z ), 1 - 2 * ( x * x + y * y ) )
+        pitch = np.arcsin( np.clip( 2 * ( w * y - z * x ), -1.0, 1.0 ) )
+        yaw = np.arctan2( 2 * ( w * z + x * y ), 1 - 2 * ( y * y + z * z ) )
+        return np.degrees( roll ), np.degrees( pitch ), np.degrees( yaw )
+
+def _madgwick( q, dts, gyros, accels, valids, beta, out ):
+    q0, q1, q2, q3 = q
+    sqrt = math.sqrt
+    rows = []
+    for i, dt in enumerate( dts ):
+        gx, gy, gz = gyros[i]
+        qd0 = 0.5 * ( -q1 * gx - q2 * gy - q3 * gz )
+        qd1 = 0.5 * ( q0 * gx + q2 * gz - q3 * gy )
+        qd2 = 0.5 * ( q0 * gy - q1 * gz + q3 * gx )
+        qd3 = 0.5 * ( q0 * gz + q1 * gy - q2 * gx )
+        if valids[i]:
+            ax, ay, az = accels[i]
+            # Gradient of the gravity error
+            f0 = 2.0 * ( q1 * q3 - q0 * q2 ) - ax
+            f1 = 2.0 * ( q0 * q1 + q2 * q3 ) - ay
+            f2 = 2.0 * ( 0.5 - q1 * q1 - q2 * q2 ) - az
+            s0 = -2.0 * q2 * f0 + 2.0 * q1 * f1
+            s1 = 2.0 * q3 * f0 + 2.0 * q0 * f1 - 4.0 * q1 * f2
+            s2 = -2.0 * q0 * f0 + 2.0 * q3 * f1 - 4.0 * q2 * f2
+            s3 = 2.0 * q1 * f0 + 2.0 * q2 * f1
+            norm = sqrt( s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3 )
+            if norm > 0.0:
+                norm = beta / norm
+                qd0 -= norm * s0
+                qd1 -= norm * s1
+                qd2 -= norm * s2
+                qd3 -= norm * s3
+        q0 += qd0 * dt
+        q1 += qd1 * dt
+        q2 += qd2 * dt
+        q3 += qd3 * dt
+        norm = 1.0 / sqrt( q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3 )
+        q0 *= norm
+        q1 *= norm
+        q2 *= norm
+        q3 *= norm
+        rows.append( ( q0, q1, q2, q3 ) )
+    out[...] = rows
+    return q0, q1, q2, q3
+
+def _complementary( q, dts, gyros, accels, valids, kp, out ):
+    q0, q1, q2, q3 = q
+    sqrt = math.sqrt
+    rows = []
+    for i, dt in enumerate( dts ):
+        gx, gy, gz = gyros[i]
+        if valids[i]:
+            ax, ay, az = accels[i]
+            # Estimated gravity direction in sensor coordinates
+            vx = 2.0 * ( q1 * q3 - q0 * q2 )
+            vy = 2.0 * ( q0 * q1 + q2 * q3 )
+            vz = q0 * q0 - q1 * q1 - q2 * q2 + q3 * q3
+            gx += kp * ( ay * vz - az * vy )
+            gy += kp * ( az * vx - ax * vz )
+            gz += kp * ( ax * vy - ay * vx )
+        h = 0.5 * dt
+        qa, qb, qc = q0, q1, q2
+        q0 += ( -qb * gx - qc * gy - q3 * gz ) * h
+        q1 += ( qa * gx + qc * gz - q3 * gy ) * h
+        q2 += ( qa * gy - qb * gz + q3 * gx ) * h
+        q3 += ( qa * gz + qb * gy - qc * gx ) * h
+        norm = 1.0 / sqrt( q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3 )
+        q0 *= norm
+        q1 *= norm
+        q2 *= norm
+        q3 *= norm
+        rows.append( ( q0, q1, q2, q3 ) )
+    out[...] = rows
+    return q0, q1, q2, q3
+
+def CreateDUOOrientationFilter( duo, method = DUO_ORIENTATION_MADGWICK, **kwargs ):
+    """
+    Creates a DUOOrientationFilter for the IMU range currently set on an opened device
+
+    @param kwargs: other DUOOrientationFilter parameters
+    """
+    accel, gyro = GetDUOIMURange( duo )
+    return DUOOrientationFilter( method, accelRange = accel, gyroRange = gyro, **kwargs )
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.playback
+
+    @brief: Replays recordings through the DUOFrameCallback interface
+
+    DUOPlayer feeds frames of a DUORecording to the same callback that is
+    passed to StartDUO. The DUOFrame image pointers point straight into the
+    memory-mapped file (nothing is copied but the few valid IMU samples),
+    and frames are paced by their recorded timeStamp:
+
+        player = DUOPlayer( "session.duo", callback )            # real-time
+        player = DUOPlayer( "session.duo", callback, speed = 4 )  # 4x faster
+        player = DUOPlayer( "session.duo", callback, speed = None )  # as fast as possible
+        player.run()
+
+    The callback must not write into the image buffers (the mapping is read-only).
+"""
+
+import ctypes as ct
+import threading
+import time
+
+from .duo3d import DUOFrame
+from .frame import DUO_IMU_DTYPE
+from .recording import DUORecording, _RECORD
+
+__all__ = [
+    "DUOPlayer",
+    ]
+
+class DUOPlayer( object ):
+    """
+    Replays DUORecording frames into a DUOFrameCallback
+    """
+
+    def __init__( self, recording, frameCallback, pUserData = None, speed = 1.0,
+                  first = 0, last = None, loop = False ):
+        """
+        @param recording: DUORecording or path of the recording file
+        @param frameCallback: DUOFrameCallback (or Python function taking (pFrameData, pUserData))
+        @param pUserData: passed to the callback
+        @param speed: playback speed relative to real-time, None or 0 for as fast as possible
+        @param first: index of the first frame to play
+        @param last: index after the last frame to play (all by default)
+        @param loop: start over after the last frame until stopped
+        """
+        self.recording = recording if isinstance( recording, DUORecording ) else DUORecording( recording )
+        self.frameCallback = frameCallback
+        self.pUserData = pUserData
+        self.speed = speed
+        self.first = first
+        self.last = len( self.recording ) if last is None else last
+        self.loop = loop
+        self.played = 0
+
+        rec = self.recording
+        self._frame = DUOFrame()
+        self._frame.width = rec.width
+        self._frame.height = rec.height
+        self._pFrame = ct.pointer( self._frame )
+        # Pointer fields are updated in place, without creating ctypes objects per frame
+        self._leftPtr = ct.c_void_p.from_buffer( self._frame, DUOFrame.leftData.offset )
+        self._rightPtr = ct.c_void_p.from_buffer( self._frame, DUOFrame.rightData.offset )
+        self._imuAddr = ct.addressof( self._frame ) + DUOFrame.IMUData.offset
+        self._base = rec._buffer.ctypes.data
+
+        self._stopEvent = threading.Event()
+        self._thread = None
+
+    def _play( self, i ):
+        rec = self.recording
+        frame = self._frame
+        entry = rec.index[i]
+        image_size = rec.width * rec.height
+        pos = self._base + int( entry["offset"] ) + _RECORD.size
+        samples = int( entry["IMUSamples"] )
+
+        self._leftPtr.value = pos
+        self._rightPtr.value = pos + image_size
+        if samples:
+            ct.memmove( self._imuAddr, pos + 2 * image_size, samples * DUO_IMU_DTYPE.itemsize )
+        frame.IMUSamples = samples
+        frame.IMUPresent = int( entry["IMUPresent"] )
+        frame.ledSeqTag = int( entry["ledSeqTag"] )
+        frame.timeStamp = int( entry["timeStamp"] ) & 0xFFFFFFFF
+        self.frameCallback( self._pFrame, self.pUserData )
+        self.played += 1
+
+    def run( self ):
+        """
+        Plays the frames in the calling thread.
+
+        @return: number of frames played
+        """
+        rec = self.recording
+        stop = self._stopEvent
+        stamps = rec.timestamps
+        if self.first >= self.last:  # Nothing to play (and nothing to loop over)
+            return self.played
+        while not stop.is_set():
+            start_wall = time.time()
+            start_stamp = int( stamps[self.first] )
+            for i in range( self.first, self.last ):
+                if stop.is_set():
+                    break
+                if self.speed:
+                    due = start_wall + ( int( stamps[i] ) - start_stamp ) / ( 10000.0 * self.speed )
+                    delay = due - time.time()
+                    if delay > 0 and stop.wait( delay ):
+                        break
+                self._play( i )
+            if not self.loop:
+                break
+        return self.played
+
+    def start( self ):
+        """
+        Plays the frames in a background thread (like StartDUO)
+        """
+        if self._thread is not None:
+            return False
+        self._stopEvent.clear()
+        self._thread = threading.Thread( target = self.run, name = "DUOPlayer" )
+        self._thread.daemon = True
+        self._thread.start()
+        return True
+
+    def stop( self ):
+        """
+        Stops the playback and waits for the background thread (like StopDUO)
+        """
+        self._stopEvent.set()
+        self.wait()
+
+    def wait( self, timeout = None ):
+        """
+        Waits for the background playback to finish
+
+        @return: True if the playback is finished
+        """
+        thread = self._thread
+        if thread is not None:
+            thread.join( timeout )
+            if thread.is_alive():
+                return False
+            self._thread = None
+        return True
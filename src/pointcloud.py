@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.pointcloud
+
+    @brief: Disparity to 3D point reprojection with the DUO_STEREO.Q matrix
+
+    [X Y Z W] = Q * [x y disparity 1], point = (X/W, Y/W, Z/W)
+
+    The disparity independent terms of Q * [x y 0 1] are computed once per
+    resolution and stride (and shared by reprojectors with the same Q, the
+    last few combinations are cached), so a frame costs a few vectorized
+    passes into preallocated buffers:
+
+        reprojector = CreateDUOReprojector( duo, stride = 2 )
+        xyz = reprojector.reproject( disparity )  # (H, W, 3), NaN where invalid
+        points = reprojector.points( disparity, maxDepth = 5000 )  # (N, 3)
+
+    Points are in the units of the calibration translation (DUO_STEREO.T).
+"""
+
+import collections
+import threading
+
+import numpy as np
+
+from .calibration import GetDUOCalibration
+
+__all__ = [
+    "CreateDUOReprojector", "DUOReprojector",
+    ]
+
+# Number of (Q, width, height, stride) ray terms kept, least recently used dropped first
+_RAYS_CACHE_SIZE = 4
+
+_raysLock = threading.Lock()
+_rays = collections.OrderedDict()
+
+def _q_matrix( Q ):
+    Q = getattr( Q, "Q", Q )  # DUO_STEREO or DUOCalibration
+    return np.array( Q[:] if not isinstance( Q, np.ndarray ) else Q, np.float64 ).reshape( 4, 4 )
+
+def _ray_terms( Q, width, height, stride ):
+    """
+    Returns the cached (rows, cols, 4) float32 terms Q * [x y 0 1] of the sampled pixels
+    """
+    key = ( Q.tobytes(), width, height, stride )
+    with _raysLock:
+        rays = _rays.get( key )
+        if rays is not None:
+            _rays.move_to_end( key )
+            return rays
+    x = np.arange( 0, width, stride, dtype = np.float64 )
+    y = np.arange( 0, height, stride, dtype = np.float64 )[:, None, None]
+    rays = ( x[None, :, None] * Q[:, 0] + y * Q[:, 1] + Q[:, 3] ).astype( np.float32 )
+    rays.flags.writeable = False
+    with _raysLock:
+        rays = _rays.setdefault( key, rays )
+        _rays.move_to_end( key )
+        while len( _rays ) > _RAYS_CACHE_SIZE:
+            _rays.popitem( last = False )
+    return rays
+
+class DUOReprojector( object ):
+    """
+    Converts disparity maps to 3D points without allocating per frame
+    """
+
+    def __init__( self, Q, width, height, stride = 1 ):
+        """
+        @param Q: 4x4 disparity to depth matrix (DUO_STEREO, DUOCalibration, its Q or array-like)
+        @param width: disparity map width
+        @param height: disparity map height
+        @param stride: sample every stride-th pixel of every stride-th row
+        """
+        if stride < 1:
+            raise ValueError( "stride must be positive" )
+        self.Q = _q_matrix( Q )
+        self.width = width
+        self.height = height
+        self.stride = stride
+        rays = _ray_terms( self.Q, width, height, stride )
+        rows, cols = rays.shape[:2]
+        self.rows = rows
+        self.cols = cols
+        self._xyz = rays[..., :3]
+        self._w = rays[..., 3]
+        self._dxyz = self.Q[:3, 2].astype( np.float32 )
+        self._dw = np.float32( self.Q[3, 2] )
+
+        self.xyz = np.empty( ( rows, cols, 3 ), np.float32 )
+        self._points = np.empty( ( rows * cols, 3 ), np.float32 )
+        self._scale = np.empty( ( rows, cols ), np.float32 )
+        self._valid = np.empty( ( rows, cols ), np.bool_ )
+        self._invalid = np.empty( ( rows, cols ), np.bool_ )
+        self._depth = np.empty( ( rows, cols ), np.bool_ )
+
+    def _compute( self, disparity, out, minDepth, maxDepth ):
+        if disparity.shape != ( self.height, self.width ):
+            raise ValueError( "disparity must be %dx%d" % ( self.width, self.height ) )
+        d = disparity[::self.stride, ::self.stride]
+        scale, valid = self._scale, self._valid
+        np.greater( d, 0, out = valid )
+        # 1 / W
+        np.multiply( d, self._dw, out = scale )
+        scale += self._w
+        np.greater( scale, 0, out = self._depth )
+        valid &= self._depth
+        np.divide( 1, scale, out = scale, where = valid )
+        np.multiply( d[..., None], self._dxyz, out = out )
+        out += self._xyz
+        out *= scale[..., None]
+        if minDepth is not None:
+            np.greater_equal( out[..., 2], minDepth, out = self._depth )
+            valid &= self._depth
+        if maxDepth is not None:
+            np.less_equal( out[..., 2], maxDepth, out = self._depth )
+            valid &= self._depth
+        return valid
+
+    def reproject( self, disparity, out = None, minDepth = None, maxDepth = None ):
+        """
+        Reprojects a disparity map to a (rows, cols, 3) point image
+
+        @param disparity: (height, width) disparity map, values <= 0 are invalid
+        @param out: optional (rows, cols, 3) float32 output (the reprojector's own buffer by default)
+        @param minDepth: points closer than minDepth are invalid
+        @param maxDepth: points farther than maxDepth are invalid
+        @return: out, NaN for invalid points
+        """
+        out = self.xyz if out is None else out
+        valid = self._compute( disparity, out, minDepth, maxDepth )
+        np.logical_not( valid, out = self._invalid )
+        np.copyto( out, np.float32( np.nan ), where = self._invalid[..., None] )
+        return out
+
+    def points( self, disparity, out = None, minDepth = None, maxDepth = None ):
+        """
+        Reprojects a disparity map to a compact array of the valid points.
+        The point buffers are reused, only the compaction index is temporary.
+
+        @param out: optional (rows * cols, 3) float32 buffer (the reprojector's own buffer by default)
+        @return: (N, 3) view of out
+        """
+        out = self._points if out is None else out
+        valid = self._compute( disparity, self.xyz, minDepth, maxDepth )
+        n = int( np.count_nonzero( valid ) )
+        np.compress( valid.reshape( -1 ), self.xyz.reshape( -1, 3 ), axis = 0, out = out[:n] )
+        return out[:n]
+
+def CreateDUOReprojector( duo, stride = 1 ):
+    """
+    Creates a DUOReprojector for the currently selected resolution of an opened device
+    """
+    calib = GetDUOCalibration( duo )
+    return DUOReprojector( calib, calib.width, calib.height, stride )
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.recording
+
+    @brief: Memory-mappable raw stereo + IMU recordings
+
+    File layout (little endian):
+        header      64 bytes, see _HEADER
+        records     one per frame, 8-byte aligned:
+                    32 byte record header (_RECORD), left image, right image,
+                    IMUSamples * DUO_IMU_DTYPE samples
+        index       frames * DUO_RECORDING_INDEX_DTYPE, written on close
+
+    The index maps the (unwrapped) frame timeStamp to the record offset, so
+    DUORecording finds a frame by time with a binary search and maps its
+    images and IMU samples as zero-copy arrays. Recordings that were not
+    closed properly (no index) are indexed by scanning the record headers.
+
+    DUORecorder.callback only copies the frame into a preallocated
+    DUOFrameRing slot; a background thread packs the frames into a large
+    staging buffer and writes it in batches.
+"""
+
+import mmap
+import os
+import struct
+import threading
+
+import numpy as np
+
+from .duo3d import DUO_MAX_IMU_SAMPLES
+from .frame import DUO_IMU_DTYPE
+from .capture import DUOFrameRing, DUO_RING_DROP_NEWEST
+
+__all__ = [
+    "DUORecorder", "DUORecording", "DUORecordedFrame",
+    "DUO_RECORDING_INDEX_DTYPE",
+    ]
+
+_MAGIC = b"DUO3DREC"
+_VERSION = 1
+# magic, version, width, height, flags, index offset, frames
+_HEADER = struct.Struct( "<8sIIII QQ 24x" )
+# magic, seq, timeStamp, ledSeqTag, IMUPresent, IMUSamples, width, height
+_RECORD = struct.Struct( "<4sII BB2x III 4x" )
+_RECORD_MAGIC = b"FRM1"
+_ALIGN = 8
+
+assert _HEADER.size == 64 and _RECORD.size == 32
+
+# Frame index entry
+DUO_RECORDING_INDEX_DTYPE = np.dtype( [
+    ( "timeStamp", "<u8" ),  # Frame time stamp in 100us increments, unwrapped to 64 bits
+    ( "offset", "<u8" ),  # Record offset in the file
+    ( "IMUSamples", "<u4" ),
+    ( "ledSeqTag", "<u4" ),
+    ( "IMUPresent", "<u4" ),
+    ( "reserved", "<u4" ),
+    ] )
+
+def _record_size( width, height, samples ):
+    size = _RECORD.size + 2 * width * height + samples * DUO_IMU_DTYPE.itemsize
+    return ( size + _ALIGN - 1 ) // _ALIGN * _ALIGN
+
+class DUORecorder( object ):
+    """
+    Appends frames to a recording file from a background writer thread.
+
+    Usage:
+        with DUORecorder( "session.duo", width, height ) as rec:
+            StartDUO( duo, rec.callback, None )
+            ...
+            StopDUO( duo )
+    """
+
+    def __init__( self, path, width, height, queueSize = 64, batchSize = 8 << 20 ):
+        """
+        @param path: recording file path (overwritten)
+        @param width: frame width
+        @param height: frame height
+        @param queueSize: frames buffered between the callback and the writer
+        @param batchSize: size of a single write in bytes (at least one frame)
+        """
+        self.path = path
+        self.width = width
+        self.height = height
+        self.frames = 0
+        self._ring = DUOFrameRing( width, height, queueSize, DUO_RING_DROP_NEWEST )
+        self.callback = self._ring.callback
+
+        self._file = open( path, "wb" )
+        self._file.write( _HEADER.pack( _MAGIC, _VERSION, width, height, 0, 0, 0 ) )
+        self._offset = _HEADER.size
+        self._batch = bytearray( max( batchSize, _record_size( width, height, DUO_MAX_IMU_SAMPLES ) ) )
+        self._index = []
+        self._lastStamp = None
+        self._stampHigh = 0
+        self._error = None
+        self._writer = threading.Thread( target = self._run, name = "DUORecorder" )
+        self._writer.daemon = True
+        self._writer.start()
+
+    @property
+    def dropped( self ):
+        """
+        Frames dropped because the writer could not keep up
+        """
+        return self._ring.dropped
+
+    def write( self, frame ):
+        """
+        Queues a DUOFrame for writing (same as the callback does)
+
+        @return: False if the frame was dropped
+        """
+        return self._ring.push( frame )
+
+    def _unwrap( self, stamp ):
+        if self._lastStamp is not None and stamp < self._lastStamp:
+            self._stampHigh += 1 << 32
+        self._lastStamp = stamp
+        return self._stampHigh + stamp
+
+    def _run( self ):
+        ring = self._ring
+        batch = self._batch
+        view = memoryview( batch )
+        used = 0
+        image_size = self.width * self.height
+        try:
+            while True:
+                slot = ring.get( 0.1 if used else None )
+                if slot is None:
+                    if used:
+                        self._file.write( view[:used] )
+                        self._offset += used
+                        used = 0
+                    if ring.closed and not ring.pending():
+                        break
+                    continue
+
+                samples = slot.IMUSamples
+                size = _record_size( self.width, self.height, samples )
+                if used + size > len( batch ):
+                    self._file.write( view[:used] )
+                    self._offset += used
+                    used = 0
+
+                _RECORD.pack_into( batch, used, _RECORD_MAGIC, slot.seq, slot.timeStamp,
+                                   slot.ledSeqTag, slot.IMUPresent, samples,
+                                   self.width, self.height )
+                pos = used + _RECORD.size
+                view[pos:pos + image_size] = slot.left.reshape( -1 )
+                pos += image_size
+                view[pos:pos + image_size] = slot.right.reshape( -1 )
+                pos += image_size
+                if samples:
+                    imu_size = samples * DUO_IMU_DTYPE.itemsize
+                    view[pos:pos + imu_size] = slot.imu.view( np.uint8 )
+                self._index.append( ( self._unwrap( slot.timeStamp ), self._offset + used,
+                                      samples, slot.ledSeqTag, slot.IMUPresent, 0 ) )
+                used += size
+                self.frames += 1
+        except Exception as e:  # Reported by close()
+            self._error = e
+            ring.close()
+
+    def close( self ):
+        """
+        Flushes the queued frames and writes the index. Call after StopDUO.
+        """
+        if self._file is None:
+            return
+        self._ring.close()
+        self._writer.join()
+        try:
+            if self._error is None:
+                index = np.array( self._index, DUO_RECORDING_INDEX_DTYPE )
+                self._file.write( index.tobytes() )
+                self._file.seek( 0 )
+                self._file.write( _HEADER.pack( _MAGIC, _VERSION, self.width, self.height, 0,
+                                                self._offset, len( index ) ) )
+        finally:
+            self._file.close()
+            self._file = None
+        if self._error is not None:
+            raise self._error
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, exc_type, exc, tb ):
+        self.close()
+
+class DUORecordedFrame( object ):
+    """
+    Frame of a DUORecording, images and IMU samples are views of the mapped file
+    """
+    __slots__ = ( "index", "seq", "width", "height", "ledSeqTag", "timeStamp",
+                  "left", "right", "IMUPresent", "IMUSamples", "imu", "offset" )
+
+class DUORecording( object ):
+    """
+    Read-only memory-mapped recording written by DUORecorder
+    """
+
+    def __init__( self, path ):
+        self.path = path
+        with open( path, "rb" ) as f:
+            size = os.fstat( f.fileno() ).st_size
+            if size < _HEADER.size:
+                raise ValueError( "%s is not a DUO recording" % path )
+            self._mmap = mmap.mmap( f.fileno(), 0, access = mmap.ACCESS_READ )
+        magic, version, width, height, flags, index_offset, frames = _HEADER.unpack_from( self._mmap, 0 )
+        if magic != _MAGIC:
+            raise ValueError( "%s is not a DUO recording" % path )
+        if version != _VERSION:
+            raise ValueError( "unsupported DUO recording version %d" % version )
+        self.width = width
+        self.height = height
+        self._imageSize = width * height
+        self._buffer = np.frombuffer( self._mmap, np.uint8 )
+
+        if index_offset and index_offset + frames * DUO_RECORDING_INDEX_DTYPE.itemsize <= size:
+            self.index = np.frombuffer( self._mmap, DUO_RECORDING_INDEX_DTYPE, frames, index_offset )
+            self.complete = True
+        else:
+            self.index = self._scan( size )
+            self.complete = False
+        self.timestamps = self.index["timeStamp"]
+
+    def _scan( self, size ):
+        # Rebuilds the index of a recording that was not closed
+        entries = []
+        offset = _HEADER.size
+        stamp_high, last = 0, None
+        while offset + _RECORD.size <= size:
+            magic, seq, stamp, led, imu_present, samples, width, height = _RECORD.unpack_from( self._mmap, offset )
+            record_size = _record_size( width, height, samples )
+            if magic != _RECORD_MAGIC or offset + record_size > size:
+                break
+            if last is not None and stamp < last:
+                stamp_high += 1 << 32
+            last = stamp
+            entries.append( ( stamp_high + stamp, offset, samples, led, imu_present, 0 ) )
+            offset += record_size
+        return np.array( entries, DUO_RECORDING_INDEX_DTYPE )
+
+    def __len__( self ):
+        return len( self.index )
+
+    def frame( self, i ):
+        """
+        Returns frame i as DUORecordedFrame with zero-copy left/right/imu arrays
+        """
+        if i < 0:
+            i += len( self.index )
+        offset = int( self.index["offset"][i] )
+        magic, seq, stamp, led, imu_present, samples, width, height = _RECORD.unpack_from( self._mmap, offset )
+        pos = offset + _RECORD.size
+        n = self._imageSize
+
+        f = DUORecordedFrame()
+        f.index = i
+        f.offset = offset
+        f.seq = seq
+        f.width = width
+        f.height = height
+        f.ledSeqTag = led
+        f.timeStamp = stamp
+        f.IMUPresent = bool( imu_present )
+        f.IMUSamples = samples
+        f.left = self._buffer[pos:pos + n].reshape( height, width )
+        f.right = self._buffer[pos + n:pos + 2 * n].reshape( height, width )
+        f.imu = np.frombuffer( self._mmap, DUO_IMU_DTYPE, samples, pos + 2 * n )
+        return f
+
+    def find( self, timeStamp ):
+        """
+        Returns the index of the last frame captured at or before timeStamp (binary search)
+
+        @param timeStamp: unwrapped time stamp in 100us increments (see timestamps)
+        @return: frame index, -1 if timeStamp is before the first frame
+        """
+        return int( np.searchsorted( self.timestamps, timeStamp, "right" ) ) - 1
+
+    def frame_at( self, timeStamp ):
+        """
+        Returns the frame captured at or before timeStamp (the first one if earlier)
+        """
+        return self.frame( max( 0, self.find( timeStamp ) ) )
+
+    def __iter__( self ):
+        for i in range( len( self.index ) ):
+            yield self.frame( i )
+
+    def close( self ):
+        """
+        Unmaps the file. Arrays returned by frame() must not be used afterwards.
+        """
+        self.index = self.timestamps = self._buffer = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # Frames still referenced, unmapped when they are released
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, exc_type, exc, tb ):
+        self.close()
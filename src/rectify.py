@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.rectify
+
+    @brief: Software stereo rectification from DUO_STEREO parameters
+
+    DUORectifier builds per-eye lookup tables once (the same mapping as
+    OpenCV initUndistortRectifyMap with the rational distortion model) and
+    remaps images with a vectorized NumPy gather into preallocated outputs:
+
+        rectifier = CreateDUORectifier( duo )
+        left, right = rectifier.rectify_frame( pFrameData )
+
+    Lookup tables are cached on disk, keyed by serial number, resolution and a
+    hash of the calibration, and memory-mapped when loaded again. The cache
+    directory is $DUO3D_CACHE or ~/.cache/duo3d.
+"""
+
+import ctypes as ct
+import hashlib
+import os
+
+import numpy as np
+
+from .calibration import GetDUOCalibration
+from .frame import GetDUOFrameImages
+
+__all__ = [
+    "BuildDUORectifyMap", "CreateDUORectifier", "DUORectifier",
+
+    "DUO3D_CACHE_ENV", "DUO_RECTIFY_LINEAR", "DUO_RECTIFY_NEAREST",
+    ]
+
+# Environment variable overriding the lookup table cache directory
+DUO3D_CACHE_ENV = "DUO3D_CACHE"
+
+# Interpolation
+DUO_RECTIFY_NEAREST = 1  # Single gather per pixel
+DUO_RECTIFY_LINEAR = 4  # Bilinear, 8-bit fixed point weights
+
+_WEIGHT_BITS = 8
+_WEIGHT_ONE = 1 << _WEIGHT_BITS
+
+def _matrix( values, rows, cols ):
+    return np.array( values[:], np.float64 ).reshape( rows, cols )
+
+def BuildDUORectifyMap( M, D, R, P, width, height ):
+    """
+    Computes the source coordinates of every rectified pixel.
+
+    @param M: 3x3 camera matrix
+    @param D: distortion coefficients (k1, k2, p1, p2, k3, k4, k5, k6)
+    @param R: 3x3 rectification rotation
+    @param P: 3x4 (or 3x3) rectified projection matrix
+    @return: tuple(mapx, mapy) float32 arrays of shape (height, width)
+    """
+    M = np.asarray( M, np.float64 ).reshape( 3, 3 )
+    D = np.zeros( 8 ) if D is None else np.concatenate( [ np.ravel( D ), np.zeros( 8 ) ] )[:8]
+    R = np.asarray( R, np.float64 ).reshape( 3, 3 )
+    P = np.asarray( P, np.float64 ).reshape( 3, -1 )[:, :3]
+    k1, k2, p1, p2, k3, k4, k5, k6 = D
+    iR = np.linalg.inv( P.dot( R ) )
+
+    u = np.arange( width, dtype = np.float64 )
+    v = np.arange( height, dtype = np.float64 )[:, None]
+    X = iR[0, 0] * u + iR[0, 1] * v + iR[0, 2]
+    Y = iR[1, 0] * u + iR[1, 1] * v + iR[1, 2]
+    W = iR[2, 0] * u + iR[2, 1] * v + iR[2, 2]
+    x = X / W
+    y = Y / W
+
+    x2, y2, xy = x * x, y * y, x * y
+    r2 = x2 + y2
+    kr = ( 1 + ( ( k3 * r2 + k2 ) * r2 + k1 ) * r2 ) / ( 1 + ( ( k6 * r2 + k5 ) * r2 + k4 ) * r2 )
+    xd = x * kr + 2 * p1 * xy + p2 * ( r2 + 2 * x2 )
+    yd = y * kr + p1 * ( r2 + 2 * y2 ) + 2 * p2 * xy
+    mapx = M[0, 0] * xd + M[0, 1] * yd + M[0, 2]
+    mapy = M[1, 0] * xd + M[1, 1] * yd + M[1, 2]
+    return mapx.astype( np.float32 ), mapy.astype( np.float32 )
+
+def _lookup_table( mapx, mapy, width, height, interpolation ):
+    """
+    Converts source coordinates to gather indices and fixed point weights
+
+    @return: tuple(index (K, N) int32, weight (K, N) uint16), K = interpolation
+    """
+    mapx = mapx.reshape( -1 ).astype( np.float64 )
+    mapy = mapy.reshape( -1 ).astype( np.float64 )
+    n = len( mapx )
+    index = np.zeros( ( interpolation, n ), np.int32 )
+    weight = np.zeros( ( interpolation, n ), np.uint16 )
+    if interpolation == DUO_RECTIFY_NEAREST:
+        x = np.floor( mapx + 0.5 )
+        y = np.floor( mapy + 0.5 )
+        valid = ( x >= 0 ) & ( x < width ) & ( y >= 0 ) & ( y < height )
+        index[0] = np.where( valid, y * width + x, 0 )
+        weight[0] = np.where( valid, _WEIGHT_ONE, 0 )
+        return index, weight
+
+    x0 = np.floor( mapx )
+    y0 = np.floor( mapy )
+    fx = np.round( ( mapx - x0 ) * _WEIGHT_ONE ).astype( np.int32 )
+    fy = np.round( ( mapy - y0 ) * _WEIGHT_ONE ).astype( np.int32 )
+    # Products of two 8-bit weights truncated back to 8 bits, the last one takes
+    # the truncation error so that the weights sum to _WEIGHT_ONE (no overflow)
+    w00 = ( ( _WEIGHT_ONE - fx ) * ( _WEIGHT_ONE - fy ) ) >> _WEIGHT_BITS
+    w10 = ( fx * ( _WEIGHT_ONE - fy ) ) >> _WEIGHT_BITS
+    w01 = ( ( _WEIGHT_ONE - fx ) * fy ) >> _WEIGHT_BITS
+    w11 = _WEIGHT_ONE - w00 - w10 - w01
+    corners = ( ( 0, 0, w00 ), ( 1, 0, w10 ), ( 0, 1, w01 ), ( 1, 1, w11 ) )
+    for k, ( dx, dy, w ) in enumerate( corners ):
+        x = x0 + dx
+        y = y0 + dy
+        valid = ( x >= 0 ) & ( x < width ) & ( y >= 0 ) & ( y < height )
+        index[k] = np.where( valid, y * width + x, 0 )
+        weight[k] = np.where( valid, w, 0 )
+    return index, weight
+
+def _stereo_hash( stereo ):
+    return hashlib.sha1( ct.string_at( ct.addressof( stereo ), ct.sizeof( stereo ) ) ).hexdigest()[:16]
+
+def _cache_dir( cacheDir ):
+    if cacheDir is None:
+        cacheDir = os.environ.get( DUO3D_CACHE_ENV ) or os.path.join( os.path.expanduser( "~" ), ".cache", "duo3d" )
+    return cacheDir
+
+def _save( path, array ):
+    tmp = "%s.%d.tmp" % ( path, os.getpid() )
+    with open( tmp, "wb" ) as f:
+        np.save( f, array )
+    os.replace( tmp, path )
+
+class DUORectifier( object ):
+    """
+    Remaps left/right images with precomputed lookup tables
+    """
+
+    def __init__( self, stereo, width, height, interpolation = DUO_RECTIFY_LINEAR,
+                  cacheDir = None, serial = None ):
+        """
+        @param stereo: DUO_STEREO for the given resolution
+        @param width: image width
+        @param height: image height
+        @param interpolation: DUO_RECTIFY_LINEAR or DUO_RECTIFY_NEAREST
+        @param cacheDir: lookup table cache directory, False to disable the cache
+        @param serial: device serial number used in the cache key
+        """
+        if interpolation not in ( DUO_RECTIFY_LINEAR, DUO_RECTIFY_NEAREST ):
+            raise ValueError( "unknown interpolation: %r" % ( interpolation, ) )
+        if isinstance( serial, bytes ):
+            serial = serial.decode( "ascii", "replace" )
+        self.width = width
+        self.height = height
+        self.interpolation = interpolation
+        self.key = "%s-%dx%d-%s-%d" % ( serial or "unknown", width, height,
+                                        _stereo_hash( stereo ), interpolation )
+        self.cached = False
+
+        cacheDir = _cache_dir( cacheDir ) if cacheDir is not False else None
+        index_path = weight_path = None
+        if cacheDir:
+            index_path = os.path.join( cacheDir, "rectify-%s-index.npy" % self.key )
+            weight_path = os.path.join( cacheDir, "rectify-%s-weight.npy" % self.key )
+            try:
+                self.index = np.load( index_path, mmap_mode = "r" )
+                self.weight = np.load( weight_path, mmap_mode = "r" )
+                self.cached = self.index.shape == ( 2, interpolation, width * height )
+            except ( IOError, OSError, ValueError ):
+                pass
+        if not self.cached:
+            self.index, self.weight = self._build( stereo )
+            if cacheDir:
+                try:
+                    if not os.path.isdir( cacheDir ):
+                        os.makedirs( cacheDir )
+                    _save( index_path, self.index )
+                    _save( weight_path, self.weight )
+                except ( IOError, OSError ):
+                    pass  # Read-only location, the tables are rebuilt next time
+
+        n = width * height
+        self._invalid = [ np.flatnonzero( self.weight[eye, 0] == 0 ) for eye in ( 0, 1 ) ] \
+            if interpolation == DUO_RECTIFY_NEAREST else None
+        self._gathered = np.empty( n, np.uint8 )
+        self._product = np.empty( n, np.uint16 )
+        self._sum = np.empty( n, np.uint16 )
+        self.left = np.empty( ( height, width ), np.uint8 )
+        self.right = np.empty( ( height, width ), np.uint8 )
+
+    def _build( self, stereo ):
+        width, height = self.width, self.height
+        index = np.empty( ( 2, self.interpolation, width * height ), np.int32 )
+        weight = np.empty( ( 2, self.interpolation, width * height ), np.uint16 )
+        eyes = ( ( stereo.M1, stereo.D1, stereo.R1, stereo.P1 ),
+                 ( stereo.M2, stereo.D2, stereo.R2, stereo.P2 ) )
+        for eye, ( M, D, R, P ) in enumerate( eyes ):
+            mapx, mapy = BuildDUORectifyMap( _matrix( M, 3, 3 ), np.array( D[:] ), _matrix( R, 3, 3 ),
+                                             _matrix( P, 3, 4 ), width, height )
+            index[eye], weight[eye] = _lookup_table( mapx, mapy, width, height, self.interpolation )
+        return index, weight
+
+    def remap( self, eye, image, out ):
+        """
+        Rectifies a single image
+
+        @param eye: 0 for the left, 1 for the right image
+        @param image: (height, width) uint8 image
+        @param out: (height, width) uint8 output array, must not be image
+        @return: out
+        """
+        src = np.ascontiguousarray( image ).reshape( -1 )
+        dst = out.reshape( -1 )
+        index = self.index[eye]
+        if self.interpolation == DUO_RECTIFY_NEAREST:
+            np.take( src, index[0], out = dst )
+            dst[self._invalid[eye]] = 0
+            return out
+        weight = self.weight[eye]
+        gathered, product, total = self._gathered, self._product, self._sum
+        total.fill( _WEIGHT_ONE >> 1 )
+        for k in range( DUO_RECTIFY_LINEAR ):
+            np.take( src, index[k], out = gathered )
+            np.multiply( gathered, weight[k], out = product )
+            total += product
+        np.right_shift( total, _WEIGHT_BITS, out = dst, casting = "unsafe" )
+        return out
+
+    def rectify( self, left, right, outLeft = None, outRight = None ):
+        """
+        Rectifies a stereo pair into outLeft/outRight (the rectifier's own buffers by default)
+
+        @return: tuple(outLeft, outRight)
+        """
+        outLeft = self.left if outLeft is None else outLeft
+        outRight = self.right if outRight is None else outRight
+        return self.remap( 0, left, outLeft ), self.remap( 1, right, outRight )
+
+    def rectify_frame( self, frame, outLeft = None, outRight = None ):
+        """
+        Rectifies the images of a DUOFrame (or PDUOFrame) without copying them first
+        """
+        left, right = GetDUOFrameImages( frame )
+        return self.rectify( left, right, outLeft, outRight )
+
+def CreateDUORectifier( duo, interpolation = DUO_RECTIFY_LINEAR, cacheDir = None ):
+    """
+    Creates a DUORectifier for the currently selected resolution of an opened device
+
+    @param duo: DUOInstance
+    @param interpolation: DUO_RECTIFY_LINEAR or DUO_RECTIFY_NEAREST
+    @param cacheDir: lookup table cache directory, False to disable the cache
+    """
+    calib = GetDUOCalibration( duo )
+    return DUORectifier( calib.stereo(), calib.width, calib.height, interpolation,
+                         cacheDir, calib.serial )
@@ -0,0 +1,542 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.shared
+
+    @brief: Frame broadcast to other processes through shared memory
+
+    DUOSharedPublisher copies every frame (both images, the IMU samples and
+    the metadata) once, from the DUOLib buffers into a ring of slots in a
+    multiprocessing.shared_memory block. Any number of processes attach by
+    name with DUOSharedSubscriber and get the frames as NumPy views of the
+    shared slots, without copying or pickling:
+
+        # Capture process
+        publisher = DUOSharedPublisher( "duo-left-rig", ri.width, ri.height )
+        StartDUO( duo, publisher.callback, None )
+
+        # Consumer processes
+        subscriber = DUOSharedSubscriber( "duo-left-rig" )
+        for frame in subscriber:
+            disparity = matcher.compute( frame.left, frame.right )
+            if not subscriber.valid( frame ):
+                continue  # The publisher reused the slot while we were reading it
+
+    Every slot has a sequence counter, odd while the publisher writes it and
+    2 * n + 2 once frame n is complete. Subscribers that fall more than
+    slots - 1 frames behind skip to the oldest frame still available (see
+    lost). Subscribers sleep in select() on a local socket (Unix-domain, or
+    loopback TCP on Windows) the publisher writes a byte to per frame, so
+    waiting for a frame does not poll.
+"""
+
+import ctypes as ct
+import os
+import select
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+from multiprocessing import shared_memory
+
+from .duo3d import DUOFrame, DUOFrameCallback, DUOIMUSample, DUO_MAX_IMU_SAMPLES
+from .frame import DUO_IMU_DTYPE
+
+__all__ = [
+    "DUOSharedFrame", "DUOSharedPublisher", "DUOSharedSubscriber",
+    ]
+
+_MAGIC = b"DUOSHM01"
+_ALIGN = 64
+
+_HEADER_DTYPE = np.dtype( [
+    ( "magic", "S8" ),
+    ( "published", "<u8" ),  # Number of frames published
+    ( "closed", "<u4" ),  # Set when the publisher is closed
+    ( "width", "<u4" ),
+    ( "height", "<u4" ),
+    ( "slots", "<u4" ),
+    ( "slotSize", "<u8" ),
+    ( "family", "<u4" ),  # Notification socket: 1 Unix-domain, 2 TCP
+    ( "port", "<u4" ),
+    ( "address", "S200" ),
+    ( "tracker", "<u8" ),  # Resource tracker of the publisher, see _tracker_id
+    ] )
+
+_SLOT_DTYPE = np.dtype( [
+    ( "seq", "<u8" ),  # 2 * frame + 1 while written, 2 * frame + 2 when complete
+    ( "timeStamp", "<u4" ),
+    ( "IMUSamples", "<u4" ),
+    ( "ledSeqTag", "u1" ),
+    ( "IMUPresent", "u1" ),
+    ] )
+
+_UNIX = 1
+_TCP = 2
+
+_IMU_OFFSET = DUOFrame.IMUData.offset
+_IMU_SIZE = DUO_MAX_IMU_SAMPLES * ct.sizeof( DUOIMUSample )
+
+def _aligned( size ):
+    return ( size + _ALIGN - 1 ) // _ALIGN * _ALIGN
+
+def _layout( width, height ):
+    """
+    @return: tuple(slot size, left offset, right offset, IMU offset) in bytes
+    """
+    image = _aligned( width * height )
+    left = _aligned( _SLOT_DTYPE.itemsize )
+    right = left + image
+    imu = right + image
+    return _aligned( imu + _IMU_SIZE ), left, right, imu
+
+def _tracker_id():
+    """
+    Identifies the multiprocessing resource tracker of this process (processes
+    started by multiprocessing share their parent's): inode of its pipe, 0 if none
+    """
+    if os.name == "nt":
+        return 0
+    from multiprocessing import resource_tracker
+    try:
+        return os.fstat( resource_tracker.getfd() ).st_ino
+    except OSError:
+        return 0
+
+def _attach( name ):
+    """
+    Attaches to an existing block without leaving it registered with the
+    resource tracker (which would unlink it when this process exits).
+    A tracker shared with the publisher keeps the publisher's registration.
+    """
+    if sys.version_info >= ( 3, 13 ):
+        return shared_memory.SharedMemory( name, track = False )
+    shm = shared_memory.SharedMemory( name )
+    if os.name == "nt":
+        return shm
+    tracker = 0
+    if shm.size >= _HEADER_DTYPE.itemsize:
+        header = np.ndarray( (), _HEADER_DTYPE, shm.buf )
+        if header["magic"].item() == _MAGIC:
+            tracker = int( header["tracker"] )
+        del header
+    if not tracker or tracker != _tracker_id():
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister( shm._name, "shared_memory" )
+    return shm
+
+class DUOSharedFrame( object ):
+    """
+    Frame stored in a shared slot (zero-copy views, same attributes as DUOFrameSlot).
+    Valid until the publisher reuses the slot, see DUOSharedSubscriber.valid
+    """
+
+    def __init__( self, index, width, height, left, right, imu ):
+        self.index = index
+        self.seq = -1
+        self.width = width
+        self.height = height
+        self.timeStamp = 0
+        self.ledSeqTag = 0
+        self.IMUPresent = False
+        self.IMUSamples = 0
+        self.left = left
+        self.right = right
+        self._imu = imu
+
+    @property
+    def imu( self ):
+        """
+        Valid IMU samples as a DUO_IMU_DTYPE structured array (view of the slot)
+        """
+        return self._imu[:self.IMUSamples]
+
+class _SharedRing( object ):
+    """
+    NumPy views of the shared memory block
+    """
+
+    def _map( self, shm, width, height, slots ):
+        self.shm = shm
+        self.width = width
+        self.height = height
+        self.slots = slots
+        slotSize, left, right, imu = _layout( width, height )
+        self.slotSize = slotSize
+        buf = shm.buf
+        data = _aligned( _HEADER_DTYPE.itemsize )
+        self._header = np.ndarray( (), _HEADER_DTYPE, buf )
+        self._meta = np.ndarray( slots, _SLOT_DTYPE, buf, data, ( slotSize, ) )
+        self._seq = self._meta["seq"]
+        self._timeStamp = self._meta["timeStamp"]
+        self._IMUSamples = self._meta["IMUSamples"]
+        self._ledSeqTag = self._meta["ledSeqTag"]
+        self._IMUPresent = self._meta["IMUPresent"]
+        self.frames = []
+        for i in range( slots ):
+            base = data + i * slotSize
+            self.frames.append( DUOSharedFrame(
+                i, width, height,
+                np.ndarray( ( height, width ), np.uint8, buf, base + left ),
+                np.ndarray( ( height, width ), np.uint8, buf, base + right ),
+                np.ndarray( DUO_MAX_IMU_SAMPLES, DUO_IMU_DTYPE, buf, base + imu ) ) )
+        self._addresses = [ ( f.left.ctypes.data, f.right.ctypes.data, f._imu.ctypes.data )
+                            for f in self.frames ]
+
+    def _unmap( self ):
+        # The views must be released before the block is closed
+        self._header = self._meta = self._seq = None
+        self._timeStamp = self._IMUSamples = self._ledSeqTag = self._IMUPresent = None
+        self.frames = []
+        self._addresses = []
+        try:
+            self.shm.close()
+        except BufferError:  # Frames still referenced by the caller
+            pass
+
+    @staticmethod
+    def _size( width, height, slots ):
+        return _aligned( _HEADER_DTYPE.itemsize ) + slots * _layout( width, height )[0]
+
+class DUOSharedPublisher( _SharedRing ):
+    """
+    Writes frames into a named shared memory ring
+    """
+
+    def __init__( self, name, width, height, slots = 8 ):
+        """
+        @param name: shared memory block name (None for a random one, see name)
+        @param width: frame width (as set with SetDUOResolutionInfo)
+        @param height: frame height
+        @param slots: ring slots, subscribers may lag up to slots - 1 frames
+        """
+        if slots < 2:
+            raise ValueError( "DUOSharedPublisher needs at least 2 slots" )
+        shm = shared_memory.SharedMemory( name, create = True,
+                                          size = self._size( width, height, slots ) )
+        self.name = shm.name
+        self._map( shm, width, height, slots )
+        self._seq[:] = 0
+        self._imageSize = width * height
+        self._published = 0
+        self._lock = threading.Lock()
+        self._clients = []
+        self._closed = False
+
+        header = self._header
+        header["width"] = width
+        header["height"] = height
+        header["slots"] = slots
+        header["slotSize"] = self.slotSize
+        header["published"] = 0
+        header["closed"] = 0
+        header["tracker"] = _tracker_id()
+        self._listener = self._listen()
+        header["magic"] = _MAGIC
+
+        self._acceptor = threading.Thread( target = self._accept, name = "DUOSharedPublisher" )
+        self._acceptor.daemon = True
+        self._acceptor.start()
+
+        # Keep the reference, ctypes callbacks must outlive the capture
+        self.callback = DUOFrameCallback( self._callback )
+
+    def _listen( self ):
+        header = self._header
+        if hasattr( socket, "AF_UNIX" ) and os.name != "nt":
+            path = os.path.join( tempfile.gettempdir(), "duo3d-%s.sock" % self.name.lstrip( "/" ) )
+            if os.path.exists( path ):
+                os.unlink( path )
+            listener = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+            listener.bind( path )
+            header["family"] = _UNIX
+            header["address"] = path.encode( sys.getfilesystemencoding() )
+            self._path = path
+        else:
+            listener = socket.socket( socket.AF_INET, socket.SOCK_STREAM )
+            listener.bind( ( "127.0.0.1", 0 ) )
+            header["family"] = _TCP
+            header["port"] = listener.getsockname()[1]
+            self._path = None
+        listener.listen( 16 )
+        return listener
+
+    def _accept( self ):
+        while True:
+            try:
+                client, address = self._listener.accept()
+            except OSError:  # Closed
+                return
+            client.setblocking( False )
+            with self._lock:
+                if self._closed:
+                    client.close()
+                    return
+                self._clients.append( client )
+
+    @property
+    def published( self ):
+        """
+        Number of frames published
+        """
+        return self._published
+
+    @property
+    def subscribers( self ):
+        """
+        Number of subscribers waiting for notifications
+        """
+        return len( self._clients )
+
+    def _callback( self, pFrameData, pUserData ):
+        # DUO capture thread
+        self.publish( pFrameData.contents )
+
+    def publish( self, frame ):
+        """
+        Copies a frame into the next slot and wakes up the subscribers
+
+        @param frame: DUOFrame, PDUOFrame or frame with left / right arrays and imu
+                      (DUOFrameSlot, played back frames)
+        @return: number of the published frame, None if its size does not match
+        """
+        if isinstance( frame, ct._Pointer ):
+            frame = frame.contents
+        n = self._published
+        index = n % self.slots
+        if isinstance( frame, DUOFrame ):
+            if frame.width * frame.height != self._imageSize:
+                return None
+            samples = min( frame.IMUSamples, DUO_MAX_IMU_SAMPLES )
+            left, right, imu = self._addresses[index]
+            self._seq[index] = 2 * n + 1
+            ct.memmove( left, frame.leftData, self._imageSize )
+            ct.memmove( right, frame.rightData, self._imageSize )
+            if samples:
+                ct.memmove( imu, ct.addressof( frame ) + _IMU_OFFSET, samples * DUO_IMU_DTYPE.itemsize )
+        else:
+            if frame.left.size != self._imageSize:
+                return None
+            slot = self.frames[index]
+            samples = len( frame.imu )
+            self._seq[index] = 2 * n + 1
+            np.copyto( slot.left, frame.left )
+            np.copyto( slot.right, frame.right )
+            slot._imu[:samples] = frame.imu
+        self._timeStamp[index] = frame.timeStamp
+        self._IMUSamples[index] = samples
+        self._ledSeqTag[index] = frame.ledSeqTag
+        self._IMUPresent[index] = bool( frame.IMUPresent )
+        self._seq[index] = 2 * n + 2
+        self._published = n + 1
+        self._header["published"] = n + 1
+        self._notify()
+        return n
+
+    def _notify( self ):
+        if not self._clients:
+            return
+        with self._lock:
+            clients = self._clients
+            for client in list( clients ):
+                try:
+                    client.send( b"\0" )
+                except ( BlockingIOError, InterruptedError ):
+                    pass  # The subscriber has unread wakeups, it will see the frame
+                except OSError:
+                    clients.remove( client )
+                    client.close()
+
+    def close( self ):
+        """
+        Marks the ring closed, wakes up the subscribers and unlinks the shared memory
+        (attached subscribers keep their mapping until they close)
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._header["closed"] = 1
+            for client in self._clients:
+                client.close()
+            self._clients = []
+        try:
+            self._listener.shutdown( socket.SHUT_RDWR )  # Wakes up accept()
+        except OSError:
+            pass
+        self._listener.close()
+        if self._path is not None and os.path.exists( self._path ):
+            os.unlink( self._path )
+        self._acceptor.join()
+        shm = self.shm
+        self._unmap()
+        shm.unlink()
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, exc_type, exc, tb ):
+        self.close()
+
+class DUOSharedSubscriber( _SharedRing ):
+    """
+    Reads frames of a DUOSharedPublisher from another process
+    """
+
+    def __init__( self, name, oldest = False ):
+        """
+        @param name: name of the publisher's shared memory block
+        @param oldest: start with the oldest frame still in the ring
+                       (with the next published frame by default)
+        """
+        shm = _attach( name )
+        header = np.ndarray( (), _HEADER_DTYPE, shm.buf )
+        if header["magic"].item() != _MAGIC:
+            del header
+            shm.close()
+            raise ValueError( "%s is not a DUO shared frame ring" % name )
+        width, height, slots = int( header["width"] ), int( header["height"] ), int( header["slots"] )
+        family, address, port = int( header["family"] ), header["address"].item(), int( header["port"] )
+        del header
+        self.name = name
+        self._map( shm, width, height, slots )
+
+        self.lost = 0  # Frames overwritten before this subscriber read them
+        published = int( self._header["published"] )
+        self._next = max( 0, published - slots + 1 ) if oldest else published
+
+        if family == _UNIX:
+            self._socket = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+            self._socket.connect( address.decode( sys.getfilesystemencoding() ) )
+        else:
+            self._socket = socket.create_connection( ( "127.0.0.1", port ) )
+        self._socket.setblocking( False )
+        self._eof = False
+
+    @property
+    def closed( self ):
+        """
+        True once the publisher is closed
+        """
+        return self._header is None or bool( self._header["closed"] )
+
+    def pending( self ):
+        """
+        Returns the number of published frames not read yet (including lost ones)
+        """
+        return int( self._header["published"] ) - self._next
+
+    def _read( self, n ):
+        """
+        Fills the frame of slot n % slots if it still holds frame n
+        """
+        index = n % self.slots
+        expected = 2 * n + 2
+        if self._seq[index] != expected:
+            return None
+        frame = self.frames[index]
+        frame.timeStamp = int( self._timeStamp[index] )
+        frame.IMUSamples = int( self._IMUSamples[index] )
+        frame.ledSeqTag = int( self._ledSeqTag[index] )
+        frame.IMUPresent = bool( self._IMUPresent[index] )
+        frame.seq = n
+        if self._seq[index] != expected:
+            return None
+        return frame
+
+    def valid( self, frame ):
+        """
+        Returns True if the publisher did not start overwriting the frame's slot
+        (call after processing the zero-copy views)
+        """
+        return self._seq[frame.index] == 2 * frame.seq + 2
+
+    def _wait( self, timeout ):
+        """
+        Sleeps until the publisher sends a wakeup
+        """
+        if self._eof:
+            return False
+        try:
+            ready = select.select( [ self._socket ], [], [], timeout )[0]
+        except ( OSError, ValueError ):
+            return False
+        if ready:
+            try:
+                if not self._socket.recv( 4096 ):
+                    self._eof = True
+            except ( BlockingIOError, InterruptedError ):
+                pass
+            except OSError:
+                self._eof = True
+        return True
+
+    def get( self, timeout = None ):
+        """
+        Returns the next frame, waiting for it if necessary.
+        Frames overwritten before they were read are skipped (see lost).
+
+        @param timeout: seconds to wait, None waits forever
+        @return: DUOSharedFrame, or None on timeout / when the publisher is closed
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            published = int( self._header["published"] )
+            if published > self._next:
+                oldest = published - self.slots + 1
+                if self._next < oldest:
+                    self.lost += oldest - self._next
+                    self._next = oldest
+                frame = self._read( self._next )
+                self._next += 1
+                if frame is not None:
+                    return frame
+                self.lost += 1
+                continue
+            if self.closed:
+                return None
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return None
+            if not self._wait( remaining ):
+                return None
+
+    def latest( self, timeout = 0 ):
+        """
+        Returns the most recent frame, skipping the older unread ones (counted in lost)
+
+        @param timeout: seconds to wait for a new frame, None waits forever
+        @return: DUOSharedFrame, or None if there is no new frame
+        """
+        published = int( self._header["published"] )
+        if published - 1 > self._next:
+            self.lost += published - 1 - self._next
+            self._next = published - 1
+        return self.get( timeout )
+
+    def close( self ):
+        """
+        Detaches from the shared memory (the frames returned so far become invalid)
+        """
+        if self._header is None:
+            return
+        self._socket.close()
+        self._unmap()
+
+    def __iter__( self ):
+        """
+        Yields frames until the publisher is closed
+        """
+        while True:
+            frame = self.get()
+            if frame is None:
+                return
+            yield frame
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, exc_type, exc, tb ):
+        self.close()
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.snapshot
+
+    @brief: Compact frame snapshots for in-memory frame buffers
+
+    A copy of DUOFrame always carries DUO_MAX_IMU_SAMPLES IMU samples and a
+    ctypes structure per frame. DUOFrameSnapshot is a __slots__ object with
+    the frame metadata, pooled image buffers and only the IMUSamples valid
+    IMU rows:
+
+        pool = DUOSnapshotPool( width, height )
+        frames = collections.deque()
+        def onFrame( pFrameData, pUserData ):
+            # Rolling buffer: the oldest snapshot's storage is reused
+            old = frames.popleft() if len( frames ) == maxFrames else None
+            frames.append( pool.snapshot( pFrameData, out = old ) )
+
+    The images of the pool are allocated in blocks (one array per blockSize
+    frames) and handed out as views; release() returns them to the pool.
+    snapshot_many() snapshots a batch of frames reusing a list of snapshots.
+"""
+
+import ctypes as ct
+import threading
+
+import numpy as np
+
+from .duo3d import DUOFrame, DUO_MAX_IMU_SAMPLES
+from .frame import DUO_IMU_DTYPE
+
+__all__ = [
+    "DUOFrameSnapshot", "DUOSnapshotPool",
+    ]
+
+_IMU_OFFSET = DUOFrame.IMUData.offset
+_EMPTY_IMU = np.empty( 0, DUO_IMU_DTYPE )
+
+class DUOFrameSnapshot( object ):
+    """
+    Frame kept beyond the capture callback (same attributes as DUOFrameSlot)
+    """
+    __slots__ = ( "width", "height", "seq", "timeStamp", "ledSeqTag", "IMUPresent",
+                  "left", "right", "imu", "_imuStorage" )
+
+    def __init__( self, width, height, left, right ):
+        self.width = width
+        self.height = height
+        self.seq = -1
+        self.timeStamp = 0
+        self.ledSeqTag = 0
+        self.IMUPresent = False
+        self.left = left
+        self.right = right
+        self.imu = _EMPTY_IMU  # Valid IMU samples only (DUO_IMU_DTYPE)
+        self._imuStorage = _EMPTY_IMU
+
+    @property
+    def IMUSamples( self ):
+        return len( self.imu )
+
+    @property
+    def nbytes( self ):
+        """
+        Bytes of image and IMU data held by the snapshot
+        """
+        return self.left.nbytes + self.right.nbytes + self._imuStorage.nbytes
+
+    def _imu_rows( self, samples ):
+        # Reuses the IMU storage of the snapshot when it is large enough
+        if samples > len( self._imuStorage ):
+            self._imuStorage = np.empty( samples, DUO_IMU_DTYPE )
+        self.imu = self._imuStorage[:samples]
+        return self.imu
+
+class DUOSnapshotPool( object ):
+    """
+    Creates DUOFrameSnapshot objects with pooled image buffers
+    """
+
+    def __init__( self, width, height, blockSize = 16, maxFrames = None ):
+        """
+        @param width: frame width
+        @param height: frame height
+        @param blockSize: image pairs allocated at once
+        @param maxFrames: maximum number of snapshots alive (unlimited if None)
+        """
+        self.width = width
+        self.height = height
+        self.blockSize = blockSize
+        self.maxFrames = maxFrames
+        self.allocated = 0  # Image pairs allocated
+        self.exhausted = 0  # Snapshots refused because of maxFrames
+        self._free = []
+        self._lock = threading.Lock()
+        self._imageSize = width * height
+
+    @property
+    def available( self ):
+        """
+        Number of allocated image pairs not in use
+        """
+        return len( self._free )
+
+    def _grow( self ):
+        # Must be called with the lock held
+        count = self.blockSize
+        if self.maxFrames is not None:
+            count = min( count, self.maxFrames - self.allocated )
+        if count <= 0:
+            return False
+        block = np.empty( ( count, 2, self.height, self.width ), np.uint8 )
+        self._free.extend( ( block[i, 0], block[i, 1] ) for i in range( count - 1, -1, -1 ) )
+        self.allocated += count
+        return True
+
+    def _acquire( self ):
+        with self._lock:
+            if not self._free and not self._grow():
+                self.exhausted += 1
+                return None
+            return self._free.pop()
+
+    def release( self, snapshot ):
+        """
+        Returns the image buffers of a snapshot to the pool (the snapshot must not be used anymore)
+        """
+        if snapshot.left is None:
+            return
+        with self._lock:
+            self._free.append( ( snapshot.left, snapshot.right ) )
+        snapshot.left = snapshot.right = None
+        snapshot.imu = _EMPTY_IMU
+
+    def snapshot( self, frame, out = None ):
+        """
+        Copies a frame into a snapshot
+
+        @param frame: DUOFrame, PDUOFrame or frame with left / right arrays and imu
+                      (DUOFrameSlot, DUOSharedFrame, DUOFrameSnapshot...)
+        @param out: snapshot of this pool to reuse (its previous content is overwritten)
+        @return: DUOFrameSnapshot, None if the pool is exhausted (see maxFrames)
+        """
+        if isinstance( frame, ct._Pointer ):
+            frame = frame.contents
+        native = isinstance( frame, DUOFrame )
+        # Checked before an image pair is taken from the pool
+        size = frame.width * frame.height if native else np.size( frame.left )
+        if size != self._imageSize:
+            raise ValueError( "frame is %dx%d, pool is %dx%d" % ( frame.width, frame.height,
+                                                                 self.width, self.height ) )
+        if out is None or out.left is None:
+            images = self._acquire()
+            if images is None:
+                return None
+            if out is None:
+                out = DUOFrameSnapshot( self.width, self.height, images[0], images[1] )
+            else:
+                out.left, out.right = images
+        if native:
+            ct.memmove( out.left.ctypes.data, frame.leftData, self._imageSize )
+            ct.memmove( out.right.ctypes.data, frame.rightData, self._imageSize )
+            samples = min( frame.IMUSamples, DUO_MAX_IMU_SAMPLES )
+            imu = out._imu_rows( samples )
+            if samples:
+                ct.memmove( imu.ctypes.data, ct.addressof( frame ) + _IMU_OFFSET,
+                            samples * DUO_IMU_DTYPE.itemsize )
+            out.seq = -1
+        else:
+            np.copyto( out.left, frame.left )
+            np.copyto( out.right, frame.right )
+            source = frame.imu
+            out._imu_rows( len( source ) )[...] = source
+            out.seq = getattr( frame, "seq", -1 )
+        out.timeStamp = frame.timeStamp
+        out.ledSeqTag = frame.ledSeqTag
+        out.IMUPresent = bool( frame.IMUPresent )
+        return out
+
+    def snapshot_many( self, frames, out = None ):
+        """
+        Snapshots a batch of frames, reusing the given snapshots' storage first
+
+        @param frames: iterable of frames accepted by snapshot()
+        @param out: optional list of snapshots of this pool to reuse; snapshots left
+                    over are released, missing ones are created
+        @return: list of DUOFrameSnapshot (stops early if the pool is exhausted)
+        """
+        reuse = list( out ) if out is not None else []
+        reuse.reverse()
+        result = []
+        for frame in frames:
+            snapshot = self.snapshot( frame, reuse.pop() if reuse else None )
+            if snapshot is None:
+                break
+            result.append( snapshot )
+        for snapshot in reuse:
+            self.release( snapshot )
+        return result
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.stream
+
+    @brief: asyncio frame stream on top of StartDUO
+
+    Usage:
+        async for frame in DUOStream( duo, resolution ):
+            process( frame.left, frame.right )
+
+    Frames are copied on the DUO capture thread into a bounded DUOFrameRing
+    (the oldest unread frame is overwritten when the consumer is too slow),
+    and the event loop is woken up with a single call_soon_threadsafe per
+    batch of frames, not per frame. The device is stopped (and closed, if
+    the stream opened it) when the async with block exits, or when the
+    iteration ends or is cancelled:
+
+        async with DUOStream( duo, resolution ) as stream:
+            async for frame in stream:
+                ...
+
+    Without async with, a cancelled iteration stops the device once the
+    event loop finalizes the abandoned async generator.
+"""
+
+import asyncio
+
+from .duo3d import (CloseDUO, OpenDUO, SetDUOResolutionInfo, StartDUO, StopDUO,
+                    DUOFrameCallback)
+from .capture import DUOFrameRing, DUO_RING_OVERWRITE_OLDEST
+
+__all__ = [
+    "DUOStream",
+    ]
+
+class DUOStream( object ):
+    """
+    Asynchronous iterator over DUO frames.
+
+    The yielded DUOFrameSlot is valid until the next frame is requested.
+    """
+
+    def __init__( self, duo, resolution, maxsize = 1, masterMode = True ):
+        """
+        @param duo: DUOInstance, opened by the stream if not opened yet
+        @param resolution: DUOResolutionInfo (e.g. from EnumerateDUOResolutions)
+        @param maxsize: number of frames queued for the consumer, the oldest is overwritten when full
+        @param masterMode: passed to StartDUO
+        """
+        if maxsize < 1:
+            raise ValueError( "DUOStream maxsize must be at least 1" )
+        self.duo = duo
+        self.resolution = resolution
+        self.masterMode = masterMode
+        self.maxsize = maxsize
+        self.ring = self._create_ring()
+        self.callback = DUOFrameCallback( self._callback )
+
+        self._loop = None
+        self._event = None
+        self._wakeupPending = False
+        self._opened = False
+        self._running = False
+
+    def _create_ring( self ):
+        return DUOFrameRing( self.resolution.width, self.resolution.height, self.maxsize + 1,
+                             DUO_RING_OVERWRITE_OLDEST )
+
+    @property
+    def dropped( self ):
+        """
+        Number of frames overwritten before the consumer got them (since start)
+        """
+        return self.ring.overwritten + self.ring.dropped
+
+    def _callback( self, pFrameData, pUserData ):
+        # DUO capture thread
+        if not self.ring.push( pFrameData.contents ):
+            return
+        if not self._wakeupPending:
+            self._wakeupPending = True
+            try:
+                self._loop.call_soon_threadsafe( self._wakeup )
+            except RuntimeError:  # Event loop closed
+                pass
+
+    def _wakeup( self ):
+        # Event loop thread
+        self._wakeupPending = False
+        self._event.set()
+
+    def _open_and_start( self ):
+        if not self.duo:
+            if not OpenDUO( self.duo ):
+                raise IOError( "Could not open DUO camera" )
+            self._opened = True
+        error = None
+        if not SetDUOResolutionInfo( self.duo, self.resolution ):
+            error = "Could not set DUO resolution"
+        elif not StartDUO( self.duo, self.callback, None, self.masterMode ):
+            error = "Could not start DUO camera"
+        if error is not None:
+            if self._opened:
+                CloseDUO( self.duo )
+                self.duo.value = None
+                self._opened = False
+            raise IOError( error )
+
+    def _stop_and_close( self ):
+        StopDUO( self.duo )
+        if self._opened:
+            CloseDUO( self.duo )
+            self.duo.value = None
+            self._opened = False
+
+    async def start( self ):
+        """
+        Opens (if needed) and starts the DUO device
+        """
+        if self._running:
+            return
+        if self.ring.closed:  # Stopped before, frames of the previous run are discarded
+            self.ring = self._create_ring()
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+        await self._loop.run_in_executor( None, self._open_and_start )
+        self._running = True
+
+    async def stop( self ):
+        """
+        Stops the DUO device and closes it if it was opened by the stream
+        """
+        if not self._running:
+            return
+        self._running = False
+        try:
+            await self._loop.run_in_executor( None, self._stop_and_close )
+        finally:
+            self.ring.close()
+            self._event.set()
+
+    async def get( self ):
+        """
+        Returns the next frame, waiting for it if necessary.
+
+        @return: DUOFrameSlot, or None once the stream is stopped
+        """
+        ring = self.ring
+        event = self._event
+        while True:
+            slot = ring.get( 0 )
+            if slot is not None or not self._running:
+                return slot
+            event.clear()
+            await event.wait()
+
+    async def __aiter__( self ):
+        await self.start()
+        try:
+            while True:
+                slot = await self.get()
+                if slot is None:
+                    return
+                yield slot
+        finally:
+            await self.stop()
+
+    async def __aenter__( self ):
+        await self.start()
+        return self
+
+    async def __aexit__( self, exc_type, exc, tb ):
+        await self.stop()
@@ -0,0 +1,480 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.synthetic
+
+    @brief: Synthetic DUOLib stand-in for testing without hardware
+
+    SyntheticDUOLib implements the DUOLib functions used by duo3d.py with the
+    same arguments the wrappers pass to the shared library, so it can be
+    selected as the backend of all DUO API functions:
+
+        SetDUOBackend( SyntheticDUOLib( devices = 2, realtime = False ) )
+
+    or, for the default configuration, SetDUOBackend( "synthetic" ) or the
+    DUO3D_BACKEND=synthetic environment variable.
+
+    StartDUO invokes the frame callback from a background thread at the fps
+    set with SetDUOResolutionInfo (any rate, including the ones the hardware
+    does not support). Images are a random texture seen by the left and right
+    camera with a constant disparity, moving horizontally from frame to frame.
+    In real-time mode the generator skips frames it could not deliver in time
+    (like the device does), which shows up as gaps in DUOFrame.timeStamp.
+
+    Devices started with masterMode = False behave like slaves on a sync
+    cable: they wait for a running master and capture on its frame clock,
+    while their timeStamp counts from their own start.
+"""
+
+import ctypes as ct
+import math
+import threading
+import time
+
+import numpy as np
+
+from .duo3d import (DUOFrame, DUOResolutionInfo,
+                    DUO_BIN_ANY, DUO_BIN_NONE, DUO_BIN_HORIZONTAL2, DUO_BIN_HORIZONTAL4,
+                    DUO_BIN_VERTICAL2, DUO_BIN_VERTICAL4, DUO_ACCEL_2G, DUO_GYRO_250,
+                    DUO_MAX_IMU_SAMPLES)
+from .frame import DUO_IMU_DTYPE
+
+__all__ = [
+    "SyntheticDUOLib",
+    ]
+
+_SENSOR_WIDTH = 752
+_SENSOR_HEIGHT = 480
+
+# Binning modes and their (horizontal, vertical) factors
+_BINNINGS = [
+    ( DUO_BIN_NONE, 1, 1 ),
+    ( DUO_BIN_HORIZONTAL2, 2, 1 ),
+    ( DUO_BIN_VERTICAL2, 1, 2 ),
+    ( DUO_BIN_HORIZONTAL2 + DUO_BIN_VERTICAL2, 2, 2 ),
+    ( DUO_BIN_VERTICAL4, 1, 4 ),
+    ( DUO_BIN_HORIZONTAL2 + DUO_BIN_VERTICAL4, 2, 4 ),
+    ( DUO_BIN_HORIZONTAL4 + DUO_BIN_VERTICAL4, 4, 4 ),
+    ]
+
+# Frame sizes offered for every binning mode that can fit them
+_SIZES = [ ( 752, 480 ), ( 640, 480 ), ( 640, 360 ), ( 376, 240 ), ( 320, 240 ),
+           ( 376, 120 ), ( 320, 120 ), ( 188, 120 ), ( 160, 120 ) ]
+
+def _deref( arg ):
+    """
+    Returns the object passed with ct.byref (or the argument itself)
+    """
+    return getattr( arg, "_obj", arg )
+
+def _value( arg ):
+    """
+    Returns the Python value of the ctypes simple type (or the argument itself)
+    """
+    return getattr( arg, "value", arg )
+
+class _SyntheticDevice( object ):
+    """
+    State of a single synthetic DUO device
+    """
+
+    def __init__( self, index, serial ):
+        self.index = index
+        self.serial = serial
+        self.opened = False
+        self.resolution = DUOResolutionInfo( _SENSOR_WIDTH, _SENSOR_HEIGHT, DUO_BIN_NONE,
+                                             30.0, 1.0, 56.0 )
+        self.params = {
+            "exposure": 50.0, "exposureMS": 10.0, "autoExposure": False, "gain": 0.0,
+            "hflip": False, "vflip": False, "cameraSwap": False, "ledPWM": 0.0,
+            "undistort": False, "imuRate": 100.0,
+            "accelRange": DUO_ACCEL_2G, "gyroRange": DUO_GYRO_250,
+            }
+        self.ledSeqSize = 0
+        self.thread = None
+        self.stopEvent = threading.Event()
+        self.masterMode = True
+        self.start = None  # Wall time of frame 0 while capturing
+        self.period = None
+        self.framesSent = 0
+        self.framesSkipped = 0
+
+class SyntheticDUOLib( object ):
+    """
+    DUOLib stand-in generating stereo images and IMU samples
+    """
+
+    def __init__( self, devices = 1, realtime = True, disparity = 8, motion = 2,
+                  seed = 0, fpsLimit = 56.0 ):
+        """
+        @param devices: number of synthetic devices OpenDUO can open
+        @param realtime: pace frames at the configured fps, otherwise deliver them as fast as possible
+        @param disparity: disparity (in pixels) between the left and right image
+        @param motion: horizontal texture motion in pixels per frame
+        @param seed: random seed of the image texture
+        @param fpsLimit: maximum fps of the full sensor resolution reported by EnumerateDUOResolutions
+                         (SetDUOResolutionInfo accepts any fps)
+        """
+        self.realtime = realtime
+        self.disparity = disparity
+        self.motion = motion
+        self.seed = seed
+        self.fpsLimit = fpsLimit
+        self.devices = [ _SyntheticDevice( i, "SYN%07d" % ( i + 1 ) ) for i in range( devices ) ]
+        self._lock = threading.Lock()
+
+    # Helpers
+    def _device( self, duo ):
+        handle = _value( duo )
+        if not handle or handle > len( self.devices ):
+            raise ValueError( "invalid synthetic DUOInstance: %r" % ( handle, ) )
+        return self.devices[handle - 1]
+
+    def _modes( self ):
+        # Every frame size that fits the binned sensor area, max fps scales with rows read out
+        modes = []
+        for binning, hf, vf in _BINNINGS:
+            area_w, area_h = _SENSOR_WIDTH // hf, _SENSOR_HEIGHT // vf
+            for w, h in _SIZES:
+                if w <= area_w and h <= area_h:
+                    max_fps = round( self.fpsLimit * _SENSOR_HEIGHT / float( h ), 1 )
+                    modes.append( ( w, h, binning, 1.0, max_fps ) )
+        return modes
+
+    def calibration( self, width, height ):
+        """
+        Returns synthetic (fx, cx, cy, baseline in mm) for the given frame size
+        """
+        fx = 380.0 * width / float( _SENSOR_WIDTH )
+        return ( fx, width / 2.0, height / 2.0, 30.0 )
+
+    # DUO API
+    def GetDUOLibVersion( self ):
+        return b"1.0.0.0-synthetic"
+
+    def EnumerateDUOResolutions( self, resList, resListSize, width, height, binning, fps ):
+        res_list = _deref( resList )
+        if isinstance( res_list, DUOResolutionInfo ):
+            res_list = [ res_list ]
+        found = 0
+        for w, h, b, min_fps, max_fps in self._modes():
+            if found >= min( resListSize, len( res_list ) ):
+                break
+            if ( width != -1 and w != width ) or ( height != -1 and h != height ):
+                continue
+            if binning != DUO_BIN_ANY and b != binning:
+                continue
+            if fps > max_fps or 0 < fps < min_fps:
+                continue
+            ri = res_list[found]
+            ri.width, ri.height, ri.binning = w, h, b
+            ri.fps = fps if fps > 0 else max_fps
+            ri.minFps, ri.maxFps = min_fps, max_fps
+            found += 1
+        return found
+
+    def OpenDUO( self, duo ):
+        with self._lock:
+            for dev in self.devices:
+                if not dev.opened:
+                    dev.opened = True
+                    _deref( duo ).value = dev.index + 1
+                    return True
+        return False
+
+    def CloseDUO( self, duo ):
+        dev = self._device( duo )
+        self.StopDUO( duo )
+        dev.opened = False
+        return True
+
+    def StartDUO( self, duo, frameCallback, pUserData, masterMode ):
+        dev = self._device( duo )
+        if dev.thread is not None:
+            return False
+        dev.masterMode = bool( _value( masterMode ) )
+        dev.stopEvent.clear()
+        dev.thread = threading.Thread( target = self._capture,
+                                       args = ( dev, frameCallback, pUserData ),
+                                       name = "SyntheticDUO-%d" % dev.index )
+        dev.thread.daemon = True
+        dev.thread.start()
+        return True
+
+    def StopDUO( self, duo ):
+        dev = self._device( duo )
+        thread, dev.thread = dev.thread, None
+        if thread is not None:
+            dev.stopEvent.set()
+            if thread is not threading.current_thread():
+                thread.join()
+        return True
+
+    def _string( self, val, text ):
+        _deref( val ).value = text
+        return True
+
+    def GetDUODeviceName( self, duo, val ):
+        return self._string( val, b"DUO MLX (synthetic)" )
+
+    def GetDUOSerialNumber( self, duo, val ):
+        return self._string( val, self._device( duo ).serial.encode( "ascii" ) )
+
+    def GetDUOFirmwareVersion( self, duo, val ):
+        return self._string( val, b"1.0.0.0" )
+
+    def GetDUOFirmwareBuild( self, duo, val ):
+        return self._string( val, b"synthetic" )
+
+    def GetDUOResolutionInfo( self, duo, val ):
+        ct.pointer( _deref( val ) )[0] = self._device( duo ).resolution
+        return True
+
+    def GetDUOFrameDimension( self, duo, w, h ):
+        ri = self._device( duo ).resolution
+        _deref( w ).value = ri.width
+        _deref( h ).value = ri.height
+        return True
+
+    def _get( self, duo, name, val ):
+        _deref( val ).value = self._device( duo ).params[name]
+        return True
+
+    def _set( self, duo, name, val ):
+        self._device( duo ).params[name] = _value( val )
+        return True
+
+    def GetDUOExposure( self, duo, val ):
+        return self._get( duo, "exposure", val )
+
+    def GetDUOExposureMS( self, duo, val ):
+        return self._get( duo, "exposureMS", val )
+
+    def GetDUOAutoExposure( self, duo, val ):
+        return self._get( duo, "autoExposure", val )
+
+    def GetDUOGain( self, duo, val ):
+        return self._get( duo, "gain", val )
+
+    def GetDUOHFlip( self, duo, val ):
+        return self._get( duo, "hflip", val )
+
+    def GetDUOVFlip( self, duo, val ):
+        return self._get( duo, "vflip", val )
+
+    def GetDUOCameraSwap( self, duo, val ):
+        return self._get( duo, "cameraSwap", val )
+
+    def GetDUOLedPWM( self, duo, val ):
+        return self._get( duo, "ledPWM", val )
+
+    def GetDUOUndistort( self, duo, val ):
+        return self._get( duo, "undistort", val )
+
+    def GetDUOCalibrationPresent( self, duo, val ):
+        _deref( val ).value = True
+        return True
+
+    def _fov( self, duo, val ):
+        ri = self._device( duo ).resolution
+        fx, cx, cy, baseline = self.calibration( ri.width, ri.height )
+        hfov = math.degrees( 2 * math.atan( ri.width / ( 2 * fx ) ) )
+        vfov = math.degrees( 2 * math.atan( ri.height / ( 2 * fx ) ) )
+        val[0], val[1], val[2], val[3] = hfov, vfov, hfov, vfov
+        return True
+
+    def GetDUOFOV( self, duo, val ):
+        return self._fov( duo, val )
+
+    def GetDUORectifiedFOV( self, duo, val ):
+        return self._fov( duo, val )
+
+    def GetDUOIntrinsics( self, duo, val ):
+        intr = _deref( val )
+        ri = self._device( duo ).resolution
+        fx, cx, cy, baseline = self.calibration( ri.width, ri.height )
+        intr.width, intr.height = ri.width, ri.height
+        for cam in ( intr.left, intr.right ):
+            ct.memset( ct.addressof( cam ), 0, ct.sizeof( cam ) )
+            cam.fx, cam.fy, cam.cx, cam.cy = fx, fx, cx, cy
+        return True
+
+    def GetDUOExtrinsics( self, duo, val ):
+        extr = _deref( val )
+        fx, cx, cy, baseline = self.calibration( 1, 1 )
+        extr.rotation[:] = [ 1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0 ]
+        extr.translation[:] = [ -baseline, 0.0, 0.0 ]
+        return True
+
+    def GetDUOStereoParameters( self, duo, val ):
+        stereo = _deref( val )
+        ri = self._device( duo ).resolution
+        fx, cx, cy, baseline = self.calibration( ri.width, ri.height )
+        ct.memset( ct.addressof( stereo ), 0, ct.sizeof( stereo ) )
+        identity = [ 1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0 ]
+        camera = [ fx, 0.0, cx, 0.0, fx, cy, 0.0, 0.0, 1.0 ]
+        stereo.M1[:] = camera
+        stereo.M2[:] = camera
+        stereo.R[:] = identity
+        stereo.T[:] = [ -baseline, 0.0, 0.0 ]
+        stereo.R1[:] = identity
+        stereo.R2[:] = identity
+        stereo.P1[:] = [ fx, 0.0, cx, 0.0, 0.0, fx, cy, 0.0, 0.0, 0.0, 1.0, 0.0 ]
+        stereo.P2[:] = [ fx, 0.0, cx, -fx * baseline, 0.0, fx, cy, 0.0, 0.0, 0.0, 1.0, 0.0 ]
+        stereo.Q[:] = [ 1.0, 0.0, 0.0, -cx,
+                        0.0, 1.0, 0.0, -cy,
+                        0.0, 0.0, 0.0, fx,
+                        0.0, 0.0, 1.0 / baseline, 0.0 ]
+        return True
+
+    def GetDUOIMURange( self, duo, accel, gyro ):
+        params = self._device( duo ).params
+        _deref( accel ).value = params["accelRange"]
+        _deref( gyro ).value = params["gyroRange"]
+        return True
+
+    def SetDUOResolutionInfo( self, duo, res_info ):
+        dev = self._device( duo )
+        if dev.thread is not None or res_info.width <= 0 or res_info.height <= 0 or res_info.fps <= 0:
+            return False
+        ct.pointer( dev.resolution )[0] = res_info
+        return True
+
+    def SetDUOExposure( self, duo, val ):
+        return self._set( duo, "exposure", val )
+
+    def SetDUOExposureMS( self, duo, val ):
+        return self._set( duo, "exposureMS", val )
+
+    def SetDUOAutoExposure( self, duo, val ):
+        return self._set( duo, "autoExposure", val )
+
+    def SetDUOGain( self, duo, val ):
+        return self._set( duo, "gain", val )
+
+    def SetDUOHFlip( self, duo, val ):
+        return self._set( duo, "hflip", val )
+
+    def SetDUOVFlip( self, duo, val ):
+        return self._set( duo, "vflip", val )
+
+    def SetDUOCameraSwap( self, duo, val ):
+        return self._set( duo, "cameraSwap", val )
+
+    def SetDUOLedPWM( self, duo, val ):
+        return self._set( duo, "ledPWM", val )
+
+    def SetDUOLedPWMSeq( self, duo, val, size ):
+        self._device( duo ).ledSeqSize = _value( size )
+        return True
+
+    def SetDUOUndistort( self, duo, val ):
+        return self._set( duo, "undistort", val )
+
+    def SetDUOIMURange( self, duo, accel, gyro ):
+        self._set( duo, "accelRange", accel )
+        return self._set( duo, "gyroRange", gyro )
+
+    def SetDUOIMURate( self, duo, rate ):
+        rate = _value( rate )
+        if not 50 <= rate <= 500:
+            return False
+        return self._set( duo, "imuRate", rate )
+
+    def _master_clock( self, dev ):
+        """
+        Waits for a running master device
+
+        @return: tuple(start, period) of the next master frame, None if stopped
+        """
+        while not dev.stopEvent.is_set():
+            for master in self.devices:
+                start, period = master.start, master.period
+                if master is not dev and master.masterMode and start is not None:
+                    k = max( 0, int( math.ceil( ( time.time() - start ) / period ) ) )
+                    return start + k * period, period
+            dev.stopEvent.wait( 0.001 )
+        return None
+
+    # Frame generator
+    def _capture( self, dev, frameCallback, pUserData ):
+        try:
+            self._generate( dev, frameCallback, pUserData )
+        finally:
+            dev.start = dev.period = None
+
+    def _generate( self, dev, frameCallback, pUserData ):
+        ri = dev.resolution
+        width, height, fps = ri.width, ri.height, ri.fps
+        period = 1.0 / fps
+        start = time.time()
+        if self.realtime and not dev.masterMode:
+            clock = self._master_clock( dev )
+            if clock is None:
+                return
+            start, period = clock
+        imu_rate = dev.params["imuRate"]
+        disparity = self.disparity
+
+        texture = np.random.RandomState( self.seed + dev.index ).randint(
+            0, 256, ( height, 2 * width + disparity ) ).astype( np.uint8 )
+        left = np.empty( ( height, width ), np.uint8 )
+        right = np.empty( ( height, width ), np.uint8 )
+
+        frame = DUOFrame()
+        frame.width, frame.height = width, height
+        frame.leftData = left.ctypes.data_as( ct.POINTER( ct.c_uint8 ) )
+        frame.rightData = right.ctypes.data_as( ct.POINTER( ct.c_uint8 ) )
+        frame.IMUPresent = 1
+        imu = np.frombuffer( frame.IMUData, DUO_IMU_DTYPE )
+        pFrame = ct.pointer( frame )
+        callback = frameCallback if frameCallback else None
+
+        stop = dev.stopEvent
+        realtime = self.realtime
+        dev.start, dev.period = start, period
+        index = 0
+        imu_next = 0
+        while not stop.is_set():
+            if realtime:
+                delay = start + index * period - time.time()
+                if delay > 0:
+                    if stop.wait( delay ):
+                        break
+                elif delay < -period:
+                    # Too late, skip the frames the device would have dropped
+                    skipped = int( -delay / period )
+                    index += skipped
+                    dev.framesSkipped += skipped
+
+            t = index * period
+            offset = int( index * self.motion ) % width
+            left[...] = texture[:, offset:offset + width]
+            right[...] = texture[:, offset + disparity:offset + disparity + width]
+            frame.timeStamp = int( round( t * 10000 ) ) & 0xFFFFFFFF
+            frame.ledSeqTag = index % dev.ledSeqSize if dev.ledSeqSize else 0
+
+            # IMU samples taken since the previous frame
+            imu_last = int( math.floor( t * imu_rate ) )
+            samples = max( 0, min( imu_last - imu_next + 1, DUO_MAX_IMU_SAMPLES ) )
+            if samples:
+                k = np.arange( imu_last - samples + 1, imu_last + 1 )
+                ts = k / imu_rate
+                phase = 2 * np.pi * 0.5 * ts
+                rows = imu[:samples]
+                rows["timeStamp"] = np.round( ts * 10000 ).astype( np.uint64 ) & 0xFFFFFFFF
+                rows["tempData"] = 30.0 + 0.1 * np.sin( phase )
+                accel = rows["accelData"]
+                accel[:, 0] = 0.05 * np.sin( phase )
+                accel[:, 1] = 0.05 * np.cos( phase )
+                accel[:, 2] = np.sqrt( 1.0 - accel[:, 0] ** 2 - accel[:, 1] ** 2 )
+                gyro = rows["gyroData"]
+                gyro[:, 0] = 10.0 * np.cos( phase )
+                gyro[:, 1] = -10.0 * np.sin( phase )
+                gyro[:, 2] = 5.0
+            frame.IMUSamples = samples
+            imu_next = imu_last + 1
+
+            if callback is not None:
+                callback( pFrame, pUserData )
+            dev.framesSent += 1
+            index += 1
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+"""@package duo3d.tracing
+
+    @brief: Opt-in latency tracing of the DUOLib calls
+
+    While enabled, every DUOLib function called by the duo3d.duo3d wrappers
+    is timed: call count, wall time distribution and return status (the bool
+    result the getters discard). The calls can be exported as a Chrome trace
+    (chrome://tracing, Perfetto):
+
+        with DUOCallTracer() as tracer:
+            SetDUOResolutionInfo( duo, ri )
+            SetDUOExposureMS( duo, 10 )
+        print( tracer.text() )
+        tracer.save_chrome_trace( "duo.json" )
+
+    Tracing replaces the functions bound by the DUOLib loader, so when it is
+    disabled the wrappers call the ctypes functions directly again and the
+    call path has no added cost.
+"""
+
+import bisect
+import collections
+import json
+import os
+import threading
+import time
+
+from . import duo3d as _duo3d
+
+__all__ = [
+    "DisableDUOTracing", "EnableDUOTracing", "GetDUOTracer", "DUOCallTracer",
+    ]
+
+# Upper bounds of the call duration histogram buckets in us, the last bucket is open
+_DURATION_US = ( 10, 100, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000 )
+
+_OK = "ok"
+_FAILED = "failed"
+_EXCEPTION = "exception"
+
+_activeLock = threading.Lock()
+_active = [ None ]
+
+def _status( result ):
+    # Most DUOLib functions return a bool
+    if result is True:
+        return _OK
+    if result is False:
+        return _FAILED
+    return None
+
+def _label( bound ):
+    return "<=%gms" % ( bound / 1000.0 ) if bound >= 1000 else "<=%gus" % bound
+
+class _CallStats( object ):
+    __slots__ = ( "calls", "failed", "exceptions", "total", "min", "max", "counts" )
+
+    def __init__( self ):
+        self.calls = 0
+        self.failed = 0
+        self.exceptions = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.counts = [ 0 ] * ( len( _DURATION_US ) + 1 )
+
+class DUOCallTracer( object ):
+    """
+    Per-function call statistics and trace events of the DUOLib calls
+    """
+
+    def __init__( self, maxEvents = 100000 ):
+        """
+        @param maxEvents: trace events kept for the Chrome trace (the oldest are dropped), 0 for none
+        """
+        self.maxEvents = maxEvents
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self.reset()
+
+    def reset( self ):
+        """
+        Clears the statistics and the events
+        """
+        with self._lock:
+            self._stats = {}
+            self._events = collections.deque( maxlen = self.maxEvents or 0 )
+
+    def wrap( self, name, func ):
+        """
+        Returns func timed under the given name
+        """
+        clock = time.perf_counter
+        record = self._record
+
+        def traced( *args ):
+            start = clock()
+            try:
+                result = func( *args )
+            except BaseException:
+                record( name, start, clock(), _EXCEPTION )
+                raise
+            record( name, start, clock(), result )
+            return result
+
+        traced.__name__ = name
+        traced.__wrapped__ = func
+        return traced
+
+    def _record( self, name, start, end, result ):
+        duration = end - start
+        bucket = bisect.bisect_left( _DURATION_US, duration * 1e6 )
+        status = _EXCEPTION if result is _EXCEPTION else _status( result )
+        with self._lock:
+            stats = self._stats.get( name )
+            if stats is None:
+                stats = self._stats[name] = _CallStats()
+            stats.calls += 1
+            stats.total += duration
+            if stats.min is None or duration < stats.min:
+                stats.min = duration
+            if duration > stats.max:
+                stats.max = duration
+            stats.counts[bucket] += 1
+            if status == _FAILED:
+                stats.failed += 1
+            elif status == _EXCEPTION:
+                stats.exceptions += 1
+            if self.maxEvents:
+                self._events.append( ( name, start, duration, threading.current_thread().ident, status ) )
+
+    def statistics( self ):
+        """
+        Returns a dict: function name -> dict with calls, failed, exceptions and
+        the wall time (total, mean, min, max in seconds, histogram)
+        """
+        with self._lock:
+            return dict( ( name, {
+                "calls": s.calls,
+                "failed": s.failed,
+                "exceptions": s.exceptions,
+                "total": s.total,
+                "mean": s.total / s.calls,
+                "min": s.min,
+                "max": s.max,
+                "histogram": dict( zip( [ _label( b ) for b in _DURATION_US ] +
+                                        [ ">%gms" % ( _DURATION_US[-1] / 1000.0 ) ], s.counts ) ),
+                } ) for name, s in self._stats.items() )
+
+    def text( self ):
+        """
+        Returns the statistics as a table, slowest functions (by total time) first
+        """
+        stats = sorted( self.statistics().items(), key = lambda item: -item[1]["total"] )
+        lines = [ "%-28s %7s %6s %10s %10s %10s" % ( "function", "calls", "failed",
+                                                     "mean ms", "max ms", "total ms" ) ]
+        for name, s in stats:
+            lines.append( "%-28s %7d %6d %10.3f %10.3f %10.1f" % (
+                name, s["calls"], s["failed"] + s["exceptions"], s["mean"] * 1e3, s["max"] * 1e3,
+                s["total"] * 1e3 ) )
+        return "\n".join( lines )
+
+    def chrome_trace( self ):
+        """
+        Returns the events in the Chrome trace event format (complete "X" events)
+        """
+        pid = os.getpid()
+        with self._lock:
+            events = list( self._events )
+        trace = []
+        for name, start, duration, tid, status in events:
+            event = { "name": name, "cat": "duolib", "ph": "X", "pid": pid, "tid": tid,
+                      "ts": ( start - self._origin ) * 1e6, "dur": duration * 1e6 }
+            if status is not None:
+                event["args"] = { "status": status }
+            trace.append( event )
+        return { "traceEvents": trace, "displayTimeUnit": "ms" }
+
+    def save_chrome_trace( self, path ):
+        """
+        Writes the Chrome trace JSON file
+        """
+        with open( path, "w" ) as f:
+            json.dump( self.chrome_trace(), f )
+
+    def __enter__( self ):
+        EnableDUOTracing( self )
+        return self
+
+    def __exit__( self, exc_type, exc, tb ):
+        DisableDUOTracing()
+
+def EnableDUOTracing( tracer = None ):
+    """
+    Starts tracing the DUOLib calls
+
+    @param tracer: DUOCallTracer collecting the calls (a new one if None)
+    @return: the active DUOCallTracer
+    """
+    with _activeLock:
+        if tracer is None:
+            tracer = DUOCallTracer()
+        _active[0] = tracer
+        _duo3d._duolib.intercept( tracer.wrap )
+    return tracer
+
+def DisableDUOTracing():
+    """
+    Stops tracing, the DUOLib functions are bound directly again
+
+    @return: the DUOCallTracer that was active (None if tracing was disabled)
+    """
+    with _activeLock:
+        tracer, _active[0] = _active[0], None
+        _duo3d._duolib.intercept( None )
+    return tracer
+
+def GetDUOTracer():
+    """
+    Returns the active DUOCallTracer, None if tracing is disabled
+    """
+    return _active[0]
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""
+pytest fixtures, the tests run against the synthetic backend (no device needed)
+
+    python -m pytest tests
+"""
+
+import ctypes as ct
+import importlib.util
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The package lives in src/ (package_dir in setup.py), import it from the tree as duo3d
+_SRC = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "src" )
+if "duo3d" not in sys.modules:
+    _spec = importlib.util.spec_from_file_location( "duo3d", os.path.join( _SRC, "__init__.py" ),
+                                                    submodule_search_locations = [ _SRC ] )
+    _module = importlib.util.module_from_spec( _spec )
+    sys.modules["duo3d"] = _module
+    _spec.loader.exec_module( _module )
+
+from duo3d.duo3d import SetDUOBackend, DUOFrame
+from duo3d.synthetic import SyntheticDUOLib
+
+class FrameSource( object ):
+    """
+    DUOFrame with its own image buffers, filled by make()
+    """
+
+    def __init__( self, width, height ):
+        self.width = width
+        self.height = height
+        self.left = np.zeros( ( height, width ), np.uint8 )
+        self.right = np.zeros( ( height, width ), np.uint8 )
+        self.frame = DUOFrame()
+        self.frame.width = width
+        self.frame.height = height
+        self.frame.leftData = self.left.ctypes.data_as( ct.POINTER( ct.c_uint8 ) )
+        self.frame.rightData = self.right.ctypes.data_as( ct.POINTER( ct.c_uint8 ) )
+
+    def make( self, n, timeStamp = None, samples = 2, IMUPresent = True ):
+        """
+        Fills the frame: images set to n / n + 1, IMU sample stamps following timeStamp
+        """
+        frame = self.frame
+        self.left[...] = n & 0xFF
+        self.right[...] = ( n + 1 ) & 0xFF
+        frame.timeStamp = ( n * 333 if timeStamp is None else timeStamp ) & 0xFFFFFFFF
+        frame.ledSeqTag = n & 0xFF
+        frame.IMUPresent = IMUPresent
+        frame.IMUSamples = samples
+        for i in range( samples ):
+            sample = frame.IMUData[i]
+            sample.timeStamp = ( frame.timeStamp - ( samples - 1 - i ) * 20 ) & 0xFFFFFFFF
+            sample.accelData[0] = n + i
+            sample.gyroData[2] = -n
+            sample.tempData = 25.0
+        return frame
+
+@pytest.fixture
+def frames():
+    return FrameSource( 32, 24 )
+
+@pytest.fixture
+def synthetic():
+    """
+    Selects a synthetic backend with 3 devices, the default backend is restored afterwards
+    """
+    lib = SyntheticDUOLib( devices = 3 )
+    SetDUOBackend( lib )
+    yield lib
+    SetDUOBackend( None )
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+
+from duo3d import duo3d as _duo3d
+from duo3d.benchmark import RunDUOBenchmark
+
+def test_benchmark_restores_backend():
+    _duo3d.SetDUOBackend( None )
+    summary = RunDUOBenchmark( [ "bare", "copy" ], duration = 0.2, synthetic = True,
+                               sizes = [ ( 320, 240 ) ], fpsScale = 0.5 )
+    assert summary["synthetic"]
+    results = summary["results"]
+    assert results and { r["strategy"] for r in results } == { "bare", "copy" }
+    assert all( r["frames"] > 0 and ( r["width"], r["height"] ) == ( 320, 240 ) for r in results )
+    assert _duo3d._duolib._lib is None  # Not left on the synthetic backend
+
+def test_benchmark_keeps_selected_backend( synthetic ):
+    RunDUOBenchmark( [ "bare" ], duration = 0.1, synthetic = True, sizes = [ ( 320, 240 ) ] )
+    assert _duo3d.GetDUOBackend() is synthetic
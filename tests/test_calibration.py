@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from duo3d.duo3d import (CloseDUO, OpenDUO, SetDUOResolutionInfo, DUOInstance, DUOResolutionInfo,
+                         DUO_BIN_HORIZONTAL2, DUO_BIN_HORIZONTAL4, DUO_BIN_VERTICAL2, DUO_BIN_VERTICAL4)
+from duo3d.calibration import DUOCalibration, GetDUOCalibration, InvalidateDUOCalibration
+
+_QVGA = DUOResolutionInfo( 320, 240, DUO_BIN_HORIZONTAL2 + DUO_BIN_VERTICAL2, 30.0, 1.0, 112.0 )
+_QQVGA = DUOResolutionInfo( 160, 120, DUO_BIN_HORIZONTAL4 + DUO_BIN_VERTICAL4, 30.0, 1.0, 112.0 )
+
+@pytest.fixture
+def duo( synthetic ):
+    duo = DUOInstance()
+    assert OpenDUO( duo )
+    assert SetDUOResolutionInfo( duo, _QVGA )
+    yield duo
+    CloseDUO( duo )
+
+def test_calibration_is_cached( duo ):
+    calib = GetDUOCalibration( duo )
+    assert GetDUOCalibration( duo ) is calib
+    assert ( calib.width, calib.height ) == ( 320, 240 )
+    assert calib.M1.shape == ( 3, 3 ) and calib.P2.shape == ( 3, 4 ) and calib.Q.shape == ( 4, 4 )
+    assert calib.leftCamera[0, 0] == calib.M1[0, 0]
+    with pytest.raises( ValueError ):
+        calib.M1[0, 0] = 1.0  # Read-only
+    assert calib.baseline == pytest.approx( np.linalg.norm( calib.translation ) )
+
+def test_resolution_change_invalidates( duo ):
+    calib = GetDUOCalibration( duo )
+    assert SetDUOResolutionInfo( duo, _QQVGA )
+    smaller = GetDUOCalibration( duo )
+    assert smaller is not calib
+    assert ( smaller.width, smaller.height ) == ( 160, 120 )
+    assert smaller.M1[0, 0] == pytest.approx( calib.M1[0, 0] / 2 )
+    assert GetDUOCalibration( duo ) is smaller
+
+def test_close_and_explicit_invalidation( synthetic ):
+    duo = DUOInstance()
+    assert OpenDUO( duo )
+    assert SetDUOResolutionInfo( duo, _QVGA )
+    calib = GetDUOCalibration( duo )
+    InvalidateDUOCalibration( duo )
+    again = GetDUOCalibration( duo )
+    assert again is not calib and again == calib
+    CloseDUO( duo )
+    assert OpenDUO( duo )
+    try:
+        assert SetDUOResolutionInfo( duo, _QVGA )
+        assert GetDUOCalibration( duo ) is not again
+    finally:
+        CloseDUO( duo )
+
+def test_calibration_round_trip( duo, tmp_path ):
+    calib = GetDUOCalibration( duo )
+    path = str( tmp_path / "duo.npz" )
+    calib.save( path )
+    loaded = DUOCalibration.load( path )
+    assert loaded == calib and loaded.serial == calib.serial
+    stereo = loaded.stereo()
+    assert list( stereo.Q ) == list( calib.Q.reshape( -1 ) )
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import numpy as np
+
+from duo3d.duo3d import (CloseDUO, OpenDUO, SetDUOResolutionInfo, StartDUO, StopDUO,
+                         DUOInstance, DUOResolutionInfo, DUO_BIN_HORIZONTAL2, DUO_BIN_VERTICAL2)
+from duo3d.capture import DUOFrameRing, DUO_RING_DROP_NEWEST, DUO_RING_OVERWRITE_OLDEST
+
+def test_ring_copies_frames_in_order( frames ):
+    ring = DUOFrameRing( frames.width, frames.height, 4 )
+    for n in range( 3 ):
+        assert ring.push( frames.make( n, samples = n ) )
+    for n in range( 3 ):
+        slot = ring.get( 0 )
+        assert slot.seq == n
+        assert slot.timeStamp == n * 333
+        assert ( slot.left == n ).all() and ( slot.right == n + 1 ).all()
+        assert slot.IMUSamples == n == len( slot.imu )
+        assert list( slot.imu["accelData"][:, 0] ) == [ n + i for i in range( n ) ]
+    assert ring.get( 0 ) is None
+
+def test_ring_overwrites_oldest( frames ):
+    ring = DUOFrameRing( frames.width, frames.height, 3, DUO_RING_OVERWRITE_OLDEST )
+    for n in range( 6 ):
+        ring.push( frames.make( n ) )
+    assert ring.overwritten == 3
+    assert [ ring.get( 0 ).timeStamp for _ in range( 3 ) ] == [ 3 * 333, 4 * 333, 5 * 333 ]
+
+def test_ring_drops_newest( frames ):
+    ring = DUOFrameRing( frames.width, frames.height, 3, DUO_RING_DROP_NEWEST )
+    stored = [ ring.push( frames.make( n ) ) for n in range( 5 ) ]
+    assert stored == [ True, True, True, False, False ]
+    assert ring.dropped == 2
+    assert ring.get( 0 ).timeStamp == 0
+
+def test_ring_latest_skips_unread( frames ):
+    ring = DUOFrameRing( frames.width, frames.height, 4 )
+    for n in range( 3 ):
+        ring.push( frames.make( n ) )
+    assert ring.latest().timeStamp == 2 * 333
+    assert ring.skipped == 2
+    assert ring.pending() == 0
+
+def test_ring_held_slot_is_not_overwritten( frames ):
+    ring = DUOFrameRing( frames.width, frames.height, 2 )
+    ring.push( frames.make( 1 ) )
+    slot = ring.get( 0 )
+    for n in range( 2, 6 ):
+        ring.push( frames.make( n ) )
+    assert ( slot.left == 1 ).all()
+
+def test_ring_rejects_other_sizes( frames ):
+    ring = DUOFrameRing( frames.width * 2, frames.height, 2 )
+    assert not ring.push( frames.make( 0 ) )
+    assert ring.dropped == 1
+
+def test_ring_close_wakes_up_consumer( frames ):
+    ring = DUOFrameRing( frames.width, frames.height, 2 )
+    result = []
+    consumer = threading.Thread( target = lambda: result.append( ring.get() ) )
+    consumer.start()
+    ring.close()
+    consumer.join( 5 )
+    assert not consumer.is_alive() and result == [ None ]
+
+def test_ring_callback( synthetic ):
+    duo = DUOInstance()
+    assert OpenDUO( duo )
+    try:
+        ri = DUOResolutionInfo( 320, 240, DUO_BIN_HORIZONTAL2 + DUO_BIN_VERTICAL2, 100.0, 1.0, 112.0 )
+        assert SetDUOResolutionInfo( duo, ri )
+        ring = DUOFrameRing( 320, 240, 4 )
+        assert StartDUO( duo, ring.callback, None )
+        slots = [ ring.get( 2.0 ) for _ in range( 3 ) ]
+        StopDUO( duo )
+    finally:
+        CloseDUO( duo )
+    assert all( slot is not None for slot in slots )
+    assert np.any( slots[-1].left )
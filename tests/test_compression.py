@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+import concurrent.futures
+import itertools
+
+import numpy as np
+import pytest
+
+from duo3d.compression import (DUOCompressedRecorder, DUOCompressedRecording, DUO_CODEC_LZMA,
+                               DUO_CODEC_ZLIB, DUO_PREDICT_LEFTRIGHT, DUO_PREDICT_NONE,
+                               DUO_PREDICT_TEMPORAL, _HEADER)
+
+_FRAMES = 10
+
+def _record( path, frames, codec, predictor ):
+    # Threads instead of the default process pool, the tests import the package from the tree
+    with concurrent.futures.ThreadPoolExecutor( 2 ) as executor:
+        with DUOCompressedRecorder( path, frames.width, frames.height, chunkFrames = 4, codec = codec,
+                                    predictor = predictor, executor = executor ) as rec:
+            for n in range( _FRAMES ):
+                assert rec.write( _make( frames, n ) )
+    return rec
+
+def _make( frames, n ):
+    frame = frames.make( n, samples = n % 3 )
+    frames.left += np.arange( frames.width, dtype = np.uint8 )  # Something to predict
+    frames.right[::2] = 255 - n
+    return frame
+
+def _expected( frames, n ):
+    _make( frames, n )
+    return frames.left.copy(), frames.right.copy()
+
+@pytest.mark.parametrize( "codec, predictor", list( itertools.product(
+    [ DUO_CODEC_ZLIB, DUO_CODEC_LZMA ], [ DUO_PREDICT_NONE, DUO_PREDICT_LEFTRIGHT, DUO_PREDICT_TEMPORAL ] ) ) )
+def test_compression_round_trip( tmp_path, frames, codec, predictor ):
+    path = str( tmp_path / "session.duoz" )
+    rec = _record( path, frames, codec, predictor )
+    assert rec.frames == _FRAMES and rec.dropped == 0
+    assert rec.ratio > 1.0
+    with DUOCompressedRecording( path ) as recording:
+        assert ( recording.codec, recording.predictor ) == ( codec, predictor )
+        assert len( recording ) == _FRAMES and len( recording.index ) == 3
+        for n, frame in enumerate( recording ):
+            left, right = _expected( frames, n )
+            assert frame.timeStamp == n * 333 and frame.seq == n
+            assert np.array_equal( frame.left, left ) and np.array_equal( frame.right, right )
+            assert frame.IMUSamples == len( frame.imu ) == n % 3
+            assert list( frame.imu["accelData"][:, 0] ) == [ n + i for i in range( n % 3 ) ]
+        assert recording.frame( -1 ).timeStamp == ( _FRAMES - 1 ) * 333
+        assert recording.find_chunk( 5 * 333 ) == 1
+
+def test_compression_without_index_is_scanned( tmp_path, frames ):
+    path = str( tmp_path / "session.duoz" )
+    _record( path, frames, DUO_CODEC_ZLIB, DUO_PREDICT_TEMPORAL )
+    # Recording not closed properly: no index offset in the header
+    with open( path, "r+b" ) as f:
+        fields = list( _HEADER.unpack( f.read( _HEADER.size ) ) )
+        fields[7] = fields[8] = 0
+        f.seek( 0 )
+        f.write( _HEADER.pack( *fields ) )
+    with DUOCompressedRecording( path ) as recording:
+        assert len( recording ) == _FRAMES
+        assert list( recording.index["firstFrame"] ) == [ 0, 4, 8 ]
+        assert np.array_equal( recording.frame( 9 ).left, _expected( frames, 9 )[0] )
+
+def test_compression_rejects_unknown_codec( tmp_path ):
+    with pytest.raises( ValueError ):
+        DUOCompressedRecorder( str( tmp_path / "x.duoz" ), 32, 24, codec = 7 )
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from duo3d.duo3d import (GetDUOExposure, GetDUOGain, GetDUOResolutionInfo, SetDUOResolutionInfo,
+                         DUOResolutionInfo, DUO_BIN_HORIZONTAL2, DUO_BIN_HORIZONTAL4, DUO_BIN_VERTICAL2,
+                         DUO_BIN_VERTICAL4)
+from duo3d.device import DUODevice
+from duo3d.tracing import DUOCallTracer
+
+_QVGA = DUOResolutionInfo( 320, 240, DUO_BIN_HORIZONTAL2 + DUO_BIN_VERTICAL2, 30.0, 1.0, 112.0 )
+_QQVGA = DUOResolutionInfo( 160, 120, DUO_BIN_HORIZONTAL4 + DUO_BIN_VERTICAL4, 30.0, 1.0, 112.0 )
+
+@pytest.fixture
+def device( synthetic ):
+    with DUODevice( writeInterval = 0.05 ) as device:
+        device.resolution = _QVGA
+        yield device
+
+def _calls( tracer, name ):
+    return tracer.statistics().get( name, { "calls": 0 } )["calls"]
+
+def test_device_serves_cached_values( device ):
+    assert device.deviceName and device.serialNumber
+    device.refresh()  # frameDimension was stale after the resolution change
+    with DUOCallTracer() as tracer:
+        assert device.frameDimension == ( 320, 240 )
+        assert device.gain == device.gain
+        device.hFlip = device.hFlip  # Unchanged: not written
+    assert tracer.statistics() == {}
+    assert device.skipped == 1
+
+def test_device_coalesces_writes( device ):
+    with DUOCallTracer() as tracer:
+        for value in range( 10, 60, 5 ):
+            device.exposure = value
+            device.gain = value // 5
+        assert device.exposure == 55  # Queued value
+        assert device.flush( 5.0 )
+    assert _calls( tracer, "SetDUOExposure" ) < 10 and _calls( tracer, "SetDUOGain" ) < 10
+    assert device.coalesced > 0
+    assert GetDUOExposure( device.duo ) == 55 and GetDUOGain( device.duo ) == 11
+
+def test_device_immediate_write( device ):
+    with DUOCallTracer() as tracer:
+        assert device.set( "ledPWM", 42, immediate = True )
+    assert _calls( tracer, "SetDUOLedPWM" ) == 1
+    assert device.ledPWM == 42
+
+def test_device_dependents_are_read_again( device ):
+    device.exposureMS  # Cached
+    device.exposure = 30
+    device.flush( 5.0 )
+    with DUOCallTracer() as tracer:
+        device.exposureMS
+        device.exposureMS
+    assert _calls( tracer, "GetDUOExposureMS" ) == 1
+
+    device.resolution = _QQVGA
+    with DUOCallTracer() as tracer:
+        assert device.frameDimension == ( 160, 120 )
+        assert device.FOV is not None
+    assert _calls( tracer, "GetDUOFrameDimension" ) == 1
+
+def test_device_follows_plain_api_mode_changes( device ):
+    assert device.frameDimension == ( 320, 240 )
+    assert SetDUOResolutionInfo( device.duo, _QQVGA )  # Not through the device
+    assert device.resolution.width == 160 and device.frameDimension == ( 160, 120 )
+
+def test_device_does_not_share_structures( device ):
+    # The caller changing its own DUOResolutionInfo and setting it again must be written
+    ri = DUOResolutionInfo( 320, 240, DUO_BIN_HORIZONTAL2 + DUO_BIN_VERTICAL2, 30.0, 1.0, 112.0 )
+    device.resolution = ri
+    ri.fps = 15.0
+    device.resolution = ri
+    assert GetDUOResolutionInfo( device.duo ).fps == 15.0
+
+    current = device.resolution
+    current.fps = 20.0  # Changing the returned copy does not change the cache
+    assert device.resolution.fps == 15.0
+    device.resolution = current
+    assert GetDUOResolutionInfo( device.duo ).fps == 20.0
+    assert device.snapshot()["resolution"] is not device.snapshot()["resolution"]
+
+def test_device_read_only_and_closed( device ):
+    with pytest.raises( AttributeError ):
+        device.set( "FOV", ( 1, 2, 3, 4 ) )
+    device.close()
+    with pytest.raises( IOError ):
+        device.gain = 5
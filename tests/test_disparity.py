@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from duo3d.disparity import (BenchmarkDUOStereoMatcher, DUOStereoMatcher, DUO_DISPARITY_INVALID,
+                             DUO_MATCH_CENSUS, DUO_MATCH_SAD, _test_pair)
+
+_WIDTH, _HEIGHT, _TRUTH = 64, 40, 5
+
+@pytest.mark.parametrize( "method", [ DUO_MATCH_SAD, DUO_MATCH_CENSUS ] )
+def test_disparity_of_shifted_pair( method ):
+    left, right = _test_pair( _WIDTH, _HEIGHT, _TRUTH )
+    matcher = DUOStereoMatcher( _WIDTH, _HEIGHT, numDisparities = 16, blockSize = 5, method = method,
+                                workers = 2 )
+    try:
+        disparity = matcher.compute( left, right )
+    finally:
+        matcher.close()
+    assert disparity is matcher.disparity and disparity.dtype == np.float32
+    # Away from the borders, where the replicated edges make matches ambiguous
+    inner = disparity[:, 16:-4]
+    assert np.abs( inner - _TRUTH ).max() < 0.5
+    assert ( disparity != DUO_DISPARITY_INVALID ).mean() > 0.85
+
+def test_disparity_bands_match_single_thread():
+    left, right = _test_pair( _WIDTH, _HEIGHT, _TRUTH, seed = 1 )
+    left = left.copy()
+    left[10:20, 30:40] = right[10:20, 30:40]  # An area matched at disparity 0
+    single = DUOStereoMatcher( _WIDTH, _HEIGHT, 16, 5, workers = 1 )
+    banded = DUOStereoMatcher( _WIDTH, _HEIGHT, 16, 5, workers = 3, bands = 7 )
+    try:
+        out = np.empty( ( _HEIGHT, _WIDTH ), np.float32 )
+        assert banded.compute( left, right, out ) is out
+        assert np.array_equal( single.compute( left, right ), out )
+    finally:
+        single.close()
+        banded.close()
+
+def test_disparity_without_subpixel_is_integer():
+    left, right = _test_pair( _WIDTH, _HEIGHT, _TRUTH )
+    matcher = DUOStereoMatcher( _WIDTH, _HEIGHT, 16, 5, subpixel = False, lrCheck = None, workers = 1 )
+    disparity = matcher.compute( left, right )
+    assert np.array_equal( disparity[:, 16:], np.full( ( _HEIGHT, _WIDTH - 16 ), _TRUTH, np.float32 ) )
+    assert ( disparity[:, _TRUTH:] >= 0 ).all()  # Nothing invalidated without the check
+
+def test_disparity_of_frame( frames ):
+    left, right = _test_pair( frames.width, frames.height, 3 )
+    frames.left[...], frames.right[...] = left, right
+    matcher = DUOStereoMatcher( frames.width, frames.height, 8, 5, workers = 1 )
+    assert np.array_equal( matcher.compute_frame( frames.frame ), matcher.compute( left, right ) )
+
+@pytest.mark.parametrize( "kwargs", [ { "blockSize": 4 }, { "censusSize": 7 }, { "numDisparities": 0 },
+                                      { "method": 5 } ] )
+def test_disparity_rejects_bad_parameters( kwargs ):
+    with pytest.raises( ValueError ):
+        DUOStereoMatcher( _WIDTH, _HEIGHT, **kwargs )
+
+def test_disparity_benchmark():
+    results = BenchmarkDUOStereoMatcher( [ ( 96, 48 ) ], numDisparities = 16, blockSize = 5,
+                                         workers = 2, repeat = 1 )
+    assert len( results ) == 1 and results[0]["correct"] > 0.95
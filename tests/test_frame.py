@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import ctypes as ct
+
+import numpy as np
+import pytest
+
+from duo3d.duo3d import DUOFrame, DUO_MAX_IMU_SAMPLES
+from duo3d.frame import (DetachDUOFrameImages, GetDUOFrameImages, GetDUOFrameIMU, GetDUOFrameIMUArrays,
+                         GetDUOFrameLeft, GetDUOFrameRight, DUO_IMU_DTYPE)
+
+def test_frame_views_share_memory( frames ):
+    frame = frames.make( 3 )
+    left, right = GetDUOFrameImages( frame )
+    assert left.shape == right.shape == ( frames.height, frames.width )
+    assert left.dtype == np.uint8
+    assert np.shares_memory( left, frames.left ) and np.shares_memory( right, frames.right )
+    frames.left[1, 2] = 77  # Visible through the view, nothing was copied
+    assert left[1, 2] == 77 and ( right == 4 ).all()
+    assert np.array_equal( GetDUOFrameLeft( ct.pointer( frame ) ), frames.left )
+    assert np.array_equal( GetDUOFrameRight( ct.pointer( frame ) ), frames.right )
+
+def test_frame_view_of_null_pointer():
+    frame = DUOFrame()
+    frame.width, frame.height = 32, 24
+    with pytest.raises( ValueError ):
+        GetDUOFrameImages( frame )
+
+def test_detach_copies( frames ):
+    frame = frames.make( 5 )
+    left, right = DetachDUOFrameImages( frame )
+    frames.make( 6 )  # The next frame reuses the buffers
+    assert ( left == 5 ).all() and ( right == 6 ).all()
+    assert not np.shares_memory( left, frames.left )
+
+def test_detach_into_preallocated( frames ):
+    frame = frames.make( 7 )
+    left = np.empty( frames.width * frames.height, np.uint8 )
+    right = np.empty( ( frames.height, frames.width ), np.uint8 )
+    outLeft, outRight = DetachDUOFrameImages( frame, left, right )
+    assert outLeft.shape == ( frames.height, frames.width ) and np.shares_memory( outLeft, left )
+    assert outRight is right
+    assert ( left == 7 ).all() and ( right == 8 ).all()
+
+@pytest.mark.parametrize( "out, error", [
+    ( np.empty( 10, np.uint8 ), ValueError ),  # Too small
+    ( np.empty( ( 24, 32 ), np.int16 ), TypeError ),
+    ( np.empty( ( 32, 24 ), np.uint8 ).T, ValueError ),  # Not C-contiguous
+    ] )
+def test_detach_rejects_bad_buffers( frames, out, error ):
+    with pytest.raises( error ):
+        DetachDUOFrameImages( frames.make( 1 ), left = out )
+
+def test_imu_matches_structures( frames ):
+    frame = frames.make( 4, timeStamp = 1000, samples = 3 )
+    samples = GetDUOFrameIMU( frame )
+    assert samples.dtype == DUO_IMU_DTYPE and len( samples ) == 3
+    for i in range( 3 ):
+        assert samples[i]["timeStamp"] == frame.IMUData[i].timeStamp
+        assert list( samples[i]["accelData"] ) == list( frame.IMUData[i].accelData )
+        assert list( samples[i]["gyroData"] ) == list( frame.IMUData[i].gyroData )
+        assert samples[i]["tempData"] == frame.IMUData[i].tempData
+    assert list( samples["timeStamp"] ) == [ 960, 980, 1000 ]
+    assert len( GetDUOFrameIMU( frames.make( 5, samples = 0 ) ) ) == 0
+
+def test_imu_into_preallocated( frames ):
+    out = np.zeros( DUO_MAX_IMU_SAMPLES, DUO_IMU_DTYPE )
+    samples = GetDUOFrameIMU( frames.make( 2, samples = 2 ), out )
+    assert len( samples ) == 2 and np.shares_memory( samples, out )
+    assert list( out["accelData"][:3, 0] ) == [ 2, 3, 0 ]  # Only the valid samples were copied
+    with pytest.raises( ValueError ):
+        GetDUOFrameIMU( frames.make( 2, samples = 3 ), out[:2] )
+    with pytest.raises( TypeError ):
+        GetDUOFrameIMU( frames.frame, np.zeros( 8, np.float32 ) )
+
+def test_imu_samples_are_clamped( frames ):
+    frame = frames.make( 1, samples = 0 )
+    frame.IMUSamples = DUO_MAX_IMU_SAMPLES + 10  # Garbage from the device
+    assert len( GetDUOFrameIMU( frame ) ) == DUO_MAX_IMU_SAMPLES
+
+def test_imu_arrays_are_views( frames ):
+    out = np.empty( 4, DUO_IMU_DTYPE )
+    timeStamp, temp, accel, gyro = GetDUOFrameIMUArrays( frames.make( 6, timeStamp = 500, samples = 2 ), out )
+    assert list( timeStamp ) == [ 480, 500 ]
+    assert accel.shape == gyro.shape == ( 2, 3 ) and temp.shape == ( 2, )
+    assert list( accel[:, 0] ) == [ 6, 7 ] and list( gyro[:, 2] ) == [ -6, -6 ]
+    assert all( np.shares_memory( a, out ) for a in ( timeStamp, temp, accel, gyro ) )
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from duo3d.frame import DUO_IMU_DTYPE
+from duo3d.imu import DUOIMUTimeline
+
+_WRAP = 1 << 32
+
+def _samples( stamps, origin = None ):
+    """
+    IMU samples at the given (unwrapped) stamps, accelData[0] = stamp - origin
+    and gyroData[2] = 2 * accelData[0]
+    """
+    stamps = np.asarray( stamps, np.int64 )
+    offset = ( stamps - ( stamps[0] if origin is None else origin ) ).astype( np.float32 )
+    samples = np.zeros( len( stamps ), DUO_IMU_DTYPE )
+    samples["timeStamp"] = stamps & ( _WRAP - 1 )
+    samples["accelData"][:, 0] = offset
+    samples["gyroData"][:, 2] = 2 * offset
+    return samples
+
+def _timeline_across_wrap():
+    timeline = DUOIMUTimeline( capacity = 8 )
+    stamps = _WRAP - 500 + np.arange( 0, 1000, 20 )  # Crosses the 32-bit wrap
+    for batch in np.array_split( stamps, 7 ):
+        timeline.append( _samples( batch, stamps[0] ) )
+    return timeline, stamps
+
+def test_timeline_unwraps_stamps():
+    timeline, stamps = _timeline_across_wrap()
+    assert len( timeline ) == len( stamps )
+    assert np.array_equal( timeline.timeStamp, stamps )
+    assert np.all( np.diff( timeline.timeStamp ) == 20 )
+    assert timeline.unwrap( 100 ) == _WRAP + 100
+    assert timeline.unwrap( _WRAP - 100 ) == _WRAP - 100
+
+def test_timeline_between_across_wrap():
+    timeline, stamps = _timeline_across_wrap()
+    # Raw 32-bit frame stamps on both sides of the wrap
+    times, accel, gyro, temp = timeline.between( ( _WRAP - 100 ) & ( _WRAP - 1 ), 100 )
+    assert list( times ) == [ t for t in stamps if _WRAP - 100 < t <= _WRAP + 100 ]
+    assert len( accel ) == len( gyro ) == len( temp ) == len( times )
+
+def test_timeline_interpolates_across_wrap():
+    timeline, stamps = _timeline_across_wrap()
+    accel, gyro = timeline.interpolate( [ ( _WRAP - 10 ) & ( _WRAP - 1 ), 10 ] )
+    expected = np.array( [ _WRAP - 10, _WRAP + 10 ] ) - stamps[0]
+    assert np.allclose( accel[:, 0], expected )
+    assert np.allclose( gyro[:, 2], 2 * expected )
+    # Clamped outside the timeline
+    accel, gyro = timeline.interpolate( stamps[-1] + 1000, unwrapped = True )
+    assert accel[0] == pytest.approx( stamps[-1] - stamps[0] )
+
+def test_timeline_drops_duplicates():
+    timeline = DUOIMUTimeline()
+    assert timeline.append( _samples( [ 100, 120, 140 ] ) ) == 3
+    assert timeline.append( _samples( [ 120, 140, 160 ] ) ) == 1
+    assert timeline.duplicates == 2
+    assert list( timeline.timeStamp ) == [ 100, 120, 140, 160 ]
+
+def test_bounded_timeline_keeps_newest():
+    timeline = DUOIMUTimeline( capacity = 16, maxSamples = 150 )
+    for i in range( 10 ):
+        timeline.append( _samples( 1000 + 20 * np.arange( i * 50, ( i + 1 ) * 50 ) ) )
+    assert len( timeline ) == 150
+    assert timeline.discarded == 350
+    assert timeline.timeStamp[-1] == 1000 + 20 * 499
+    assert np.all( np.diff( timeline.timeStamp ) == 20 )
+
+def test_timeline_resample():
+    timeline, stamps = _timeline_across_wrap()
+    grid, accel, gyro = timeline.resample( 1000 )  # Every 10 stamp units
+    assert len( grid ) == ( stamps[-1] - stamps[0] ) // 10 + 1
+    assert np.allclose( accel[:, 0], grid - stamps[0] )
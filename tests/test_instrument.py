@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import ctypes as ct
+import json
+
+from duo3d.instrument import DUOCaptureMonitor
+
+def _feed( monitor, frames, numbers, start = 0, samples = 2 ):
+    """
+    Calls the instrumented callback with the frames numbered from numbers
+    """
+    seen = []
+    callback = monitor.wrap( lambda frame: seen.append( frame.timeStamp ) )
+    for n in numbers:
+        callback( ct.pointer( frames.make( n, timeStamp = start + n * 333, samples = samples ) ), None )
+    return seen
+
+def test_monitor_counts_gaps( frames ):
+    monitor = DUOCaptureMonitor( fps = 30.0 )
+    seen = _feed( monitor, frames, [ 0, 1, 2, 3, 4, 7, 8, 9, 12, 13 ] )
+    assert len( seen ) == 10  # The one argument callback got every frame
+    s = monitor.snapshot()
+    assert s["frames"] == 10 and s["dropped"] == 4 and s["gapEvents"] == 2
+    assert s["maxGapMs"] == 99.9
+    assert s["lossRatio"] == 4.0 / 14
+
+def test_monitor_gaps_across_the_stamp_wrap( frames ):
+    monitor = DUOCaptureMonitor( fps = 30.0 )
+    _feed( monitor, frames, [ 0, 1, 2, 4, 5 ], start = ( 1 << 32 ) - 700 )
+    s = monitor.snapshot()
+    assert ( s["dropped"], s["gapEvents"], s["maxGapMs"] ) == ( 1, 1, 66.6 )
+
+def test_monitor_without_fps_counts_no_gaps( frames ):
+    monitor = DUOCaptureMonitor()
+    _feed( monitor, frames, [ 0, 5, 10 ] )
+    assert monitor.dropped == 0 and monitor.frames == 3
+
+def test_monitor_histograms( frames ):
+    depth = [ 0 ]
+    def queue():
+        depth[0] += 1
+        return depth[0]
+    monitor = DUOCaptureMonitor( fps = 30.0, queue = queue )
+    _feed( monitor, frames, range( 3 ), samples = 1 )
+    _feed( monitor, frames, range( 3, 5 ), samples = 3 )
+    s = monitor.snapshot()
+    assert s["imu"]["histogram"] == { "1": 3, "3": 2 } and s["imu"]["meanSamples"] == 9.0 / 5
+    assert sum( s["callback"]["histogram"].values() ) == 5
+    assert s["callback"]["maxUs"] >= s["callback"]["meanUs"] > 0
+    assert s["callback"]["p50Us"] is not None
+    assert s["queue"]["max"] == 5 and s["queue"]["mean"] == 3.0
+    assert s["queue"]["histogram"]["<=4"] == 1 and s["queue"]["histogram"]["<=8"] == 1
+    assert s["fps"] > 0 and s["recentFps"] > 0
+
+def test_monitor_reports_and_resets( frames ):
+    monitor = DUOCaptureMonitor( fps = 30.0 )
+    _feed( monitor, frames, [ 0, 2 ] )
+    assert json.loads( monitor.to_json() )["dropped"] == 1
+    assert "dropped: 1 frames in 1 gaps" in monitor.text()
+    monitor.reset()
+    s = monitor.snapshot()
+    assert s["frames"] == 0 and s["dropped"] == 0 and s["callback"]["p50Us"] is None
+    assert "queue" not in s and "frames: 0" in monitor.text()
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+from duo3d import duo3d as _duo3d
+from duo3d.duo3d import (FindOptimalBinning, DUOResolutionInfo, DUO_BIN_HORIZONTAL2,
+                         DUO_BIN_NONE, DUO_BIN_VERTICAL2, DUO_BIN_VERTICAL4)
+from duo3d.modes import FindDUOOptimalBinning, GetDUOModeTable
+from duo3d.synthetic import SyntheticDUOLib
+from duo3d.tracing import DUOCallTracer
+
+def test_find_optimal_binning_is_plain_arithmetic():
+    _duo3d.SetDUOBackend( None )
+    assert FindOptimalBinning( 752, 480 ) == DUO_BIN_NONE
+    assert FindOptimalBinning( 320, 240 ) == DUO_BIN_HORIZONTAL2 + DUO_BIN_VERTICAL2
+    assert FindOptimalBinning( 320, 120 ) == DUO_BIN_HORIZONTAL2 + DUO_BIN_VERTICAL4
+    assert _duo3d._duolib._lib is None  # DUOLib was not loaded
+
+def test_mode_queries_return_resolutions( synthetic ):
+    table = GetDUOModeTable()
+    assert len( table ) > 0
+    selected = table.select( 320, 240 )
+    fast = table.with_fps( 100 )
+    best = table.best( 320, 240, 30 )
+    assert selected and fast
+    assert all( isinstance( ri, DUOResolutionInfo ) for ri in selected + fast + [ best ] )
+    assert all( ( ri.width, ri.height ) == ( 320, 240 ) for ri in selected )
+    assert all( ri.minFps <= ri.fps == max( 100, ri.minFps ) <= ri.maxFps for ri in fast )
+    assert ( best.width, best.height, best.fps ) == ( 320, 240, 30 )
+    assert all( ri.fps == 30 for ri in table.select( fps = 30 ) )
+
+def test_find_optimal_binning_from_table( synthetic ):
+    table = GetDUOModeTable()
+    assert FindDUOOptimalBinning( 320, 240 ) == table.optimal_binning( 320, 240 )
+    # Not enumerated: the sensor arithmetic
+    assert FindDUOOptimalBinning( 333, 111 ) == FindOptimalBinning( 333, 111 )
+
+def test_mode_queries_do_not_call_the_library( synthetic ):
+    table = GetDUOModeTable()
+    with DUOCallTracer() as tracer:
+        assert GetDUOModeTable() is table
+        FindDUOOptimalBinning( 320, 240 )
+        table.best( 320, 240, 30 )
+    assert tracer.statistics() == {}
+
+def test_mode_table_follows_the_backend( synthetic ):
+    table = GetDUOModeTable()
+    _duo3d.SetDUOBackend( SyntheticDUOLib( devices = 1 ) )
+    assert GetDUOModeTable() is not table
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from duo3d.duo3d import DUOResolutionInfo, DUO_BIN_HORIZONTAL2, DUO_BIN_VERTICAL2
+from duo3d.multidevice import DUOMultiCapture
+
+def _has_native_helper():
+    from duo3d.native import _find_caplib
+    try:
+        _find_caplib()
+    except ImportError:
+        return False
+    return True
+
+@pytest.mark.parametrize( "native", [
+    False,
+    pytest.param( True, marks = pytest.mark.skipif( not _has_native_helper(),
+                                                    reason = "native capture helper not built" ) ),
+    ] )
+def test_multidevice_aligns_frames( synthetic, native ):
+    ri = DUOResolutionInfo( 320, 240, DUO_BIN_HORIZONTAL2 + DUO_BIN_VERTICAL2, 60.0, 1.0, 112.0 )
+    with DUOMultiCapture( count = 3, resolution = ri, native = native ) as rig:
+        sets = []
+        for frameSet in rig:
+            assert len( frameSet ) == 3
+            assert frameSet.skew <= rig.tolerance
+            assert all( frame.left.shape == ( 240, 320 ) for frame in frameSet )
+            sets.append( ( frameSet.seq, frameSet.time ) )
+            if len( sets ) == 20:
+                break
+        stats = rig.statistics()
+    assert [ s["master"] for s in stats ] == [ True, False, False ]
+    assert all( s["native"] == native for s in stats )
+    assert all( s["matched"] >= 20 for s in stats )
+    # Sets come in capture order, one frame period apart
+    times = [ t for seq, t in sets ]
+    assert all( b > a for a, b in zip( times, times[1:] ) )
+    assert [ seq for seq, t in sets ] == sorted( seq for seq, t in sets )
+
+def test_multidevice_needs_enough_devices( synthetic ):
+    with pytest.raises( IOError ):
+        DUOMultiCapture( count = 4 )
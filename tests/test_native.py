@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import ctypes as ct
+import threading
+
+import pytest
+
+from duo3d.native import DUONativeCapture, _find_caplib
+
+try:
+    _find_caplib()
+except ImportError:
+    pytestmark = pytest.mark.skip( reason = "native capture helper not built" )
+
+@pytest.fixture
+def capture( frames ):
+    capture = DUONativeCapture( frames.width, frames.height, 4 )
+    yield capture
+    capture.close()
+
+def _push( capture, frames, first, count ):
+    # Calls the native DUOFrameCallback the way the DUO capture thread does
+    for n in range( first, first + count ):
+        capture.callback( ct.pointer( frames.make( n, samples = n % 3 ) ), capture.userData )
+
+def test_native_get_in_order( capture, frames ):
+    assert capture.get( 0.05 ) is None
+    _push( capture, frames, 1, 3 )
+    for n in range( 1, 4 ):
+        slot = capture.get( 1.0 )
+        assert slot.seq == n and slot.timeStamp == n * 333 and slot.ledSeqTag == n
+        assert ( slot.left == n ).all() and ( slot.right == n + 1 ).all()
+        assert slot.IMUPresent and slot.IMUSamples == n % 3
+        assert list( slot.imu["accelData"][:, 0] ) == [ n + i for i in range( n % 3 ) ]
+    assert capture.get( 0.05 ) is None
+    assert capture.stats() == ( 3, 3, 0 )
+
+def test_native_latest_skips( capture, frames ):
+    _push( capture, frames, 1, 3 )
+    assert capture.latest().seq == 3
+    assert capture.skipped == 2 and capture.lost == 0
+    assert capture.latest() is None
+
+def test_native_overrun_counts_lost( capture, frames ):
+    _push( capture, frames, 1, 10 )
+    # 4 slots: frames 7 to 10 are still in the ring
+    assert [ capture.get( 1.0 ).seq for _ in range( 4 ) ] == [ 7, 8, 9, 10 ]
+    assert capture.lost == 6 and capture.skipped == 0
+
+def test_native_drops_wrong_size( capture, frames ):
+    frame = frames.make( 1 )
+    frame.width = frames.width // 2
+    capture.callback( ct.pointer( frame ), capture.userData )
+    assert capture.get( 0.05 ) is None
+    assert capture.stats() == ( 0, 1, 1 )  # Received, but not stored
+
+def test_native_close_wakes_consumers( capture, frames ):
+    result = []
+    consumer = threading.Thread( target = lambda: result.append( capture.get() ) )
+    consumer.start()
+    capture.close()
+    consumer.join( 5.0 )
+    assert not consumer.is_alive() and result == [ None ]
+    _push( capture, frames, 1, 1 )  # Dropped after close
+    assert list( capture ) == []
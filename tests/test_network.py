@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from duo3d.capture import DUOFrameSlot
+from duo3d.network import DUOFrameClient, DUOFrameServer, DUO_NET_DELTA, DUO_NET_RAW, DUO_NET_ZLIB, _FRAME
+
+@pytest.fixture
+def server( frames ):
+    server = DUOFrameServer( ( "127.0.0.1", 0 ), frames.width, frames.height, keyInterval = 3, workers = 2 )
+    server.start()
+    yield server
+    server.close()
+
+def _connect( server, **kwargs ):
+    client = DUOFrameClient( server.address, **kwargs )
+    # The client is registered by the server once the handshake reply is sent
+    deadline = time.time() + 5.0
+    while server.clients < 1 and time.time() < deadline:
+        time.sleep( 0.01 )
+    return client
+
+@pytest.mark.parametrize( "encoding", [ DUO_NET_RAW, DUO_NET_ZLIB, DUO_NET_DELTA ] )
+def test_network_round_trip( server, frames, encoding ):
+    with _connect( server, encoding = encoding ) as client:
+        assert ( client.width, client.height ) == ( frames.width, frames.height )
+        for n in range( 7 ):  # Keyframes and deltas
+            frame = frames.make( n, samples = n % 3 )
+            frames.left[n % frames.height] = 200  # Something the delta has to carry
+            assert server.publish( frame )
+            slot = client.get( 5.0 )
+            assert slot is not None
+            assert slot.timeStamp == n * 333 and slot.IMUSamples == n % 3
+            assert np.array_equal( slot.left, frames.left ) and np.array_equal( slot.right, frames.right )
+            assert list( slot.imu["accelData"][:, 0] ) == [ n + i for i in range( n % 3 ) ]
+
+def test_network_region_and_scale( server, frames ):
+    with _connect( server, region = ( 4, 2, 20, 12 ), scale = 2, encoding = DUO_NET_ZLIB ) as client:
+        assert ( client.width, client.height ) == ( 10, 6 )
+        frames.make( 1 )
+        frames.left[...] = np.arange( frames.width, dtype = np.uint8 )
+        server.publish( frames.frame )
+        slot = client.get( 5.0 )
+        assert np.array_equal( slot.left, frames.left[2:14:2, 4:24:2] )
+
+def test_network_unix_socket( frames ):
+    address = os.path.join( tempfile.mkdtemp(), "duo.sock" )
+    with DUOFrameServer( address, frames.width, frames.height ) as server:
+        with _connect( server ) as client:
+            server.publish( frames.make( 5 ) )
+            assert client.get( 5.0 ).timeStamp == 5 * 333
+    assert not os.path.exists( address )
+
+def test_network_rejects_bad_request( server ):
+    with pytest.raises( ValueError ):
+        DUOFrameClient( server.address, encoding = "jpeg" )
+
+def test_network_stalled_handshake_does_not_block( server, frames ):
+    stalled = socket.create_connection( server.address )  # Never sends its request
+    try:
+        start = time.time()
+        with _connect( server ) as client:
+            assert time.time() - start < 2.0
+            server.publish( frames.make( 1 ) )
+            assert client.get( 5.0 ).timeStamp == 333
+    finally:
+        stalled.close()
+
+def test_network_server_restart( server, frames ):
+    with _connect( server ) as client:
+        server.publish( frames.make( 1 ) )
+        assert client.get( 5.0 ).timeStamp == 333
+        server.close()
+        assert client.get( 1.0 ) is None
+    server.start()
+    with _connect( server ) as client:
+        server.publish( frames.make( 2 ) )
+        assert client.get( 5.0 ).timeStamp == 2 * 333
+
+def test_network_client_timeout_keeps_stream_in_sync( frames ):
+    # Half of a frame header arrives before the timeout, the rest after it
+    ours, theirs = socket.socketpair()
+    client = DUOFrameClient.__new__( DUOFrameClient )
+    client.sock = ours
+    client.width, client.height = frames.width, frames.height
+    client._slots = [ DUOFrameSlot( 0, frames.width, frames.height ),
+                      DUOFrameSlot( 1, frames.width, frames.height ) ]
+    client._current = None
+    client._imageSize = frames.width * frames.height
+    client.received = client.bytes = 0
+    size = frames.width * frames.height
+    header = _FRAME.pack( b"DUOF", 0, 0, frames.width, frames.height, 1, 42, 0, 0, 0, size, size )
+    try:
+        assert client.get( 0.05 ) is None  # Nothing arrived yet
+        theirs.sendall( header[:10] )
+        sender = threading.Timer( 0.2, lambda: theirs.sendall( header[10:] + bytes( 2 * size ) ) )
+        sender.start()
+        slot = client.get( 0.05 )
+        sender.join()
+        assert slot is not None and slot.timeStamp == 42
+    finally:
+        ours.close()
+        theirs.close()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import math
+
+import numpy as np
+import pytest
+
+from duo3d.duo3d import (CloseDUO, OpenDUO, SetDUOIMURange, DUOInstance, DUO_ACCEL_2G, DUO_ACCEL_8G,
+                         DUO_GYRO_250, DUO_GYRO_1000)
+from duo3d.frame import DUO_IMU_DTYPE
+from duo3d.orientation import (CreateDUOOrientationFilter, DUOOrientationFilter,
+                               DUO_ORIENTATION_COMPLEMENTARY, DUO_ORIENTATION_MADGWICK)
+
+_METHODS = [ DUO_ORIENTATION_MADGWICK, DUO_ORIENTATION_COMPLEMENTARY ]
+
+def _samples( count, accel = ( 0.0, 0.0, 1.0 ), gyro = ( 0.0, 0.0, 0.0 ), start = 0, step = 100 ):
+    """
+    count samples every step * 100us (10ms by default), 32-bit stamps from start
+    """
+    samples = np.zeros( count, DUO_IMU_DTYPE )
+    samples["timeStamp"] = ( start + step * np.arange( count, dtype = np.int64 ) ) & 0xFFFFFFFF
+    samples["accelData"] = accel
+    samples["gyroData"] = gyro
+    samples["tempData"] = 25.0
+    return samples
+
+def _run( imu, samples, batch = 7 ):
+    for i in range( 0, len( samples ), batch ):
+        stamps, quaternions = imu.update( samples[i:i + batch] )
+    return stamps, quaternions
+
+@pytest.mark.parametrize( "method", _METHODS )
+def test_orientation_static_level( method ):
+    imu = DUOOrientationFilter( method )
+    stamps, quaternions = _run( imu, _samples( 100 ) )
+    assert np.allclose( imu.q, [ 1.0, 0.0, 0.0, 0.0 ], atol = 1e-6 )
+    assert np.allclose( np.linalg.norm( quaternions, axis = 1 ), 1.0 )
+    assert imu.samples == 100 and imu.rejected == 0
+
+@pytest.mark.parametrize( "method", _METHODS )
+def test_orientation_static_tilt( method ):
+    roll = math.radians( 30.0 )
+    imu = DUOOrientationFilter( method )
+    _run( imu, _samples( 50, accel = ( 0.0, math.sin( roll ), math.cos( roll ) ) ) )
+    r, p, y = imu.euler()
+    assert r == pytest.approx( 30.0, abs = 0.5 )
+    assert p == pytest.approx( 0.0, abs = 0.5 ) and y == pytest.approx( 0.0, abs = 0.5 )
+
+@pytest.mark.parametrize( "method", _METHODS )
+def test_orientation_rotating_about_gravity( method ):
+    # 90 deg/s about z for one second, across the 32-bit stamp wrap
+    imu = DUOOrientationFilter( method )
+    samples = _samples( 101, gyro = ( 0.0, 0.0, 90.0 ), start = ( 1 << 32 ) - 5000 )
+    stamps, quaternions = _run( imu, samples )
+    roll, pitch, yaw = imu.euler()
+    assert yaw == pytest.approx( 90.0, abs = 1.0 )
+    assert roll == pytest.approx( 0.0, abs = 0.5 ) and pitch == pytest.approx( 0.0, abs = 0.5 )
+    # Yaw grows steadily sample by sample
+    yaws = imu.euler( quaternions )[2]
+    assert np.all( np.diff( yaws ) > 0 ) and list( stamps ) == list( samples["timeStamp"][-len( stamps ):] )
+
+def test_orientation_rejects_bad_accelerometer_samples():
+    imu = DUOOrientationFilter( accelRange = DUO_ACCEL_2G, gyroRange = DUO_GYRO_250 )
+    samples = _samples( 10 )
+    samples["accelData"][2] = ( 0.0, 0.0, 2.0 )  # Saturated
+    samples["accelData"][5] = ( 0.0, 0.0, 1.5 )  # Not just gravity
+    samples["gyroData"][7] = ( 0.0, 0.0, 250.0 )
+    imu.update( samples )
+    assert imu.rejected == 2 and imu.saturated == 1
+
+def test_orientation_accepts_frames( frames ):
+    imu = DUOOrientationFilter()
+    frame = frames.make( 1, timeStamp = 1000, samples = 3 )
+    for i in range( 3 ):
+        frame.IMUData[i].accelData[:] = [ 0.0, 0.0, 1.0 ]
+        frame.IMUData[i].gyroData[:] = [ 0.0, 0.0, 0.0 ]
+    stamps, quaternions = imu.update( frame )
+    assert list( stamps ) == [ 960, 980, 1000 ] and quaternions.shape == ( 3, 4 )
+    assert len( imu.update( frames.make( 2, samples = 0 ) )[0] ) == 0
+
+def test_create_orientation_filter( synthetic ):
+    duo = DUOInstance()
+    assert OpenDUO( duo )
+    try:
+        assert SetDUOIMURange( duo, DUO_ACCEL_8G, DUO_GYRO_1000 )
+        imu = CreateDUOOrientationFilter( duo, DUO_ORIENTATION_COMPLEMENTARY )
+    finally:
+        CloseDUO( duo )
+    assert ( imu.accelRange, imu.gyroRange ) == ( DUO_ACCEL_8G, DUO_GYRO_1000 )
+    assert imu.method == DUO_ORIENTATION_COMPLEMENTARY and imu.gain == 1.0
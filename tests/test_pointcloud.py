@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from duo3d import pointcloud
+from duo3d.duo3d import (CloseDUO, OpenDUO, SetDUOResolutionInfo, DUOInstance, DUOResolutionInfo,
+                         DUO_BIN_HORIZONTAL2, DUO_BIN_VERTICAL2)
+from duo3d.pointcloud import CreateDUOReprojector, DUOReprojector
+
+_WIDTH, _HEIGHT = 32, 24
+_F, _CX, _CY, _BASELINE = 40.0, 15.5, 11.5, 30.0
+
+_Q = np.array( [ [ 1.0, 0.0, 0.0, -_CX ],
+                 [ 0.0, 1.0, 0.0, -_CY ],
+                 [ 0.0, 0.0, 0.0, _F ],
+                 [ 0.0, 0.0, 1.0 / _BASELINE, 0.0 ] ] )
+
+def _disparity():
+    disparity = np.random.RandomState( 0 ).uniform( 1.0, 20.0, ( _HEIGHT, _WIDTH ) ).astype( np.float32 )
+    disparity[3, 4] = 0.0  # Unmatched
+    disparity[5, 6] = -1.0  # DUO_DISPARITY_INVALID
+    return disparity
+
+def _expected( disparity, stride = 1 ):
+    # Q * [x y d 1] for every pixel
+    y, x = np.mgrid[0:_HEIGHT:stride, 0:_WIDTH:stride]
+    d = disparity[::stride, ::stride].astype( np.float64 )
+    X = np.stack( [ x, y, d, np.ones_like( d ) ], -1 ).dot( _Q.T )
+    with np.errstate( divide = "ignore", invalid = "ignore" ):
+        xyz = X[..., :3] / X[..., 3:]
+    xyz[d <= 0] = np.nan
+    return xyz
+
+@pytest.mark.parametrize( "stride", [ 1, 2, 3 ] )
+def test_reproject_matches_q( stride ):
+    reprojector = DUOReprojector( _Q, _WIDTH, _HEIGHT, stride )
+    disparity = _disparity()
+    xyz = reprojector.reproject( disparity )
+    assert xyz is reprojector.xyz
+    assert xyz.shape == ( reprojector.rows, reprojector.cols, 3 ) == ( -( -_HEIGHT // stride ),
+                                                                       -( -_WIDTH // stride ), 3 )
+    assert np.allclose( xyz, _expected( disparity, stride ), rtol = 1e-5, atol = 1e-4, equal_nan = True )
+
+def test_reproject_depth_limits():
+    reprojector = DUOReprojector( _Q, _WIDTH, _HEIGHT )
+    disparity = _disparity()
+    with np.errstate( divide = "ignore" ):
+        depth = _F * _BASELINE / disparity
+    xyz = reprojector.reproject( disparity, minDepth = 100.0, maxDepth = 400.0 )
+    inside = ( disparity > 0 ) & ( depth >= 100.0 ) & ( depth <= 400.0 )
+    assert np.array_equal( ~np.isnan( xyz[..., 2] ), inside )
+    assert np.allclose( xyz[inside][:, 2], depth[inside], rtol = 1e-5 )
+
+def test_points_are_compacted():
+    reprojector = DUOReprojector( _Q, _WIDTH, _HEIGHT )
+    disparity = _disparity()
+    points = reprojector.points( disparity, maxDepth = 400.0 )
+    expected = _expected( disparity ).reshape( -1, 3 )
+    expected = expected[~np.isnan( expected[:, 2] ) & ( expected[:, 2] <= 400.0 )]
+    assert points.shape == expected.shape and np.shares_memory( points, reprojector._points )
+    assert np.allclose( points, expected, rtol = 1e-5, atol = 1e-4 )
+
+def test_reproject_rejects_wrong_size():
+    with pytest.raises( ValueError ):
+        DUOReprojector( _Q, _WIDTH, _HEIGHT ).reproject( np.ones( ( _WIDTH, _HEIGHT ), np.float32 ) )
+
+def test_ray_terms_are_shared_and_bounded():
+    first = DUOReprojector( _Q, _WIDTH, _HEIGHT )
+    assert DUOReprojector( _Q.copy(), _WIDTH, _HEIGHT )._xyz.base is first._xyz.base
+    for stride in range( 2, 2 + 2 * pointcloud._RAYS_CACHE_SIZE ):
+        DUOReprojector( _Q, _WIDTH, _HEIGHT, stride )
+    assert len( pointcloud._rays ) == pointcloud._RAYS_CACHE_SIZE
+
+def test_create_reprojector( synthetic ):
+    duo = DUOInstance()
+    assert OpenDUO( duo )
+    try:
+        ri = DUOResolutionInfo( 320, 240, DUO_BIN_HORIZONTAL2 + DUO_BIN_VERTICAL2, 30.0, 1.0, 112.0 )
+        assert SetDUOResolutionInfo( duo, ri )
+        reprojector = CreateDUOReprojector( duo, stride = 4 )
+    finally:
+        CloseDUO( duo )
+    fx, cx, cy, baseline = synthetic.calibration( 320, 240 )
+    assert ( reprojector.rows, reprojector.cols ) == ( 60, 80 )
+    xyz = reprojector.reproject( np.full( ( 240, 320 ), 8.0, np.float32 ) )
+    assert np.allclose( xyz[..., 2], fx * baseline / 8.0 )
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from duo3d.recording import DUORecorder, DUORecording, _HEADER
+from duo3d.playback import DUOPlayer
+
+# 32-bit frame stamps 333 apart, wrapping after the third frame
+_STAMPS = [ ( ( 1 << 32 ) - 766 + n * 333 ) & 0xFFFFFFFF for n in range( 5 ) ]
+
+@pytest.fixture
+def recording( tmp_path, frames ):
+    path = str( tmp_path / "session.duo" )
+    with DUORecorder( path, frames.width, frames.height ) as rec:
+        for n, stamp in enumerate( _STAMPS ):
+            assert rec.write( frames.make( n, stamp, samples = n % 3, IMUPresent = n != 1 ) )
+    assert rec.frames == len( _STAMPS ) and rec.dropped == 0
+    return path
+
+def test_recording_round_trip( recording, frames ):
+    rec = DUORecording( recording )
+    try:
+        assert rec.complete
+        assert ( rec.width, rec.height, len( rec ) ) == ( frames.width, frames.height, len( _STAMPS ) )
+        for n, frame in enumerate( rec ):
+            assert frame.timeStamp == _STAMPS[n]
+            assert ( frame.left == n ).all() and ( frame.right == n + 1 ).all()
+            assert frame.IMUPresent == ( n != 1 )
+            assert frame.IMUSamples == len( frame.imu ) == n % 3
+            assert list( frame.imu["accelData"][:, 0] ) == [ n + i for i in range( n % 3 ) ]
+            del frame
+    finally:
+        rec.close()
+
+def test_recording_unwraps_timestamps( recording ):
+    rec = DUORecording( recording )
+    try:
+        stamps = rec.timestamps
+        assert np.all( np.diff( stamps.astype( np.int64 ) ) == 333 )
+        assert int( stamps[3] ) == ( 1 << 32 ) + 233
+        assert rec.find( int( stamps[3] ) + 10 ) == 3
+        assert rec.find( int( stamps[0] ) - 1 ) == -1
+        assert rec.frame_at( int( stamps[4] ) ).index == 4
+    finally:
+        rec.close()
+
+def test_recording_without_index_is_scanned( recording ):
+    # Recording not closed properly: no index offset in the header
+    with open( recording, "r+b" ) as f:
+        fields = list( _HEADER.unpack( f.read( _HEADER.size ) ) )
+        fields[5] = fields[6] = 0
+        f.seek( 0 )
+        f.write( _HEADER.pack( *fields ) )
+    rec = DUORecording( recording )
+    try:
+        assert not rec.complete
+        assert len( rec ) == len( _STAMPS )
+        assert list( rec.index["IMUPresent"] ) == [ n != 1 for n in range( len( _STAMPS ) ) ]
+    finally:
+        rec.close()
+
+def test_player_replays_frames( recording ):
+    played = []
+
+    def callback( pFrameData, pUserData ):
+        f = pFrameData.contents
+        played.append( ( f.timeStamp, f.IMUPresent, f.IMUSamples, f.leftData[0], f.rightData[0] ) )
+
+    player = DUOPlayer( recording, callback, speed = None )
+    assert player.run() == len( _STAMPS )
+    assert played == [ ( stamp, n != 1, n % 3, n, n + 1 ) for n, stamp in enumerate( _STAMPS ) ]
+
+def test_player_range_and_loop( recording ):
+    played = []
+    player = DUOPlayer( recording, lambda p, u: played.append( p.contents.timeStamp ),
+                        speed = None, first = 1, last = 3 )
+    assert player.run() == 2
+    assert played == _STAMPS[1:3]
+
+    # An empty range returns at once, even when looping
+    player = DUOPlayer( recording, lambda p, u: played.append( None ), speed = None,
+                        first = 2, last = 2, loop = True )
+    assert player.start()
+    assert player.wait( 2.0 )
+    assert player.played == 0
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+import pytest
+
+from duo3d.duo3d import (CloseDUO, OpenDUO, SetDUOResolutionInfo, DUOInstance, DUOResolutionInfo,
+                         DUO_BIN_HORIZONTAL2, DUO_BIN_VERTICAL2, DUO_STEREO)
+from duo3d.rectify import (BuildDUORectifyMap, CreateDUORectifier, DUORectifier,
+                           DUO_RECTIFY_LINEAR, DUO_RECTIFY_NEAREST)
+
+_WIDTH, _HEIGHT = 32, 24
+_F, _CX, _CY = 40.0, 16.0, 12.0
+
+def _stereo( shiftLeft = 0.0, shiftRight = 0.0 ):
+    """
+    Undistorted cameras; the rectified principal points are moved right by the shifts,
+    so rectified pixel u comes from source pixel u - shift
+    """
+    stereo = DUO_STEREO()
+    identity = [ 1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0 ]
+    stereo.M1[:] = stereo.M2[:] = [ _F, 0.0, _CX, 0.0, _F, _CY, 0.0, 0.0, 1.0 ]
+    stereo.R1[:] = stereo.R2[:] = identity
+    stereo.P1[:] = [ _F, 0.0, _CX + shiftLeft, 0.0, 0.0, _F, _CY, 0.0, 0.0, 0.0, 1.0, 0.0 ]
+    stereo.P2[:] = [ _F, 0.0, _CX + shiftRight, 0.0, 0.0, _F, _CY, 0.0, 0.0, 0.0, 1.0, 0.0 ]
+    return stereo
+
+def _image( seed ):
+    return np.random.RandomState( seed ).randint( 0, 256, ( _HEIGHT, _WIDTH ) ).astype( np.uint8 )
+
+def test_rectify_map_of_known_calibration():
+    M = [ [ _F, 0.0, _CX ], [ 0.0, _F, _CY ], [ 0.0, 0.0, 1.0 ] ]
+    P = [ [ _F, 0.0, _CX + 2.0, 0.0 ], [ 0.0, _F, _CY - 1.0, 0.0 ], [ 0.0, 0.0, 1.0, 0.0 ] ]
+    mapx, mapy = BuildDUORectifyMap( M, None, np.eye( 3 ), P, _WIDTH, _HEIGHT )
+    assert mapx.shape == mapy.shape == ( _HEIGHT, _WIDTH ) and mapx.dtype == np.float32
+    u, v = np.meshgrid( np.arange( _WIDTH ), np.arange( _HEIGHT ) )
+    assert np.allclose( mapx, u - 2.0 ) and np.allclose( mapy, v + 1.0 )
+
+    # k1 > 0 pushes the source coordinates away from the principal point
+    D = [ 0.1, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0 ]
+    mapx, mapy = BuildDUORectifyMap( M, D, np.eye( 3 ), M, _WIDTH, _HEIGHT )
+    x = ( u - _CX ) / _F
+    y = ( v - _CY ) / _F
+    r2 = x * x + y * y
+    assert np.allclose( mapx, _F * x * ( 1 + 0.1 * r2 ) + _CX, atol = 1e-4 )
+    assert np.allclose( mapy, _F * y * ( 1 + 0.1 * r2 ) + _CY, atol = 1e-4 )
+
+@pytest.mark.parametrize( "interpolation", [ DUO_RECTIFY_NEAREST, DUO_RECTIFY_LINEAR ] )
+def test_rectify_integer_shift( interpolation ):
+    rectifier = DUORectifier( _stereo( 2.0, -3.0 ), _WIDTH, _HEIGHT, interpolation, cacheDir = False )
+    left, right = _image( 1 ), _image( 2 )
+    outLeft, outRight = rectifier.rectify( left, right )
+    assert outLeft is rectifier.left and outRight is rectifier.right
+    assert np.array_equal( outLeft[:, 2:], left[:, :-2] ) and not outLeft[:, :2].any()
+    assert np.array_equal( outRight[:, :-3], right[:, 3:] ) and not outRight[:, -3:].any()
+
+def test_rectify_linear_half_pixel():
+    rectifier = DUORectifier( _stereo( 0.5, 0.0 ), _WIDTH, _HEIGHT, DUO_RECTIFY_LINEAR, cacheDir = False )
+    left = _image( 3 )
+    out = np.empty_like( left )
+    rectifier.remap( 0, left, out )
+    expected = ( left[:, :-1].astype( np.int32 ) + left[:, 1:] + 1 ) // 2
+    assert np.abs( out[:, 1:].astype( np.int32 ) - expected ).max() <= 1
+
+def test_rectify_frame( frames ):
+    rectifier = DUORectifier( _stereo(), frames.width, frames.height, cacheDir = False )
+    frames.make( 9 )
+    frames.left[...] = _image( 4 )
+    left, right = rectifier.rectify_frame( frames.frame )
+    assert np.array_equal( left, frames.left ) and ( right == 10 ).all()
+
+def test_rectify_cache( tmp_path ):
+    cacheDir = str( tmp_path )
+    built = DUORectifier( _stereo( 2.0 ), _WIDTH, _HEIGHT, cacheDir = cacheDir, serial = b"SN1" )
+    assert not built.cached and len( os.listdir( cacheDir ) ) == 2
+    loaded = DUORectifier( _stereo( 2.0 ), _WIDTH, _HEIGHT, cacheDir = cacheDir, serial = b"SN1" )
+    assert loaded.cached and loaded.key == built.key
+    assert np.array_equal( loaded.index, built.index ) and np.array_equal( loaded.weight, built.weight )
+    left = _image( 5 )
+    assert np.array_equal( loaded.rectify( left, left )[0], built.rectify( left, left )[0] )
+    # Another calibration gets its own tables
+    other = DUORectifier( _stereo( 1.0 ), _WIDTH, _HEIGHT, cacheDir = cacheDir, serial = b"SN1" )
+    assert not other.cached and other.key != built.key
+
+def test_create_rectifier( synthetic, tmp_path ):
+    duo = DUOInstance()
+    assert OpenDUO( duo )
+    try:
+        ri = DUOResolutionInfo( 320, 240, DUO_BIN_HORIZONTAL2 + DUO_BIN_VERTICAL2, 30.0, 1.0, 112.0 )
+        assert SetDUOResolutionInfo( duo, ri )
+        rectifier = CreateDUORectifier( duo, cacheDir = str( tmp_path ) )
+    finally:
+        CloseDUO( duo )
+    assert ( rectifier.width, rectifier.height ) == ( 320, 240 )
+    # The synthetic calibration is already rectified: identity mapping
+    image = np.random.RandomState( 6 ).randint( 0, 256, ( 240, 320 ) ).astype( np.uint8 )
+    assert np.array_equal( rectifier.rectify( image, image )[0], image )
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from duo3d.shared import DUOSharedPublisher, DUOSharedSubscriber
+
+@pytest.fixture
+def publisher( frames ):
+    publisher = DUOSharedPublisher( None, frames.width, frames.height, slots = 4 )
+    yield publisher
+    publisher.close()
+
+def test_shared_round_trip( publisher, frames ):
+    with DUOSharedSubscriber( publisher.name ) as subscriber:
+        assert ( subscriber.width, subscriber.height ) == ( frames.width, frames.height )
+        for n in range( 3 ):
+            assert publisher.publish( frames.make( n, samples = n ) ) == n
+            frame = subscriber.get( 2.0 )
+            assert frame.timeStamp == n * 333
+            assert ( frame.left == n ).all() and ( frame.right == n + 1 ).all()
+            assert list( frame.imu["accelData"][:, 0] ) == [ n + i for i in range( n ) ]
+            assert subscriber.valid( frame )
+            del frame
+        assert subscriber.get( 0.05 ) is None
+
+def test_shared_lagging_subscriber_skips( publisher, frames ):
+    with DUOSharedSubscriber( publisher.name ) as subscriber:
+        for n in range( 10 ):
+            publisher.publish( frames.make( n ) )
+        frame = subscriber.get( 1.0 )
+        # 4 slots: frames 7, 8 and 9 are still available
+        assert frame.timeStamp == 7 * 333
+        assert subscriber.lost == 7
+        assert subscriber.valid( frame )
+        for n in range( 10, 14 ):
+            publisher.publish( frames.make( n ) )
+        assert not subscriber.valid( frame )  # Its slot was reused
+        del frame
+        assert subscriber.latest().timeStamp == 13 * 333
+
+def test_shared_subscriber_wakes_up( publisher, frames ):
+    with DUOSharedSubscriber( publisher.name ) as subscriber:
+        result = []
+        consumer = threading.Thread( target = lambda: result.append( subscriber.get( 5.0 ).timeStamp ) )
+        consumer.start()
+        publisher.publish( frames.make( 3 ) )
+        consumer.join( 5.0 )
+        assert result == [ 3 * 333 ]
+
+def test_shared_publisher_close_ends_iteration( publisher, frames ):
+    with DUOSharedSubscriber( publisher.name ) as subscriber:
+        publisher.publish( frames.make( 0 ) )
+        publisher.close()
+        assert [ frame.timeStamp for frame in subscriber ] == [ 0 ]
+
+def test_shared_block_survives_other_process( publisher ):
+    # An independent subscriber process must not unlink the block when it exits
+    code = ( "import sys; sys.path.insert( 0, %r )\n"
+             "import conftest\n"
+             "from duo3d.shared import DUOSharedSubscriber\n"
+             "DUOSharedSubscriber( %r ).close()\n" ) % ( os.path.dirname( os.path.abspath( __file__ ) ),
+                                                        publisher.name )
+    subprocess.run( [ sys.executable, "-c", code ], check = True, timeout = 60 )
+    DUOSharedSubscriber( publisher.name ).close()
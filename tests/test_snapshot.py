@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import ctypes as ct
+
+import numpy as np
+import pytest
+
+from duo3d.snapshot import DUOSnapshotPool
+
+from conftest import FrameSource
+
+def test_snapshot_copies_the_frame( frames ):
+    pool = DUOSnapshotPool( frames.width, frames.height, blockSize = 4 )
+    snapshot = pool.snapshot( ct.pointer( frames.make( 3, samples = 2 ) ) )
+    frames.make( 9, samples = 0 )  # The capture buffers are reused
+    assert ( snapshot.left == 3 ).all() and ( snapshot.right == 4 ).all()
+    assert snapshot.timeStamp == 999 and snapshot.ledSeqTag == 3 and snapshot.IMUPresent
+    assert snapshot.IMUSamples == 2 and list( snapshot.imu["timeStamp"] ) == [ 979, 999 ]
+    assert list( snapshot.imu["accelData"][:, 0] ) == [ 3.0, 4.0 ] and snapshot.seq == -1
+    assert pool.allocated == 4 and pool.available == 3
+
+    copy = pool.snapshot( snapshot )  # Frames with left / right arrays and imu
+    assert np.array_equal( copy.left, snapshot.left ) and not np.shares_memory( copy.left, snapshot.left )
+    assert np.array_equal( copy.imu, snapshot.imu ) and copy.timeStamp == 999
+
+    pool.release( snapshot )
+    assert snapshot.left is None and snapshot.IMUSamples == 0 and pool.available == 3
+    pool.release( snapshot )  # Released once only
+    assert pool.available == 3
+
+def test_snapshot_reuses_out( frames ):
+    pool = DUOSnapshotPool( frames.width, frames.height, blockSize = 2 )
+    snapshot = pool.snapshot( frames.make( 1, samples = 3 ) )
+    left, storage = snapshot.left, snapshot._imuStorage
+    assert pool.snapshot( frames.make( 2, samples = 1 ), out = snapshot ) is snapshot
+    assert snapshot.left is left and snapshot._imuStorage is storage
+    assert ( snapshot.left == 2 ).all() and snapshot.IMUSamples == 1
+    pool.release( snapshot )
+    assert pool.snapshot( frames.make( 5 ), out = snapshot ) is snapshot and ( snapshot.left == 5 ).all()
+    assert pool.allocated == 2
+
+def test_snapshot_many_reuses_and_releases( frames ):
+    pool = DUOSnapshotPool( frames.width, frames.height, blockSize = 8 )
+    sources = [ FrameSource( frames.width, frames.height ) for i in range( 4 ) ]
+    batch = pool.snapshot_many( source.make( i ) for i, source in enumerate( sources ) )
+    assert [ s.timeStamp for s in batch ] == [ 0, 333, 666, 999 ] and pool.available == 4
+
+    again = pool.snapshot_many( [ source.make( i + 10 ) for i, source in enumerate( sources[:3] ) ], out = batch )
+    assert again == batch[:3] and batch[3].left is None
+    assert [ int( s.left[0, 0] ) for s in again ] == [ 10, 11, 12 ]
+    assert pool.available == 5 and pool.allocated == 8
+
+    more = pool.snapshot_many( [ frames.make( 20 ), frames.make( 21 ) ], out = again[:1] )
+    assert more[0] is again[0] and pool.available == 4
+
+def test_snapshot_max_frames( frames ):
+    pool = DUOSnapshotPool( frames.width, frames.height, blockSize = 4, maxFrames = 3 )
+    batch = pool.snapshot_many( [ frames.make( i ) for i in range( 5 ) ] )
+    assert len( batch ) == 3 and pool.allocated == 3 and pool.exhausted == 1
+    assert pool.snapshot( frames.make( 6 ) ) is None and pool.exhausted == 2
+    pool.release( batch[0] )
+    assert pool.snapshot( frames.make( 7 ) ).timeStamp == 7 * 333
+
+def test_snapshot_wrong_size_keeps_the_pool( frames ):
+    pool = DUOSnapshotPool( frames.width, frames.height, maxFrames = 1 )
+    other = FrameSource( 16, 12 )
+    with pytest.raises( ValueError ):
+        pool.snapshot( other.make( 1 ) )
+    with pytest.raises( ValueError ):
+        pool.snapshot( DUOSnapshotPool( 16, 12 ).snapshot( other.make( 1 ) ) )
+    assert pool.available == pool.allocated and pool.exhausted == 0
+    assert pool.snapshot( frames.make( 2 ) ) is not None  # The only pair was not leaked
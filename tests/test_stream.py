@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from duo3d.duo3d import DUOInstance, DUOResolutionInfo, DUO_BIN_HORIZONTAL2, DUO_BIN_VERTICAL2
+from duo3d.stream import DUOStream
+
+_RESOLUTION = DUOResolutionInfo( 320, 240, DUO_BIN_HORIZONTAL2 + DUO_BIN_VERTICAL2, 100.0, 1.0, 112.0 )
+
+def test_stream_iterates_frames( synthetic ):
+    async def capture():
+        stamps = []
+        async with DUOStream( DUOInstance(), _RESOLUTION ) as stream:
+            async for frame in stream:
+                stamps.append( frame.timeStamp )
+                if len( stamps ) == 5:
+                    break
+        return stamps
+
+    stamps = asyncio.run( asyncio.wait_for( capture(), 10 ) )
+    assert len( stamps ) == 5 and stamps == sorted( stamps )
+
+def test_stream_restart( synthetic ):
+    async def capture():
+        stream = DUOStream( DUOInstance(), _RESOLUTION )
+        counts = []
+        for run in range( 2 ):
+            await stream.start()
+            frames = [ await asyncio.wait_for( stream.get(), 5 ) for _ in range( 3 ) ]
+            counts.append( sum( frame is not None for frame in frames ) )
+            await stream.stop()
+            assert await stream.get() is None
+        return counts
+
+    assert asyncio.run( capture() ) == [ 3, 3 ]
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+from duo3d import duo3d as _duo3d
+from duo3d.duo3d import CloseDUO, GetDUOGain, OpenDUO, SetDUOGain, DUOInstance
+from duo3d.tracing import DisableDUOTracing, EnableDUOTracing, GetDUOTracer, DUOCallTracer
+
+@pytest.fixture
+def duo( synthetic ):
+    duo = DUOInstance()
+    assert OpenDUO( duo )
+    yield duo
+    CloseDUO( duo )
+    DisableDUOTracing()
+
+def _bound( name ):
+    # Functions bound by the loader so far, None if not bound yet
+    return vars( _duo3d._duolib ).get( name )
+
+def test_tracing_intercepts_and_restores( duo ):
+    assert GetDUOGain( duo ) is not None
+    direct = _bound( "GetDUOGain" )
+    assert not hasattr( direct, "__wrapped__" )
+
+    tracer = EnableDUOTracing()
+    assert GetDUOTracer() is tracer
+    assert _bound( "GetDUOGain" ) is None  # Unbound, wrapped on the next call
+    GetDUOGain( duo )
+    assert _bound( "GetDUOGain" ).__wrapped__ == direct
+
+    assert DisableDUOTracing() is tracer and GetDUOTracer() is None
+    GetDUOGain( duo )
+    assert _bound( "GetDUOGain" ) == direct and not hasattr( _bound( "GetDUOGain" ), "__wrapped__" )
+    assert tracer.statistics()["GetDUOGain"]["calls"] == 1
+
+def test_tracer_statistics( duo ):
+    with DUOCallTracer() as tracer:
+        for gain in range( 5 ):
+            assert SetDUOGain( duo, gain * 10 )
+        GetDUOGain( duo )
+    assert GetDUOTracer() is None
+    stats = tracer.statistics()
+    assert set( stats ) == { "SetDUOGain", "GetDUOGain" }
+    s = stats["SetDUOGain"]
+    assert ( s["calls"], s["failed"], s["exceptions"] ) == ( 5, 0, 0 )
+    assert s["min"] <= s["mean"] <= s["max"] and sum( s["histogram"].values() ) == 5
+    assert tracer.text().splitlines()[0].split()[:3] == [ "function", "calls", "failed" ]
+    tracer.reset()
+    assert tracer.statistics() == {}
+
+def test_tracer_counts_failures_and_exceptions():
+    tracer = DUOCallTracer()
+    def fail():
+        raise OSError( "lost" )
+    failing = tracer.wrap( "Failing", lambda: False )
+    raising = tracer.wrap( "Raising", fail )
+    assert not failing() and failing.__name__ == "Failing"
+    with pytest.raises( OSError ):
+        raising()
+    stats = tracer.statistics()
+    assert ( stats["Failing"]["calls"], stats["Failing"]["failed"] ) == ( 1, 1 )
+    assert ( stats["Raising"]["calls"], stats["Raising"]["exceptions"] ) == ( 1, 1 )
+    statuses = [ e["args"]["status"] for e in tracer.chrome_trace()["traceEvents"] ]
+    assert statuses == [ "failed", "exception" ]
+
+def test_chrome_trace( duo, tmp_path ):
+    with DUOCallTracer( maxEvents = 3 ) as tracer:
+        for gain in range( 5 ):
+            SetDUOGain( duo, gain )
+    path = str( tmp_path / "trace.json" )
+    tracer.save_chrome_trace( path )
+    with open( path ) as f:
+        events = json.load( f )["traceEvents"]
+    assert len( events ) == 3  # The oldest were dropped
+    assert all( e["name"] == "SetDUOGain" and e["ph"] == "X" and e["args"]["status"] == "ok" for e in events )
+    assert events[0]["ts"] <= events[1]["ts"] <= events[2]["ts"]
+    assert DUOCallTracer( maxEvents = 0 ).chrome_trace()["traceEvents"] == []